@@ -2,9 +2,12 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     Employee, Department, Team, TeamMembership,
-    TimeSession, TimeEntry, LeaveRequest, Notification
+    TimeSession, TimeEntry, LeaveRequest, Notification, NotificationEvent,
+    Holiday, LeaveLedgerEntry, LeaveBalance
 )
 from simple_history.admin import SimpleHistoryAdmin
+from . import balances, clock, inbox, leaves, permissions
+from .changelists import ScalableAdminMixin
 
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
@@ -40,25 +43,117 @@ class EmployeeAdmin(UserAdmin, SimpleHistoryAdmin):
     )
 
 @admin.register(TimeSession)
-class TimeSessionAdmin(admin.ModelAdmin):
+class TimeSessionAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("user","start_time","end_time","location","created_at")
-    list_filter = ("start_time", "location")
-    search_fields = ("user__username", "user__first_name", "user__last_name")
+    list_select_related = ("user",)
+    list_filter = ("location",)
+    date_hierarchy = "start_time"
+    search_fields = ("user__username",)
+    search_employee_field = "user"
+    actions = ("close_sessions",)
+
+    @admin.action(description="Close selected open sessions now")
+    def close_sessions(self, request, queryset):
+        closed = clock.close_sessions(queryset)
+        self.message_user(request, f"Closed {len(closed)} session(s).")
 
 @admin.register(TimeEntry)
-class TimeEntryAdmin(admin.ModelAdmin):
-    list_display = ("user","date","hours","project","approved")
-    list_filter = ("date","approved")
+class TimeEntryAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("user","date","hours","project","source","approved")
+    list_select_related = ("user",)
+    list_filter = ("approved","source")
+    date_hierarchy = "date"
     search_fields = ("user__username","project")
+    search_employee_field = "user"
+    search_prefix_fields = ("project",)
+    actions = ("approve_entries",)
+
+    @admin.action(description="Approve selected time entries")
+    def approve_entries(self, request, queryset):
+        approved = queryset.filter(approved=False).update(approved=True)
+        self.message_user(request, f"Approved {approved} time entr{'y' if approved == 1 else 'ies'}.")
+
+def _decision_action(role, decision):
+    def action(modeladmin, request, queryset):
+        ids = list(queryset.values_list("id", flat=True))
+        decided = leaves.decide(request.user, ids, role, decision, permissions.for_request(request))
+        skipped = len(ids) - len(decided)
+        modeladmin.message_user(request, f"{len(decided)} leave request(s) {decision}" + (f", {skipped} not waiting on you as {role}" if skipped else ""))
+    action.__name__ = f"{decision}_as_{role}"
+    return admin.action(description=f"{decision.capitalize()} selected as {role}")(action)
 
 @admin.register(LeaveRequest)
 class LeaveRequestAdmin(admin.ModelAdmin):
     list_display = ("applicant","start_date","end_date","status")
     list_filter = ("status","start_date")
     search_fields = ("applicant__username","applicant__first_name","applicant__last_name")
+    # decisions go through leaves.decide, which deducts balances and notifies; the form cannot set them
+    readonly_fields = ("status","leader_decision","leader_decision_at","manager_decision","manager_decision_at")
+    actions = [_decision_action(role, decision) for role in leaves.ROLES for decision in leaves.DECISIONS]
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("recipient","verb","actor","created_at","unread")
-    list_filter = ("unread","created_at")
+    list_select_related = ("recipient","actor")
+    list_filter = ("unread",)
+    date_hierarchy = "created_at"
     search_fields = ("recipient__username","verb")
+    search_employee_field = "recipient"
+    search_prefix_fields = ("verb",)
+    # the unread flag feeds the recipients' counters, so it only changes through personnel.inbox
+    readonly_fields = ("unread",)
+    actions = ("mark_read",)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            super().save_model(request, obj, form, change)
+        else:
+            inbox.deliver([obj])
+
+    def delete_model(self, request, obj):
+        inbox.discard(Notification.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        inbox.discard(queryset)
+
+    @admin.action(description="Mark selected notifications read")
+    def mark_read(self, request, queryset):
+        changed = inbox.mark_read_many(queryset)
+        self.message_user(request, f"Marked {changed} notification(s) read.")
+
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    list_display = ("kind","actor","status","attempts","available_at","created_at")
+    list_filter = ("status","kind")
+    search_fields = ("kind","last_error")
+
+@admin.register(Holiday)
+class HolidayAdmin(admin.ModelAdmin):
+    list_display = ("date","name")
+    date_hierarchy = "date"
+
+@admin.register(LeaveLedgerEntry)
+class LeaveLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("employee","kind","days","year","leave_request","created_at")
+    list_filter = ("kind","year")
+    search_fields = ("employee__username","note")
+    raw_id_fields = ("employee","leave_request")
+
+    # the ledger is append-only; corrections are posted as adjustments
+    def has_change_permission(self, request, obj=None):
+        return obj is None and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        balances.post([obj])
+
+@admin.register(LeaveBalance)
+class LeaveBalanceAdmin(admin.ModelAdmin):
+    list_display = ("employee","days","updated_at")
+    search_fields = ("employee__username",)
+    readonly_fields = ("employee","days","updated_at")
+
+    def has_add_permission(self, request):
+        return False
@@ -7,4 +7,4 @@ class PersonnelConfig(AppConfig):
 
     def ready(self):
         # import signals to register them
-        from . import signals  # noqa
+        from . import checks, signals  # noqa
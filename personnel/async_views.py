@@ -0,0 +1,121 @@
+import asyncio
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Sum
+from django.http import Http404
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from . import clock, dashboard, inbox, outbox
+from .forms import StartSessionForm, TimeEntryForm
+
+# Async twins of the hot views in views.py, served under /async/. DB work goes
+# through the async ORM; templates render without touching the database, since
+# everything they read is loaded (or known to be cached) beforehand. The async
+# ORM still runs each query on the request's sync thread, so gather() overlaps
+# query waits with the other awaits rather than running queries in parallel.
+
+def resolves_user(view):
+    # sync code further down (etag functions, context processors, templates) reads request.user
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+def loads_etag_inputs(view):
+    # the ETag function reads the dashboard state, whose cache misses query (groups, unread count, notice
+    # boundaries); it is built on the sync thread first and kept on the request for the ETag and the view
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        await sync_to_async(dashboard._dashboard_state)(request)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+async def _alist(qs):
+    return [obj async for obj in qs]
+
+async def _nothing():
+    return []
+
+@login_required
+@resolves_user
+@loads_etag_inputs
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard.dashboard_etag, last_modified_func=dashboard.dashboard_last_modified)
+async def dashboard_home(request):
+    state = dashboard._dashboard_state(request)
+    notices_key = make_template_fragment_key("dashboard_notices", [state["notices_epoch"], state["notice_audience"]])
+    leaves_key = make_template_fragment_key("dashboard_upcoming_leaves", [state["leaves_version"], state["today"]])
+    cached = await cache.aget_many([notices_key, leaves_key])
+    # rows are only loaded for fragments missing from the cache
+    notices, upcoming_leaves = await asyncio.gather(
+        _nothing() if notices_key in cached else dashboard.avisible_notices(request),
+        _nothing() if leaves_key in cached else _alist(dashboard.upcoming_leaves()),
+    )
+    return render(request, "dashboard/home.html", {
+        "notices": notices, "time_form": TimeEntryForm(), "start_form": StartSessionForm(), "upcoming_leaves": upcoming_leaves,
+        "fragment_timeout": dashboard.FRAGMENT_TIMEOUT, "notices_epoch": state["notices_epoch"],
+        "notice_audience": state["notice_audience"], "leaves_version": state["leaves_version"], "today": state["today"], "unread_notifications": state["unread"],
+    })
+
+@login_required
+@resolves_user
+async def notifications_list(request):
+    try:
+        notes, next_cursor = await inbox.apage(request.user, cursor=request.GET.get("cursor"), unread_only=request.GET.get("unread") == "1")
+    except ValueError:
+        raise Http404("Invalid cursor")
+    unread = await inbox.aunread_count(request.user)
+    return render(request, "notifications/list.html", {"notifications": notes, "next_cursor": next_cursor, "unread_notifications": unread})
+
+@login_required
+@resolves_user
+async def sessions_list(request):
+    user = request.user
+    since = timezone.localdate() - timedelta(days=13)
+    daily_qs = user.timesheet_days.filter(date__gte=since).values("date").annotate(seconds=Sum("seconds")).order_by("-date")
+    sessions, daily, unread = await asyncio.gather(
+        _alist(user.time_sessions.all().order_by("-start_time")[:200]),
+        _alist(daily_qs),
+        inbox.aunread_count(user),
+    )
+    for day in daily:
+        day["hours"] = round(day["seconds"] / 3600, 2)
+    return render(request, "timesheets/sessions_list.html", {"sessions": sessions, "daily": daily, "unread_notifications": unread})
+
+@login_required
+@resolves_user
+async def start_session(request):
+    if request.method == "POST":
+        user = request.user
+        session = await sync_to_async(clock.clock_in)(user, request.POST.get("location", ""))
+        if session:
+            await sync_to_async(outbox.dispatch)("presence", actor=user, target=session, payload={"action": "started"})
+            messages.success(request, "Session started")
+        else:
+            messages.info(request, "Open session already exists")
+    return redirect("personnel:dashboard_home")
+
+@login_required
+@resolves_user
+async def stop_session(request):
+    if request.method == "POST":
+        user = request.user
+        session = await sync_to_async(clock.clock_out)(user)
+        if session:
+            await sync_to_async(outbox.dispatch)("presence", actor=user, target=session, payload={"action": "stopped"})
+            messages.success(request, "Session stopped")
+        else:
+            messages.info(request, "No open session found")
+    return redirect("personnel:dashboard_home")
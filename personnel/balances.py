@@ -0,0 +1,160 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from guardian.conf import settings as guardian_settings
+
+from .models import Employee, Holiday, LeaveBalance, LeaveLedgerEntry, LeaveRequest
+from .versioning import get_version
+
+BATCH_SIZE = 1000
+HOLIDAYS_TIMEOUT = 24 * 60 * 60
+
+
+def annual_days():
+    return Decimal(str(getattr(settings, "LEAVE_ANNUAL_DAYS", 20)))
+
+
+def weekend_days():
+    # date.weekday() numbers, Monday == 0
+    return frozenset(getattr(settings, "LEAVE_WEEKEND_DAYS", (5, 6)))
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def holidays(year):
+    """Holiday dates of ``year``, cached until a Holiday row changes."""
+    key = f"personnel:holidays:{year}:{get_version('holidays')}"
+    days = cache.get(key)
+    if days is None:
+        days = frozenset(Holiday.objects.filter(date__year=year).values_list("date", flat=True))
+        cache.set(key, days, HOLIDAYS_TIMEOUT)
+    return days
+
+
+@lru_cache(maxsize=4096)
+def _business_days(start, end, weekend, version):
+    total = (end - start).days + 1
+    weeks, rest = divmod(total, 7)
+    count = weeks * (7 - len(weekend)) + sum(1 for i in range(rest) if (start.weekday() + i) % 7 not in weekend)
+    for year in range(start.year, end.year + 1):
+        count -= sum(1 for day in holidays(year) if start <= day <= end and day.weekday() not in weekend)
+    return count
+
+
+def business_days(start, end):
+    """Working days in [start, end]: weekdays outside LEAVE_WEEKEND_DAYS that are not holidays.
+
+    Arithmetic over whole weeks plus the cached holiday set, memoised per
+    range and holiday version.
+    """
+    if end < start:
+        return 0
+    return _business_days(start, end, weekend_days(), get_version("holidays"))
+
+
+def _ledger_totals(employee_ids):
+    totals = LeaveLedgerEntry.objects.filter(employee_id__in=employee_ids).values_list("employee_id").annotate(total=Sum("days")).order_by()
+    return dict(totals)
+
+
+def _snapshot(employee_ids):
+    # a concurrent first posting may insert the row first; theirs already holds the same ledger, so it is kept
+    totals = _ledger_totals(employee_ids)
+    LeaveBalance.objects.bulk_create(
+        [LeaveBalance(employee_id=employee_id, days=totals.get(employee_id, Decimal(0))) for employee_id in employee_ids],
+        ignore_conflicts=True,
+    )
+
+
+def balance(employee):
+    """Current balance read from the snapshot row; the ledger is summed at most once per employee."""
+    days = LeaveBalance.objects.filter(employee=employee).values_list("days", flat=True).first()
+    if days is None:
+        _snapshot([employee.pk])
+        days = LeaveBalance.objects.filter(employee=employee).values_list("days", flat=True).get()
+    return days
+
+
+def post(entries):
+    """Append ledger entries and move the affected snapshots in the same transaction."""
+    if not entries:
+        return entries
+    per_employee = defaultdict(Decimal)
+    for entry in entries:
+        per_employee[entry.employee_id] += Decimal(entry.days)
+    with transaction.atomic():
+        # first posting for some employees: snapshot their ledger so far once, then move every snapshot alike
+        existing = set()
+        for ids in _chunks(per_employee):
+            existing.update(LeaveBalance.objects.filter(employee_id__in=ids).values_list("employee_id", flat=True))
+        for ids in _chunks(set(per_employee) - existing):
+            _snapshot(ids)
+        LeaveLedgerEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        by_delta = defaultdict(list)
+        for employee_id, delta in per_employee.items():
+            by_delta[delta].append(employee_id)
+        for delta, employee_ids in by_delta.items():
+            for ids in _chunks(employee_ids):
+                LeaveBalance.objects.filter(employee_id__in=ids).update(days=F("days") + delta)
+    return entries
+
+
+def deduct(leaves):
+    """Post one deduction per fully approved request; requests already deducted are skipped."""
+    leaves = [lr for lr in leaves if lr.status == LeaveRequest.STATUS_MANAGER_APPROVED]
+    if not leaves:
+        return []
+    done = set(
+        LeaveLedgerEntry.objects.filter(kind=LeaveLedgerEntry.KIND_DEDUCTION, leave_request__in=[lr.id for lr in leaves])
+        .values_list("leave_request_id", flat=True)
+    )
+    return post([
+        LeaveLedgerEntry(
+            employee_id=lr.applicant_id, kind=LeaveLedgerEntry.KIND_DEDUCTION, days=-business_days(lr.start_date, lr.end_date),
+            year=lr.start_date.year, leave_request=lr, note=f"{lr.start_date} to {lr.end_date}",
+        )
+        for lr in leaves if lr.id not in done
+    ])
+
+
+def _prorated(days, employment_date, year):
+    # employees hired during the year accrue for the remaining months only
+    if employment_date is None or employment_date.year < year:
+        return days
+    if employment_date.year > year:
+        return Decimal(0)
+    return (days * (13 - employment_date.month) / 12).quantize(Decimal("0.01"))
+
+
+def accrue(year, days=None, batch_size=BATCH_SIZE):
+    """Post the yearly entitlement to every active employee not yet credited for ``year``.
+
+    Runs in independent batches; the per-(employee, year) accrual constraint
+    makes reruns and interrupted runs safe. Returns the number of entries posted.
+    """
+    days = annual_days() if days is None else Decimal(days)
+    credited = LeaveLedgerEntry.objects.filter(kind=LeaveLedgerEntry.KIND_ACCRUAL, year=year).values("employee_id")
+    rows = (
+        # django-guardian's AnonymousUser row is not a person
+        Employee.objects.filter(is_active=True).exclude(id__in=credited).exclude(username=guardian_settings.ANONYMOUS_USER_NAME)
+        .order_by("id").values_list("id", "employment_date").iterator(chunk_size=batch_size)
+    )
+    posted, batch = 0, []
+    for employee_id, employment_date in rows:
+        amount = _prorated(days, employment_date, year)
+        if amount > 0:
+            batch.append(LeaveLedgerEntry(employee_id=employee_id, kind=LeaveLedgerEntry.KIND_ACCRUAL, days=amount, year=year, note=f"{year} entitlement"))
+        if len(batch) >= batch_size:
+            posted += len(post(batch))
+            batch = []
+    posted += len(post(batch))
+    return posted
@@ -0,0 +1,127 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import outbox
+
+# recorded with --save-baseline on the machine that compares against it; gitignored
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baselines.json")
+# a benchmark regresses when its median time grows by more than this fraction, or it issues more queries
+REGRESSION_THRESHOLD = 0.25
+
+
+def _get(client, name, **params):
+    def run():
+        response = client.get(reverse(name), params)
+        if response.status_code != 200:
+            raise AssertionError(f"{name} returned {response.status_code}")
+    return run
+
+
+def _clock(client):
+    def run():
+        # start then stop, so every run leaves the user without an open session
+        for name in ("personnel:session_start", "personnel:session_stop"):
+            response = client.post(reverse(name))
+            if response.status_code != 302:
+                raise AssertionError(f"{name} returned {response.status_code}")
+    return run
+
+
+def _export(path):
+    month = (timezone.localdate().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+    def run():
+        call_command("export_timesheet", month=month, out=path, stdout=StringIO())
+    return run
+
+
+# name -> factory(client, scratch csv path) of the callable that is timed
+BENCHMARKS = {
+    "directory_list": lambda client, path: _get(client, "personnel:directory_list"),
+    "directory_search": lambda client, path: _get(client, "personnel:directory_list", q="sara eng"),
+    "dashboard_home": lambda client, path: _get(client, "personnel:dashboard_home"),
+    "notifications_list": lambda client, path: _get(client, "personnel:notifications"),
+    "session_start_stop": lambda client, path: _clock(client),
+    "export_timesheet": lambda client, path: _export(path),
+}
+
+
+def _committed(func):
+    """Run ``func`` and the work a commit would trigger: its on_commit hooks, then the outbox worker.
+
+    Benchmarks run inside a transaction that is rolled back, so hooks are never
+    fired by a commit; they are taken off the connection and run here instead.
+    """
+    queued = len(connection.run_on_commit)
+    func()
+    while len(connection.run_on_commit) > queued:
+        hooks = connection.run_on_commit[queued:]
+        del connection.run_on_commit[queued:]
+        for _savepoints, hook, _robust in hooks:
+            hook()
+    outbox.drain()
+
+
+def measure(func, repeat):
+    """(median ms, queries) of ``func`` over ``repeat`` runs after one warm-up run, committed work included."""
+    _committed(func)
+    samples, queries = [], 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            _committed(func)
+            samples.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(ctx))
+    return round(statistics.median(samples), 2), queries
+
+
+def run(user, names, repeat):
+    """Time ``names`` as ``user``; returns {name: {"ms": ..., "queries": ...}}."""
+    client = Client()
+    client.force_login(user)
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "export.csv")
+        for name in names:
+            ms, queries = measure(BENCHMARKS[name](client, path), repeat)
+            results[name] = {"ms": ms, "queries": queries}
+    return results
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baselines(baselines, path=BASELINES_PATH):
+    with open(path, "w") as fh:
+        json.dump(baselines, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Messages for every benchmark in ``results`` that is slower or chattier than ``baseline``."""
+    found = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["queries"] > expected["queries"]:
+            found.append(f"{name}: {result['queries']} queries, baseline {expected['queries']}")
+        if result["ms"] > expected["ms"] * (1 + threshold):
+            found.append(f"{name}: {result['ms']:.1f} ms, baseline {expected['ms']:.1f} ms (+{threshold:.0%} allowed)")
+    return found
@@ -0,0 +1,122 @@
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import search
+
+# Admin changelists for the tables that grow without bound (sessions, time
+# entries, notifications). Counting is estimated or capped, deep pages are
+# reached by keyset links instead of OFFSET, and searching a person goes
+# through the directory search backend instead of icontains joins.
+
+CURSOR_VAR = "before"
+# below this many rows an exact count is cheap and planner estimates are least reliable
+ESTIMATE_THRESHOLD = 10_000
+# exact counts stop here; rows beyond are reached with the keyset "Older" link
+COUNT_CAP = 100_000
+SEARCH_LIMIT = 1000
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for ``queryset`` on PostgreSQL, None elsewhere or without statistics."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        return int(cursor.fetchone()[0][0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Counts with planner statistics on large PostgreSQL tables, or exactly up to COUNT_CAP rows."""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return self.object_list.order_by()[:COUNT_CAP].count()
+
+
+class KeysetChangeList(ChangeList):
+    """Adds an ``?before=<pk>`` cursor to newest-first changelists, so deep pages cost an index range scan."""
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET[CURSOR_VAR])
+        except (KeyError, ValueError):
+            self.cursor = None
+        self.keyset = False
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # a cursor only means something for the current ordering and filters; every other link starts from the newest rows
+        return super().get_query_string({CURSOR_VAR: None, **(new_params or {})}, remove)
+
+    def get_queryset(self, request, exclude_parameters=None):
+        qs = super().get_queryset(request, exclude_parameters)
+        # the admin may repeat the pk while making the ordering deterministic
+        self.keyset = tuple(dict.fromkeys(qs.query.order_by)) in (("-pk",), (f"-{self.model._meta.pk.attname}",))
+        if self.keyset and self.cursor is not None:
+            qs = qs.filter(pk__lt=self.cursor)
+        return qs
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.keyset and self.multi_page and not self.show_all:
+            self.result_list = list(self.result_list)
+            if len(self.result_list) == self.list_per_page:
+                self.next_cursor = self.result_list[-1].pk
+
+    @property
+    def older_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, [PAGE_VAR])
+
+    @property
+    def newest_url(self):
+        return self.get_query_string(remove=[PAGE_VAR])
+
+
+class ScalableAdminMixin:
+    """ModelAdmin defaults for very large tables; pair with ``list_select_related`` and an indexed ``date_hierarchy``.
+
+    ``search_employee_field`` names the employee foreign key matched through the
+    directory search backend; ``search_prefix_fields`` are matched with istartswith.
+    """
+
+    ordering = ("-id",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/personnel/scalable_change_list.html"
+    search_employee_field = None
+    search_prefix_fields = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        q = Q()
+        if self.search_employee_field:
+            # rows of people who have since left stay searchable here
+            ids = search.get_backend().search(search_term, SEARCH_LIMIT, active_only=False)
+            q |= Q(**{f"{self.search_employee_field}_id__in": ids})
+        for field in self.search_prefix_fields:
+            q |= Q(**{f"{field}__istartswith": search_term})
+        return queryset.filter(q), False
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f"The default cache ({backend}) is not shared between processes.",
+            hint="Data versions (personnel.versioning) are read from the default cache; configure a shared backend "
+                 "such as FileBasedCache or RedisCache in CACHES, or other workers never see an invalidation.",
+            id="personnel.E001",
+        )]
+    return []
@@ -0,0 +1,62 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import TimeSession
+
+# Clock-in/out as single statements guarded by the one-open-session-per-user
+# constraint, instead of check-then-write round trips that race on double
+# clicks. Raw SQL skips model signals, so post_save is sent by hand to keep the
+# rollup and presence receivers in step. RawQuerySet re-runs its SQL on every
+# iteration: each one is consumed exactly once with list().
+
+
+def _table():
+    return connection.ops.quote_name(TimeSession._meta.db_table)
+
+
+def _written_at():
+    # updated_at records when the row was written, whatever instant the caller clocks at
+    return connection.ops.adapt_datetimefield_value(timezone.now())
+
+
+def _saved(session, user, created):
+    session.user = user
+    post_save.send(sender=TimeSession, instance=session, created=created, update_fields=None if created else {"end_time"}, raw=False, using=connection.alias)
+    return session
+
+
+def clock_in(user, location="", now=None):
+    """Open a session for ``user``; returns it, or None when one is already open."""
+    now = connection.ops.adapt_datetimefield_value(now or timezone.now())
+    rows = list(TimeSession.objects.raw(
+        f"INSERT INTO {_table()} (user_id, start_time, end_time, location, created_at, updated_at) VALUES (%s, %s, NULL, %s, %s, %s) "
+        "ON CONFLICT (user_id) WHERE end_time IS NULL DO NOTHING RETURNING *",
+        [user.pk, now, location, now, _written_at()],
+    ))
+    return _saved(rows[0], user, created=True) if rows else None
+
+
+def clock_out(user, now=None):
+    """Close the user's open session; returns it, or None when nothing was open."""
+    now = connection.ops.adapt_datetimefield_value(now or timezone.now())
+    rows = list(TimeSession.objects.raw(
+        f"UPDATE {_table()} SET end_time = %s, updated_at = %s WHERE user_id = %s AND end_time IS NULL RETURNING *",
+        [now, _written_at(), user.pk],
+    ))
+    return _saved(rows[0], user, created=False) if rows else None
+
+
+def close_sessions(queryset, now=None):
+    """Close every open session in ``queryset`` with one UPDATE; returns the closed sessions."""
+    now = connection.ops.adapt_datetimefield_value(now or timezone.now())
+    subquery, params = queryset.filter(end_time__isnull=True).order_by().values("pk").query.sql_with_params()
+    with transaction.atomic():
+        sessions = list(TimeSession.objects.raw(
+            f"UPDATE {_table()} SET end_time = %s, updated_at = %s WHERE id IN ({subquery}) AND end_time IS NULL RETURNING *",
+            [now, _written_at(), *params],
+        ))
+        # a user has at most one open session, so this is one rollup refresh per user
+        for session in sessions:
+            post_save.send(sender=TimeSession, instance=session, created=False, update_fields={"end_time"}, raw=False, using=connection.alias)
+    return sessions
@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+from . import inbox
+
+def unread_notifications(request):
+    # evaluated only when a template renders the badge
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {"unread_notifications": 0}
+    if hasattr(request, "_unread_notifications"):
+        # already read for the dashboard ETag
+        return {"unread_notifications": request._unread_notifications}
+    return {"unread_notifications": SimpleLazyObject(lambda: inbox.unread_count(user))}
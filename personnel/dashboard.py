@@ -0,0 +1,179 @@
+import hashlib
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from . import inbox, leave_calendar
+from .models import LeaveRequest, Notice
+from .versioning import get_version
+
+# shared fragments are keyed on data versions, so this only bounds staleness of
+# things that are not versioned (e.g. an applicant renaming themselves)
+FRAGMENT_TIMEOUT = 60 * 60
+NOTICES_LIMIT = 5
+UPCOMING_LEAVES_LIMIT = 10
+
+
+def active_notices(now=None):
+    now = now or timezone.now()
+    return Notice.objects.filter(
+        Q(visible_from__lte=now) | Q(visible_from__isnull=True),
+        Q(visible_until__gte=now) | Q(visible_until__isnull=True),
+    ).order_by("-published_at", "-id")
+
+
+def notice_index(epoch):
+    """Newest visible notices per audience, built once per notice epoch.
+
+    Maps each group id (None for notices without groups, which everyone sees)
+    to at most NOTICES_LIMIT (published timestamp, id) pairs, newest first.
+    The epoch changes on every notice edit and visibility boundary, so a
+    stale index is never read.
+    """
+    key = f"personnel:dashboard:notice-index:{epoch}"
+    index = cache.get(key)
+    if index is None:
+        index = {}
+        for notice_id, published_at, group_id in active_notices().values_list("id", "published_at", "visible_to_groups"):
+            entries = index.setdefault(group_id, [])
+            if len(entries) < NOTICES_LIMIT:
+                entries.append((published_at.timestamp(), notice_id))
+        cache.set(key, index, FRAGMENT_TIMEOUT)
+    return index
+
+
+def notice_groups(user):
+    """Sorted group ids of ``user``, cached until any group membership changes."""
+    key = f"personnel:dashboard:notice-groups:{user.pk}:{get_version('groups')}"
+    group_ids = cache.get(key)
+    if group_ids is None:
+        group_ids = tuple(sorted(user.groups.values_list("id", flat=True)))
+        cache.set(key, group_ids, FRAGMENT_TIMEOUT)
+    return group_ids
+
+
+def notice_audience(group_ids):
+    # users with the same groups see the same notices and share one cached fragment
+    if not group_ids:
+        return "public"
+    return hashlib.md5(",".join(map(str, group_ids)).encode()).hexdigest()
+
+
+def visible_notice_ids(group_ids, epoch):
+    index = notice_index(epoch)
+    entries = set(index.get(None, []))
+    for group_id in group_ids:
+        entries.update(index.get(group_id, []))
+    return [notice_id for _, notice_id in sorted(entries, reverse=True)[:NOTICES_LIMIT]]
+
+
+def _in_order(ids, by_id):
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def visible_notices(request):
+    """The notices shown to ``request.user``: one index lookup and one fetch by id."""
+    state = _dashboard_state(request)
+    ids = visible_notice_ids(state["notice_groups"], state["notices_epoch"])
+    return _in_order(ids, Notice.objects.in_bulk(ids)) if ids else []
+
+
+async def avisible_notices(request):
+    state = _dashboard_state(request)
+    ids = await sync_to_async(visible_notice_ids)(state["notice_groups"], state["notices_epoch"])
+    return _in_order(ids, await Notice.objects.ain_bulk(ids)) if ids else []
+
+
+def upcoming_leaves(today=None):
+    today = today or timezone.localdate()
+    days = getattr(settings, "DASHBOARD_UPCOMING_LEAVES_DAYS", None)
+    if days is None:
+        leaves = LeaveRequest.objects.filter(end_date__gte=today, status__in=leave_calendar.APPROVED_STATUSES)
+    else:
+        # bounded on both ends so the (start_date, end_date) index can serve it
+        leaves = leave_calendar.absences(today, today + timedelta(days=days), statuses=leave_calendar.APPROVED_STATUSES)
+    return leaves.select_related("applicant").order_by("start_date")[:UPCOMING_LEAVES_LIMIT]
+
+
+def _notice_boundaries(version):
+    # future visible_from/visible_until instants; passing one changes the visible set
+    key = f"personnel:dashboard:notice-boundaries:{version}"
+    boundaries = cache.get(key)
+    if boundaries is None:
+        now = timezone.now()
+        stamps = set()
+        for start, end in Notice.objects.filter(Q(visible_from__gt=now) | Q(visible_until__gt=now)).values_list("visible_from", "visible_until"):
+            stamps.update(ts.timestamp() for ts in (start, end) if ts and ts > now)
+        boundaries = sorted(stamps)
+        cache.set(key, boundaries, None)
+    return boundaries
+
+
+def notices_state(now=None):
+    """(epoch, last_changed) for the visible notice set.
+
+    The epoch changes whenever a notice is edited or a visibility window opens
+    or closes, so it can key both the fragment cache and the ETag.
+    """
+    now = (now or timezone.now()).timestamp()
+    version = get_version("notices")
+    boundaries = _notice_boundaries(version)
+    passed = bisect_right(boundaries, now)
+    last_changed = max(version / 1000, boundaries[passed - 1] if passed else 0)
+    return f"{version}.{passed}", last_changed
+
+
+def leaves_state():
+    version = get_version("leaves")
+    return str(version), version / 1000
+
+
+def _dashboard_state(request):
+    # computed once per request and shared by the ETag/Last-Modified functions and the view
+    state = getattr(request, "_dashboard_state", None)
+    if state is None:
+        notices_epoch, notices_changed = notices_state()
+        leaves_version, leaves_changed = leaves_state()
+        today = timezone.localdate()
+        groups = notice_groups(request.user)
+        # the badge in base.html is part of the page; the context processor reuses this count
+        unread = getattr(request, "_unread_notifications", None)
+        if unread is None:
+            unread = request._unread_notifications = inbox.unread_count(request.user)
+        state = {
+            "notices_epoch": notices_epoch,
+            "notice_groups": groups,
+            "notice_audience": notice_audience(groups),
+            "leaves_version": leaves_version,
+            "unread": unread,
+            "today": today.isoformat(),
+            "last_modified": datetime.fromtimestamp(max(notices_changed, leaves_changed), tz=dt_timezone.utc),
+        }
+        request._dashboard_state = state
+    return state
+
+
+def dashboard_etag(request, *args, **kwargs):
+    user = request.user
+    csrf_secret = request.META.get("CSRF_COOKIE")
+    # flash messages and a not-yet-issued CSRF cookie make the page one-off
+    if not user.is_authenticated or not csrf_secret or len(messages.get_messages(request)):
+        return None
+    state = _dashboard_state(request)
+    raw = ":".join([
+        str(user.pk), user.get_full_name(), state["notices_epoch"], state["notice_audience"], state["leaves_version"], str(state["unread"]),
+        state["today"], csrf_secret,
+    ])
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def dashboard_last_modified(request, *args, **kwargs):
+    if dashboard_etag(request) is None:
+        return None
+    return _dashboard_state(request)["last_modified"]
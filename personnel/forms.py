@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from .models import Employee, TimeEntry, TimeSession, LeaveRequest
+from . import balances, leave_calendar
 
 class EmployeeCreateForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
@@ -28,10 +30,25 @@ class LeaveRequestForm(forms.ModelForm):
             "reason": forms.Textarea(attrs={"rows":4}),
         }
 
+    def __init__(self, *args, applicant=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.applicant = applicant
+
     def clean(self):
         cleaned = super().clean()
         start = cleaned.get("start_date")
         end = cleaned.get("end_date")
         if start and end and end < start:
             raise forms.ValidationError("End date must be >= start date")
+        if start and end and self.applicant is not None:
+            # a single range query, however long the requested leave is
+            if leave_calendar.overlapping(self.applicant, start, end, exclude=self.instance.pk).exists():
+                raise forms.ValidationError(leave_calendar.OVERLAP_MESSAGE)
+            if getattr(settings, "LEAVE_ENFORCE_BALANCE", False):
+                requested, available = balances.business_days(start, end), balances.balance(self.applicant)
+                if requested > available:
+                    raise forms.ValidationError(f"This request needs {requested} working days but only {available} are available")
+            team = cleaned.get("team")
+            if team and leave_calendar.understaffed(team, self.applicant, start, end):
+                raise forms.ValidationError(f"{team} would drop below its minimum staffing of {team.min_staffing} on some of these dates")
         return cleaned
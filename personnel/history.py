@@ -0,0 +1,147 @@
+import copy
+
+from django.db.models import Max
+from simple_history.models import HistoricalRecords
+
+HISTORY_BATCH_SIZE = 1000
+_MISSING = object()
+
+
+def _tracked(fields):
+    return [(field.attname, field) for field in fields]
+
+
+def _normalized(field, value):
+    # model attributes may still hold raw input (e.g. a date string) until reloaded
+    return None if value is None else field.to_python(value)
+
+
+def _snapshot(instance):
+    # deferred fields are absent from __dict__; JSON values are copied so in-place edits show up as changes
+    return {
+        f.attname: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for f in instance._meta.concrete_fields
+        if (value := instance.__dict__.get(f.attname, _MISSING)) is not _MISSING
+    }
+
+
+def loaded_state(instance):
+    """Field values ``instance`` had when it was loaded or last saved; empty for instances never saved."""
+    return getattr(instance, "_loaded_state", {})
+
+
+def remember_state(instance):
+    # the saved values are what the next save is compared with
+    instance._loaded_state = _snapshot(instance)
+
+
+class LoadedStateMixin:
+    """Keeps the field values a model instance was loaded with (see loaded_state)."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = _snapshot(instance)
+        return instance
+
+
+class PolicyHistoricalRecords(HistoricalRecords):
+    """HistoricalRecords that only writes a row when a tracked field changed.
+
+    Saves limited to excluded fields (``update_fields=["last_login"]`` on every
+    login) are skipped without a query. Other updates are compared with the
+    state the instance was loaded with (see LoadedStateMixin), or with the
+    latest historical row when that state is unknown or incomplete.
+    """
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        if not created and not kwargs.get("raw"):
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and set(update_fields) <= set(self.excluded_fields):
+                return
+            changed = self.has_changes(instance, using)
+            remember_state(instance)
+            if not changed:
+                return
+        else:
+            remember_state(instance)
+        super().post_save(instance, created, using=using, **kwargs)
+
+    def has_changes(self, instance, using=None):
+        tracked = _tracked(self.fields_included(instance))
+        loaded = loaded_state(instance)
+        if loaded and all(name in loaded for name, _ in tracked):
+            return any(_normalized(field, getattr(instance, name)) != _normalized(field, loaded[name]) for name, field in tracked)
+        latest = (
+            getattr(instance, self.manager_name).using(using)
+            .order_by("-history_date", "-history_id").values_list(*[name for name, _ in tracked]).first()
+        )
+        if latest is None:
+            return True
+        return any(_normalized(field, getattr(instance, name)) != _normalized(field, old) for (name, field), old in zip(tracked, latest))
+
+
+def bulk_record(model, instances, history_type="~", change_reason=None, batch_size=HISTORY_BATCH_SIZE):
+    """Historical rows for ``instances`` after a bulk write, skipping those that match their latest row.
+
+    Two queries per batch to diff, one bulk INSERT for the rows that changed.
+    Returns the number of rows written.
+    """
+    records = model._meta.simple_history_manager_attribute
+    history = getattr(model, records)
+    tracked = _tracked(history.model.tracked_fields)
+    pk_name = model._meta.pk.attname
+    written = 0
+    instances = list(instances)
+    for i in range(0, len(instances), batch_size):
+        batch = instances[i:i + batch_size]
+        ids = [getattr(obj, pk_name) for obj in batch]
+        latest_ids = history.filter(**{f"{pk_name}__in": ids}).values(pk_name).annotate(latest=Max("history_id")).values("latest")
+        latest = {
+            row[0]: row[1:]
+            for row in history.filter(history_id__in=latest_ids).values_list(pk_name, *[name for name, _ in tracked])
+        }
+        changed = [
+            obj for obj in batch
+            if getattr(obj, pk_name) not in latest
+            or any(_normalized(field, getattr(obj, name)) != _normalized(field, old) for (name, field), old in zip(tracked, latest[getattr(obj, pk_name)]))
+        ]
+        if changed:
+            history.bulk_history_create(changed, update=history_type == "~", default_change_reason=change_reason, batch_size=batch_size)
+            written += len(changed)
+    return written
+
+
+def compact(model, before, batch_size=HISTORY_BATCH_SIZE, dry_run=False):
+    """Delete historical rows older than ``before`` that repeat the previous row of the same object.
+
+    Creations and deletions are always kept, so every remaining row older than
+    the cutoff records an actual field change. Returns (scanned, deleted).
+    """
+    history = getattr(model, model._meta.simple_history_manager_attribute)
+    names = [field.attname for field in history.model.tracked_fields]
+    pk_name = model._meta.pk.attname
+    rows = (
+        history.filter(history_date__lt=before).order_by(pk_name, "history_date", "history_id")
+        .values_list("history_id", "history_type", *names).iterator(chunk_size=batch_size)
+    )
+    pk_index = 2 + names.index(pk_name)
+    scanned, deleted, doomed, previous = 0, 0, [], None
+    for row in rows:
+        scanned += 1
+        same_object = previous is not None and previous[pk_index] == row[pk_index]
+        if same_object and row[1] == "~" and row[2:] == previous[2:]:
+            doomed.append(row[0])
+        else:
+            previous = row
+        if len(doomed) >= batch_size:
+            deleted += _delete(history, doomed, dry_run)
+            doomed = []
+    deleted += _delete(history, doomed, dry_run)
+    return scanned, deleted
+
+
+def _delete(history, ids, dry_run):
+    if ids and not dry_run:
+        history.filter(history_id__in=ids).delete()
+    return len(ids)
@@ -0,0 +1,147 @@
+import base64
+from collections import Counter
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Notification, NotificationCounter
+
+INBOX_PAGE_SIZE = 50
+# counter rows per upsert statement, well under SQLite's bound-parameter limit
+UPSERT_BATCH = 500
+
+
+def encode_cursor(note):
+    raw = f"{note.created_at.isoformat()}|{note.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(value.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor {value!r}")
+
+
+def _page_queryset(user, cursor, limit, unread_only):
+    qs = Notification.objects.filter(recipient=user)
+    if unread_only:
+        qs = qs.filter(unread=True)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    # one extra row tells whether there is a next page
+    return qs.order_by("-created_at", "-id")[:limit + 1]
+
+
+def _paginate(rows, limit):
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def page(user, cursor=None, limit=INBOX_PAGE_SIZE, unread_only=False):
+    """One keyset page of the user's inbox, newest first; returns (notifications, next_cursor)."""
+    return _paginate(list(_page_queryset(user, cursor, limit, unread_only)), limit)
+
+
+async def apage(user, cursor=None, limit=INBOX_PAGE_SIZE, unread_only=False):
+    return _paginate([n async for n in _page_queryset(user, cursor, limit, unread_only)], limit)
+
+
+def _by_count(per_user):
+    by_count = {}
+    for user_id, count in per_user.items():
+        by_count.setdefault(count, []).append(user_id)
+    return by_count
+
+
+def _add_unread(per_user):
+    # an upsert, so a counter row created lazily by unread_count() can never miss a delivery
+    table = connection.ops.quote_name(NotificationCounter._meta.db_table)
+    with connection.cursor() as cursor:
+        for count, user_ids in _by_count(per_user).items():
+            for i in range(0, len(user_ids), UPSERT_BATCH):
+                batch = user_ids[i:i + UPSERT_BATCH]
+                cursor.execute(
+                    f"INSERT INTO {table} (user_id, unread) VALUES {', '.join(['(%s, %s)'] * len(batch))} "
+                    f"ON CONFLICT (user_id) DO UPDATE SET unread = {table}.unread + EXCLUDED.unread",
+                    [value for user_id in batch for value in (user_id, count)],
+                )
+
+
+def _remove_unread(per_user):
+    for count, user_ids in _by_count(per_user).items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(unread=Greatest(F("unread") - count, 0))
+
+
+def deliver(notifications):
+    """Insert notifications and bump their recipients' unread counters."""
+    if not notifications:
+        return notifications
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications)
+        _add_unread(Counter(n.recipient_id for n in notifications if n.unread))
+    return notifications
+
+
+def discard(queryset):
+    """Delete the notifications in ``queryset`` and take their unread ones off the counters."""
+    with transaction.atomic():
+        per_user = Counter(dict(queryset.filter(unread=True).order_by().values_list("recipient_id").annotate(n=Count("id"))))
+        deleted, _ = queryset.delete()
+        _remove_unread(per_user)
+    return deleted
+
+
+def _recount(user):
+    return Notification.objects.filter(recipient=user, unread=True).count()
+
+
+def unread_count(user):
+    """O(1) unread badge read from the counter row."""
+    counter = NotificationCounter.objects.filter(user=user).values_list("unread", flat=True).first()
+    if counter is None:
+        # a delivery may upsert the row between the count and this insert; that row includes it, so it wins
+        NotificationCounter.objects.bulk_create([NotificationCounter(user=user, unread=_recount(user))], ignore_conflicts=True)
+        counter = NotificationCounter.objects.filter(user=user).values_list("unread", flat=True).get()
+    return counter
+
+
+async def aunread_count(user):
+    counter = await NotificationCounter.objects.filter(user=user).values_list("unread", flat=True).afirst()
+    if counter is None:
+        unread = await Notification.objects.filter(recipient=user, unread=True).acount()
+        await NotificationCounter.objects.abulk_create([NotificationCounter(user=user, unread=unread)], ignore_conflicts=True)
+        counter = await NotificationCounter.objects.filter(user=user).values_list("unread", flat=True).aget()
+    return counter
+
+
+def mark_read(user, ids):
+    with transaction.atomic():
+        changed = Notification.objects.filter(recipient=user, id__in=ids, unread=True).update(unread=False)
+        if changed:
+            NotificationCounter.objects.filter(user=user).update(unread=Greatest(F("unread") - changed, 0))
+    return changed
+
+
+def mark_read_many(queryset):
+    """Mark the unread notifications in ``queryset`` read, across recipients, with one UPDATE."""
+    subquery, params = queryset.filter(unread=True).order_by().values("pk").query.sql_with_params()
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # RETURNING tells whose counters to decrement without a second pass over the rows
+        cursor.execute(f"UPDATE {table} SET unread = %s WHERE id IN ({subquery}) AND unread RETURNING recipient_id", [False, *params])
+        per_user = Counter(user_id for user_id, in cursor.fetchall())
+        _remove_unread(per_user)
+    return sum(per_user.values())
+
+
+def mark_all_read(user):
+    # one UPDATE for the whole inbox, counter reset alongside it
+    with transaction.atomic():
+        changed = Notification.objects.filter(recipient=user, unread=True).update(unread=False)
+        NotificationCounter.objects.filter(user=user).update(unread=0)
+    return changed
@@ -0,0 +1,124 @@
+import calendar
+from datetime import date, timedelta
+
+from .models import LeaveRequest, TeamMembership
+
+# requests that still hold their dates; rejected and cancelled ones free them up
+ACTIVE_STATUSES = (LeaveRequest.STATUS_PENDING, LeaveRequest.STATUS_LEADER_APPROVED, LeaveRequest.STATUS_MANAGER_APPROVED)
+APPROVED_STATUSES = (LeaveRequest.STATUS_MANAGER_APPROVED,)
+# PostgreSQL exclusion constraint from migration 0008, the backstop for requests racing past overlapping()
+OVERLAP_CONSTRAINT = "personnel_leaverequest_no_overlap"
+OVERLAP_MESSAGE = "You already have a leave request overlapping these dates"
+
+
+def absences(start, end, team=None, department=None, statuses=ACTIVE_STATUSES):
+    """Leave requests overlapping the inclusive range [start, end].
+
+    ``team`` limits to the team's current members, ``department`` to the
+    applicants' department. The overlap test is served by the
+    (start_date, end_date) index.
+    """
+    qs = LeaveRequest.objects.filter(start_date__lte=end, end_date__gte=start, status__in=statuses)
+    if team is not None:
+        qs = qs.filter(applicant__in=TeamMembership.objects.filter(team=team).values("employee_id"))
+    if department is not None:
+        qs = qs.filter(applicant__department=department)
+    return qs
+
+
+def overlapping(applicant, start, end, exclude=None):
+    """The applicant's own active requests sharing at least one day with [start, end]."""
+    qs = absences(start, end).filter(applicant=applicant)
+    if exclude is not None:
+        qs = qs.exclude(pk=exclude)
+    return qs
+
+
+def violates_overlap(error):
+    """Whether an IntegrityError was raised by the overlap exclusion constraint."""
+    return OVERLAP_CONSTRAINT in str(error)
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def daily_counts(start, end, rows):
+    """People absent on each day of [start, end] from (applicant_id, start_date, end_date) rows.
+
+    Each applicant's requests are merged first so overlapping requests count
+    once, then a difference array gives every day's count in O(rows + days).
+    """
+    days = (end - start).days + 1
+    if days <= 0:
+        return {}
+    by_applicant = {}
+    for applicant_id, first, last in rows:
+        first, last = max(first, start), min(last, end)
+        if first <= last:
+            by_applicant.setdefault(applicant_id, []).append((first, last))
+    diff = [0] * (days + 1)
+    for intervals in by_applicant.values():
+        for first, last in _merge(intervals):
+            diff[(first - start).days] += 1
+            diff[(last - start).days + 1] -= 1
+    counts, running = {}, 0
+    for offset in range(days):
+        running += diff[offset]
+        counts[start + timedelta(days=offset)] = running
+    return counts
+
+
+def peak_absences(start, end, team=None, department=None, statuses=ACTIVE_STATUSES, exclude_applicant=None):
+    """Largest number of people off on any single day of [start, end]."""
+    qs = absences(start, end, team, department, statuses)
+    if exclude_applicant is not None:
+        qs = qs.exclude(applicant=exclude_applicant)
+    counts = daily_counts(start, end, qs.values_list("applicant_id", "start_date", "end_date"))
+    return max(counts.values(), default=0)
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def month_view(year, month, team=None, department=None, statuses=ACTIVE_STATUSES):
+    """JSON-ready month calendar: the absences touching the month plus per-day counts."""
+    first, last = month_bounds(year, month)
+    leaves = list(
+        absences(first, last, team, department, statuses)
+        .select_related("applicant")
+        .only("start_date", "end_date", "status", "applicant__username", "applicant__first_name", "applicant__last_name")
+        .order_by("start_date", "applicant_id")
+    )
+    counts = daily_counts(first, last, [(lr.applicant_id, lr.start_date, lr.end_date) for lr in leaves])
+    return {
+        "month": f"{year:04d}-{month:02d}",
+        "absences": [
+            {
+                "id": lr.id,
+                "applicant": {"id": lr.applicant_id, "name": lr.applicant.get_full_name() or lr.applicant.username},
+                "start_date": lr.start_date.isoformat(),
+                "end_date": lr.end_date.isoformat(),
+                "status": lr.status,
+            }
+            for lr in leaves
+        ],
+        "days": [{"date": day.isoformat(), "absent": count} for day, count in counts.items()],
+    }
+
+
+def understaffed(team, applicant, start, end):
+    """Whether ``applicant`` taking [start, end] off would leave ``team`` below its minimum staffing."""
+    if not team.min_staffing:
+        return False
+    members = set(TeamMembership.objects.filter(team=team).values_list("employee_id", flat=True))
+    others = peak_absences(start, end, team=team, exclude_applicant=applicant)
+    present = len(members) - others - (1 if applicant.pk in members else 0)
+    return present < team.min_staffing
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import permissions
+from .models import LeaveRequest
+from .versioning import bump_version
+
+LEADER = "leader"
+MANAGER = "manager"
+ROLES = (LEADER, MANAGER)
+
+APPROVED = "approved"
+REJECTED = "rejected"
+DECISIONS = (APPROVED, REJECTED)
+
+
+def assigned(user, role, resolver=None):
+    """Requests ``user`` decides as ``role``, whatever their status.
+
+    The leader step is taken by the request's team leader or by anyone granted
+    ``personnel.approve_leaves`` on its team.
+    """
+    if role == LEADER:
+        return LeaveRequest.objects.filter(leader=user) | permissions.delegated_leaves(user, resolver)
+    return LeaveRequest.objects.filter(manager=user)
+
+
+def reviewable(user, role, resolver=None):
+    """Requests currently waiting on ``user`` acting as ``role``."""
+    if role == LEADER:
+        return assigned(user, role, resolver).filter(status=LeaveRequest.STATUS_PENDING)
+    # requests without a team leader go straight to the manager
+    return assigned(user, role).filter(
+        Q(status=LeaveRequest.STATUS_LEADER_APPROVED) | Q(status=LeaveRequest.STATUS_PENDING, leader__isnull=True)
+    )
+
+
+def _transitions(role, decision):
+    """(extra filter, target status) pairs for one decision.
+
+    pending --leader approves--> leader_approved --manager approves--> manager_approved
+    A leader approval is final when the request has no manager; any rejection is final.
+    """
+    if decision == REJECTED:
+        return [(Q(), LeaveRequest.STATUS_REJECTED)]
+    if role == MANAGER:
+        return [(Q(), LeaveRequest.STATUS_MANAGER_APPROVED)]
+    return [
+        (Q(manager__isnull=False), LeaveRequest.STATUS_LEADER_APPROVED),
+        (Q(manager__isnull=True), LeaveRequest.STATUS_MANAGER_APPROVED),
+    ]
+
+
+def decide(user, ids, role, decision, resolver=None):
+    """Apply one decision to many requests with conditional UPDATEs.
+
+    Each UPDATE is guarded on the current status, so requests decided
+    concurrently (or not assigned to ``user``) are skipped rather than
+    overwritten. Returns the requests this call actually moved.
+    """
+    if role not in ROLES or decision not in DECISIONS:
+        raise ValueError(f"Unknown leave decision {role}/{decision}")
+    now = timezone.now()
+    ids = list(ids)
+    if not ids:
+        return []
+    with transaction.atomic():
+        changed = 0
+        for extra, status in _transitions(role, decision):
+            changed += reviewable(user, role, resolver).filter(extra, pk__in=ids).update(**{
+                "status": status,
+                f"{role}_decision": decision,
+                f"{role}_decision_at": now,
+            })
+        if not changed:
+            return []
+        # the decision timestamp identifies exactly the rows this call updated
+        decided = list(
+            assigned(user, role, resolver).filter(pk__in=ids, **{f"{role}_decision_at": now}).select_related("applicant")
+        )
+        after_decision(user, decided, role, decision)
+    return decided
+
+
+def after_decision(user, decided, role, decision):
+    from . import balances, outbox
+
+    # querysets updates skip post_save, so bump the dashboard version here
+    bump_version("leaves")
+    if decision == APPROVED:
+        # only requests that reached manager_approved are deducted
+        balances.deduct(decided)
+    outbox.dispatch("leave_decided", actor=user, payload={
+        "ids": [lr.id for lr in decided], "role": role, "decision": decision,
+    })
@@ -0,0 +1,353 @@
+import asyncio
+import http.client
+import io
+import json
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+# scenario -> ordered steps (method, sync url name, async url name); each virtual user cycles through its steps
+SCENARIOS = {
+    "dashboard": [("GET", "personnel:dashboard_home", "personnel:async_dashboard_home")],
+    "notifications": [("GET", "personnel:notifications", "personnel:async_notifications")],
+    "sessions": [("GET", "personnel:sessions_list", "personnel:async_sessions_list")],
+    "clock": [
+        ("POST", "personnel:session_start", "personnel:async_session_start"),
+        ("POST", "personnel:session_stop", "personnel:async_session_stop"),
+    ],
+}
+# journey -> steps (label, method, sync url name, async url name, expected status); every simulated employee walks
+# the whole journey, and a step answered with anything else ends that employee's journey
+JOURNEYS = {
+    "morning": [
+        ("login", "POST", "login", "login", 302),
+        ("dashboard", "GET", "personnel:dashboard_home", "personnel:async_dashboard_home", 200),
+        ("start_session", "POST", "personnel:session_start", "personnel:async_session_start", 302),
+        ("notifications", "GET", "personnel:notifications", "personnel:async_notifications", 200),
+        ("stop_session", "POST", "personnel:session_stop", "personnel:async_session_stop", 302),
+    ],
+}
+MODES = ("sync", "async")
+TARGETS = ("asgi", "wsgi", "http")
+# SQLSTATEs of lock timeouts, deadlocks and serialization failures on PostgreSQL
+LOCK_SQLSTATES = {"40001", "40P01", "55P03"}
+
+
+class Browser:
+    """Cookie jar of one simulated employee, replaying the CSRF token the way a browser form would."""
+
+    def __init__(self, cookies=None):
+        self.cookies = {settings.CSRF_COOKIE_NAME: get_random_string(32), **(cookies or {})}
+
+    @classmethod
+    def logged_in(cls, user):
+        client = Client()
+        client.force_login(user)
+        return cls({settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value})
+
+    def headers(self):
+        return [
+            (b"cookie", "; ".join(f"{name}={value}" for name, value in self.cookies.items()).encode()),
+            (settings.CSRF_HEADER_NAME[5:].lower().replace("_", "-").encode(), self.cookies[settings.CSRF_COOKIE_NAME].encode()),
+        ]
+
+    def absorb(self, headers):
+        for name, value in headers:
+            if name.lower() == b"set-cookie":
+                jar = SimpleCookie()
+                jar.load(value.decode("latin-1"))
+                for morsel in jar.values():
+                    self.cookies[morsel.key] = morsel.value
+
+
+def login_headers(user):
+    """Cookie and CSRF headers of a fresh authenticated session for ``user``."""
+    return Browser.logged_in(user).headers()
+
+
+def _form(body):
+    return [(b"content-type", b"application/x-www-form-urlencoded")] if body else []
+
+
+class AsgiTarget:
+    """The ASGI application driven in-process; sync views share one thread, as under a real ASGI server."""
+
+    name = "asgi"
+
+    def __init__(self, app, host="localhost"):
+        self.app = app
+        self.host = host
+
+    async def request(self, method, path, headers, body=b""):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+            "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+            "headers": [(b"host", self.host.encode()), *headers, *_form(body)], "client": ("127.0.0.1", 0), "server": (self.host, 80),
+        }
+        body_sent = False
+        disconnected = asyncio.Event()
+        response = {"status": None, "headers": []}
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # the client never goes away; the handler cancels this wait once it has responded
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response.update(status=message["status"], headers=message.get("headers", []))
+
+        await self.app(scope, receive, send)
+        return response["status"], response["headers"]
+
+
+class WsgiTarget:
+    """The WSGI application driven in-process, one worker thread per request in flight."""
+
+    name = "wsgi"
+
+    def __init__(self, app, host="localhost"):
+        self.app = app
+        self.host = host
+
+    def _call(self, method, path, headers, body):
+        environ = {
+            "REQUEST_METHOD": method, "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+            "SERVER_NAME": self.host, "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "REMOTE_ADDR": "127.0.0.1",
+            "HTTP_HOST": self.host, "CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr,
+            "wsgi.version": (1, 0), "wsgi.url_scheme": "http", "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+        }
+        for name, value in [*headers, *_form(body)]:
+            key = name.decode().upper().replace("-", "_")
+            environ[key if key == "CONTENT_TYPE" else f"HTTP_{key}"] = value.decode("latin-1")
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response.update(status=int(status.split()[0]), headers=[(k.encode(), v.encode("latin-1")) for k, v in response_headers])
+
+        result = self.app(environ, start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            # closing fires request_finished, which releases the thread's DB connection
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"]
+
+    async def request(self, method, path, headers, body=b""):
+        return await asyncio.to_thread(self._call, method, path, headers, body)
+
+
+class HttpTarget:
+    """A running server, e.g. ``runserver`` or uvicorn against the same database."""
+
+    name = "http"
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+
+    def _call(self, method, path, headers, body):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.putrequest(method, self.prefix + path)
+            for name, value in [*headers, *_form(body), (b"content-length", str(len(body)).encode())]:
+                conn.putheader(name.decode(), value.decode("latin-1"))
+            conn.endheaders(body or None)
+            response = conn.getresponse()
+            response.read()
+            return response.status, [(k.lower().encode(), v.encode("latin-1")) for k, v in response.getheaders()]
+        finally:
+            conn.close()
+
+    async def request(self, method, path, headers, body=b""):
+        return await asyncio.to_thread(self._call, method, path, headers, body)
+
+
+def _percentile(samples, p):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+class Result:
+    def __init__(self, scenario, mode):
+        self.scenario = scenario
+        self.mode = mode
+        self.latencies = []
+        self.errors = 0
+        self.lock_errors = 0
+        self.seconds = 0.0
+        self.steps = {}
+
+    def record(self, latency, ok, step=None):
+        self.latencies.append(latency)
+        self.errors += not ok
+        if step is not None:
+            part = self.steps.setdefault(step, Result(step, self.mode))
+            part.record(latency, ok)
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def rate(self):
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    @property
+    def mean_ms(self):
+        return statistics.fmean(self.latencies) * 1000 if self.latencies else 0.0
+
+    @property
+    def median_ms(self):
+        return self.percentile_ms(50)
+
+    def percentile_ms(self, p):
+        return _percentile(self.latencies, p) * 1000
+
+    def as_dict(self):
+        data = {
+            "requests": self.requests, "errors": self.errors, "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "mean_ms": round(self.mean_ms, 2), "p50_ms": round(self.percentile_ms(50), 2),
+            "p95_ms": round(self.percentile_ms(95), 2), "p99_ms": round(self.percentile_ms(99), 2),
+        }
+        if self.seconds:
+            # lock failures are only visible in-process; None means they were not counted
+            lock_rate = None if self.lock_errors is None else round(self.lock_errors / self.requests, 4) if self.requests else 0.0
+            data.update(seconds=round(self.seconds, 3), throughput=round(self.rate, 2), lock_errors=self.lock_errors, lock_rate=lock_rate)
+        if self.steps:
+            data["steps"] = {name: part.as_dict() for name, part in self.steps.items()}
+        return data
+
+
+def is_lock_error(exc):
+    if isinstance(exc, OperationalError) and "locked" in str(exc):
+        return True  # SQLite "database is locked" / "database table is locked"
+    cause = exc.__cause__ or exc
+    return (getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)) in LOCK_SQLSTATES
+
+
+@contextmanager
+def counting_lock_errors():
+    """Yields a dict whose "count" tracks the lock failures of in-process requests while the block runs."""
+    counter = {"count": 0}
+
+    def receiver(sender, request=None, **kwargs):
+        exc = sys.exc_info()[1]
+        if exc is not None and is_lock_error(exc):
+            counter["count"] += 1
+
+    got_request_exception.connect(receiver, weak=False)
+    try:
+        yield counter
+    finally:
+        got_request_exception.disconnect(receiver)
+
+
+async def run_scenario(target, scenario, mode, browsers, requests, concurrency):
+    """Send ``requests`` requests with ``concurrency`` virtual users in flight, each logged in as one of ``browsers``."""
+    steps = [(method, reverse(sync_name if mode == "sync" else async_name)) for method, sync_name, async_name in SCENARIOS[scenario]]
+    result = Result(scenario, mode)
+    remaining = requests
+
+    async def virtual_user(browser):
+        nonlocal remaining
+        step = 0
+        while remaining > 0:
+            remaining -= 1
+            method, path = steps[step % len(steps)]
+            step += 1
+            started = time.perf_counter()
+            try:
+                status, headers = await target.request(method, path, browser.headers())
+                browser.absorb(headers)
+            except Exception:
+                status = None
+            result.record(time.perf_counter() - started, status is not None and status < 400)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(browsers[i % len(browsers)]) for i in range(concurrency)))
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+async def run_journey(target, journey, mode, usernames, password, concurrency, iterations=1):
+    """Walk ``journey`` once per employee and iteration, with at most ``concurrency`` employees mid-journey.
+
+    Employees start all at once, as in the morning burst, each from a fresh
+    cookie jar so the login step does the real password check.
+    """
+    steps = [
+        (label, method, reverse(sync_name if mode == "sync" else async_name), expected)
+        for label, method, sync_name, async_name, expected in JOURNEYS[journey]
+    ]
+    result = Result(journey, mode)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def employee(username):
+        async with gate:
+            browser = Browser()
+            for label, method, path, expected in steps:
+                body = urlencode({"username": username, "password": password}).encode() if label == "login" else b""
+                started = time.perf_counter()
+                try:
+                    status, headers = await target.request(method, path, browser.headers(), body)
+                    browser.absorb(headers)
+                except Exception:
+                    status = None
+                result.record(time.perf_counter() - started, status == expected, step=label)
+                if status != expected:
+                    return
+
+    started = time.perf_counter()
+    await asyncio.gather(*(employee(username) for _ in range(iterations) for username in usernames))
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def report(results, target, options):
+    """JSON-ready summary; two reports with the same ``config`` can be compared run against run."""
+    return {
+        "generated_at": timezone.now().isoformat(),
+        "target": target.name,
+        "database": connection.vendor,
+        "config": options,
+        "runs": [{"name": r.scenario, "mode": r.mode, **r.as_dict()} for r in results],
+    }
+
+
+def compare(current, previous, keys=("throughput", "p50_ms", "p95_ms", "p99_ms", "error_rate", "lock_rate")):
+    """(name, mode, key, previous, current) for every run present in both reports."""
+    before = {(run["name"], run["mode"]): run for run in previous.get("runs", [])}
+    rows = []
+    for run in current["runs"]:
+        old = before.get((run["name"], run["mode"]))
+        if old is None:
+            continue
+        rows += [(run["name"], run["mode"], key, old.get(key), run.get(key)) for key in keys if key in run]
+    return rows
+
+
+def load_report(path):
+    with open(path) as fh:
+        return json.load(fh)
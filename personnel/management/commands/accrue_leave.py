@@ -0,0 +1,32 @@
+import argparse
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from personnel.balances import BATCH_SIZE, accrue, annual_days
+
+def days_argument(value):
+    try:
+        days = Decimal(value)
+    except InvalidOperation:
+        days = None
+    if days is None or not days.is_finite() or days <= 0:
+        raise argparse.ArgumentTypeError(f"expected a positive number of days, got {value!r}")
+    return days
+
+class Command(BaseCommand):
+    help = "Credit the yearly leave entitlement to every active employee; safe to rerun. Usage: [--year YYYY] [--days N] [--batch-size N]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, default=timezone.localdate().year)
+        parser.add_argument("--days", type=days_argument, default=None, help="entitlement in days (default LEAVE_ANNUAL_DAYS)")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        days = annual_days() if options["days"] is None else options["days"]
+        started = time.monotonic()
+        posted = accrue(options["year"], days=days, batch_size=options["batch_size"])
+        elapsed = time.monotonic() - started
+        rate = posted / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Posted {posted} accrual(s) of up to {days} day(s) for {options['year']} in {elapsed:.2f}s ({rate:.0f} rows/s)"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from personnel.retention import RETENTION_BATCH_SIZE, archive_dir, archive_notifications, expired_notifications, retention_days
+
+class Command(BaseCommand):
+    help = "Archive read notifications older than the retention window to gzip JSONL and delete them. Usage: [--days N] [--out-dir path] [--batch-size N] [--dry-run]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="retention window in days (default NOTIFICATION_RETENTION_DAYS)")
+        parser.add_argument("--out-dir", default=None, help="archive directory (default NOTIFICATION_ARCHIVE_DIR)")
+        parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE, help="rows archived and deleted per statement")
+        parser.add_argument("--dry-run", action="store_true", help="only count the rows that would be archived")
+
+    def handle(self, *args, **options):
+        days = retention_days() if options["days"] is None else options["days"]
+        if options["dry_run"]:
+            count = expired_notifications(days).count()
+            self.stdout.write(f"{count} read notifications older than {days} days would be archived")
+            return
+
+        def progress(rows, secs):
+            self.stdout.write(f"{rows} rows archived ({rows / secs if secs else 0:.0f} rows/s)")
+
+        directory = options["out_dir"] or archive_dir()
+        total, secs = archive_notifications(days, directory, options["batch_size"], progress=progress if options["verbosity"] > 1 else None)
+        rate = total / secs if secs else 0
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} notifications to {directory} in {secs:.2f}s ({rate:.0f} rows/s)"))
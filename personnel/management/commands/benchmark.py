@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from personnel import benchmarks, org
+from personnel.models import Employee
+from personnel.synthetic import generate
+from personnel.versioning import bump_version
+import time
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot views and the timesheet export against synthetic organisations of several sizes (rolled back afterwards) "
+        "and compare with baselines recorded on this machine. Usage: [--sizes 100 1000] [--years N] [--repeat N] [--only name ...] "
+        "[--threshold 0.25] [--baseline path.json] [--save-baseline]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="employees per run")
+        parser.add_argument("--years", type=int, default=1, help="years of generated history")
+        parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+        parser.add_argument("--only", nargs="+", choices=sorted(benchmarks.BENCHMARKS), help="run only these benchmarks")
+        parser.add_argument("--threshold", type=float, default=benchmarks.REGRESSION_THRESHOLD, help="allowed slowdown as a fraction of the baseline")
+        parser.add_argument("--baseline", default=benchmarks.BASELINES_PATH, help="baselines JSON file, local to this machine")
+        parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baselines")
+
+    def handle(self, *args, **options):
+        names = options["only"] or list(benchmarks.BENCHMARKS)
+        baselines = benchmarks.load_baselines(options["baseline"])
+        found = []
+        self.stdout.write(f"{'size':>7}  {'benchmark':<20}{'ms':>9}{'queries':>9}{'baseline ms':>13}{'queries':>9}")
+        for size in options["sizes"]:
+            results = self.run_size(size, names, options)
+            baseline = baselines.get(str(size), {})
+            if not baseline and not options["save_baseline"]:
+                self.stdout.write(f"{size:>7}  no baseline in {options['baseline']}, record one with --save-baseline")
+            for name, result in results.items():
+                expected = baseline.get(name)
+                previous = f"{expected['ms']:>13.1f}{expected['queries']:>9}" if expected else f"{'-':>13}{'-':>9}"
+                self.stdout.write(f"{size:>7}  {name:<20}{result['ms']:>9.1f}{result['queries']:>9}{previous}")
+            found += [f"{size} employees, {message}" for message in benchmarks.regressions(results, baseline, options["threshold"])]
+            baselines.setdefault(str(size), {}).update(results)
+        if options["save_baseline"]:
+            benchmarks.save_baselines(baselines, options["baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Baselines saved to {options['baseline']}"))
+            return
+        if found:
+            raise CommandError("Performance regressions:\n" + "\n".join(found))
+        self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def run_size(self, size, names, options):
+        prefix = f"bench{size}"
+        results = {}
+        try:
+            with transaction.atomic():
+                started = time.monotonic()
+                generate(size, years=options["years"], prefix=prefix)
+                self.stdout.write(f"{size:>7}  generated in {time.monotonic() - started:.1f}s")
+                # the first employee manages a department and leads a team, so every widget has data
+                user = Employee.objects.get(username=f"{prefix}-0")
+                results = benchmarks.run(user, names, options["repeat"])
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            # cached org graph and fragments may still describe the rolled back rows
+            org.invalidate()
+            for name in ("leaves", "notices", "permissions"):
+                bump_version(name)
+        return results
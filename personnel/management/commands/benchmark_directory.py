@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from personnel.models import Department, Employee
+from personnel.search import get_backend, search_employees
+from personnel.synthetic import FIRST_NAMES, LAST_NAMES, TITLES
+import random
+import statistics
+import time
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_search(q):
+    # the pre-index directory query, kept for comparison
+    return list(
+        Employee.objects.filter(is_active=True).filter(
+            Q(first_name__icontains=q) | Q(last_name__icontains=q) | Q(job_title__icontains=q) | Q(department__name__icontains=q)
+        ).select_related("department")[:200]
+    )
+
+
+class Command(BaseCommand):
+    help = "Time directory search against synthetic employees (rolled back afterwards). Usage: [--sizes 10000 100000] [--repeat N]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+        parser.add_argument("--repeat", type=int, default=5, help="timed runs per query")
+        parser.add_argument("--queries", nargs="+", default=["ali", "eng", "sara kar", "account", "moradi data"])
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        self.stdout.write(f"backend: {type(backend).__name__}")
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    self.populate(size, backend)
+                    for q in options["queries"]:
+                        old = self.time(lambda: legacy_search(q), options["repeat"])
+                        new = self.time(lambda: search_employees(q), options["repeat"])
+                        self.stdout.write(f"{size:>8} employees  q={q!r:<14} icontains {old:8.2f} ms   index {new:8.2f} ms")
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def populate(self, size, backend):
+        rnd = random.Random(size)
+        departments = Department.objects.bulk_create([Department(name=f"bench-dept-{i}") for i in range(20)])
+        started = time.monotonic()
+        employees = Employee.objects.bulk_create(
+            [
+                Employee(
+                    username=f"bench-{size}-{i}",
+                    first_name=rnd.choice(FIRST_NAMES),
+                    last_name=rnd.choice(LAST_NAMES),
+                    job_title=rnd.choice(TITLES),
+                    department=rnd.choice(departments),
+                )
+                for i in range(size)
+            ],
+            batch_size=2000,
+        )
+        backend.index([e.pk for e in employees])
+        self.stdout.write(f"{size:>8} employees created and indexed in {time.monotonic() - started:.1f}s")
+
+    def time(self, func, repeat):
+        func()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
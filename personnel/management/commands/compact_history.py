@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from personnel.history import HISTORY_BATCH_SIZE, compact
+from personnel.models import Employee
+
+class Command(BaseCommand):
+    help = "Drop employee history rows older than N days that change no tracked field. Usage: [--days N] [--dry-run]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="only rows older than this are compacted")
+        parser.add_argument("--batch-size", type=int, default=HISTORY_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="count without deleting")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        scanned, deleted = compact(Employee, before, batch_size=options["batch_size"], dry_run=options["dry_run"])
+        prefix = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {deleted} of {scanned} history rows older than {before:%Y-%m-%d}"))
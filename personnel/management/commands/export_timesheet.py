@@ -1,47 +1,176 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from personnel.models import TimeSession, TimeEntry
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from personnel.models import Department, TimesheetDay
+from personnel.timesheets import (
+    EXPORT_CHUNK_SIZE, export_shard, filter_users, iter_daily_totals, iter_rollup_totals, shard_sessions, write_timesheet_csv,
+)
 from django.contrib.auth import get_user_model
-import csv
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date
-from django.db.models import Q
+import csv
+import heapq
+import multiprocessing
+import os
+import shutil
 
 User = get_user_model()
 
+
+def parse_month(value):
+    try:
+        year, mon = [int(x) for x in value.split("-")]
+        return date(year, mon, 1)
+    except ValueError:
+        raise CommandError(f"Invalid month {value!r}, expected YYYY-MM")
+
+
+def next_month(day):
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
 class Command(BaseCommand):
-    help = "Export monthly aggregated timesheet for a user or all users. Usage: --month YYYY-MM [--user username] --out path.csv"
+    help = (
+        "Export aggregated timesheet for a user or all users. "
+        "Usage: --month YYYY-MM | --from YYYY-MM --to YYYY-MM [--user username] [--department name] "
+        "[--workers N --split month|users [--partitioned]] [--source rollup|sessions] --out path.csv"
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("--month", required=True, help="YYYY-MM")
+        parser.add_argument("--month", required=False, help="YYYY-MM")
+        parser.add_argument("--from", dest="from_month", required=False, help="first month YYYY-MM (inclusive)")
+        parser.add_argument("--to", dest="to_month", required=False, help="last month YYYY-MM (inclusive)")
         parser.add_argument("--user", required=False, help="username")
+        parser.add_argument("--department", required=False, help="department name or code")
         parser.add_argument("--out", required=True, help="output CSV path")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows fetched per DB round trip")
+        parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+        parser.add_argument("--split", choices=["month", "users"], default="month", help="how work is sharded across workers")
+        parser.add_argument("--partitioned", action="store_true", help="keep one CSV per shard instead of merging")
+        parser.add_argument("--source", choices=["rollup", "sessions"], default="rollup", help="read the daily rollup or aggregate raw sessions")
 
     def handle(self, *args, **options):
-        month = options["month"]
+        start, end = self.resolve_range(options)
         out = options["out"]
         username = options.get("user")
-        year, mon = [int(x) for x in month.split("-")]
-        start = date(year, mon, 1)
-        if mon == 12:
-            end = date(year + 1, 1, 1)
-        else:
-            end = date(year, mon + 1, 1)
-        qs = TimeSession.objects.filter(start_time__date__gte=start, start_time__date__lt=end, end_time__isnull=False)
+        user_id = department_id = None
         if username:
-            user = User.objects.get(username=username)
-            qs = qs.filter(user=user)
-        # aggregate per user per day
-        rows = {}
-        for s in qs:
-            key = (s.user.username, s.start_time.date())
-            rows.setdefault(key, 0)
-            dur = (s.end_time - s.start_time).total_seconds()
-            rows[key] += dur
-        # write CSV
+            try:
+                user_id = User.objects.values_list("id", flat=True).get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {username}")
+        if options.get("department"):
+            name = options["department"]
+            department_id = Department.objects.filter(Q(name=name) | Q(code=name)).values_list("id", flat=True).first()
+            if department_id is None:
+                raise CommandError(f"Unknown department {name}")
+
+        if options["workers"] <= 1 and not options["partitioned"]:
+            # per user/day sums are computed by the DB and streamed straight into the CSV
+            if options["source"] == "rollup":
+                days = filter_users(TimesheetDay.objects.all(), department_id, user_id=user_id)
+                rows = iter_rollup_totals(start, end, days=days, chunk_size=options["chunk_size"])
+            else:
+                sessions = shard_sessions(department_id, user_id=user_id)
+                rows = iter_daily_totals(start, end, sessions=sessions, chunk_size=options["chunk_size"])
+            with open(out, "w", newline="") as fh:
+                count = write_timesheet_csv(fh, rows)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} rows to {out}"))
+            return
+
+        shards = self.build_shards(start, end, out, options, department_id, user_id)
+        results = self.run_shards(shards, options["workers"])
+        total = 0
+        for shard in shards:
+            label, count, secs = results[shard["label"]]
+            total += count
+            rate = count / secs if secs else 0
+            self.stdout.write(f"shard {label}: {count} rows in {secs:.2f}s ({rate:.0f} rows/s) -> {shard['path']}")
+        if options["partitioned"]:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {total} rows to {len(shards)} shard files"))
+            return
+        self.merge_shards(shards, out, options["split"], department_id, user_id)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} rows to {out}"))
+
+    def resolve_range(self, options):
+        if options.get("month"):
+            if options.get("from_month") or options.get("to_month"):
+                raise CommandError("Use either --month or --from/--to")
+            start = parse_month(options["month"])
+            return start, next_month(start)
+        if not (options.get("from_month") and options.get("to_month")):
+            raise CommandError("--month or both --from and --to are required")
+        start = parse_month(options["from_month"])
+        end = next_month(parse_month(options["to_month"]))
+        if end <= start:
+            raise CommandError("--to must not be before --from")
+        return start, end
+
+    def employee_ids(self, department_id, user_id):
+        ids = User.objects.order_by("id")
+        if department_id is not None:
+            ids = ids.filter(department_id=department_id)
+        if user_id is not None:
+            ids = ids.filter(id=user_id)
+        return ids
+
+    def merge_shards(self, shards, out, split, department_id, user_id):
+        """Join the shard files into ``out`` in the order a single-process export writes: by user id, then date."""
         with open(out, "w", newline="") as fh:
-            writer = csv.writer(fh)
-            writer.writerow(["username","date","hours"])
-            for (username, d), secs in sorted(rows.items()):
-                hours = round(secs/3600, 2)
-                writer.writerow([username, d.isoformat(), hours])
-        self.stdout.write(self.style.SUCCESS(f"Wrote {len(rows)} rows to {out}"))
+            fh.write("username,date,hours\r\n")
+            if split == "users":
+                # user shards are consecutive id ranges, already in order
+                for shard in shards:
+                    with open(shard["path"], newline="") as part:
+                        shutil.copyfileobj(part, fh)
+            else:
+                # every month shard runs through the users in id order; interleave them user by user
+                rank = dict(self.employee_ids(department_id, user_id).values_list("username", "id"))
+                parts = [open(shard["path"], newline="") for shard in shards]
+                try:
+                    rows = heapq.merge(*(csv.reader(part) for part in parts), key=lambda row: (rank.get(row[0], 0), row[1]))
+                    csv.writer(fh).writerows(rows)
+                finally:
+                    for part in parts:
+                        part.close()
+        for shard in shards:
+            os.remove(shard["path"])
+
+    def build_shards(self, start, end, out, options, department_id, user_id):
+        base, ext = os.path.splitext(out)
+        common = {"department_id": department_id, "user_id": user_id, "chunk_size": options["chunk_size"], "source": options["source"]}
+        shards = []
+        if options["split"] == "month":
+            month = start
+            while month < end:
+                label = month.strftime("%Y-%m")
+                shards.append(dict(common, label=label, start=month, end=next_month(month), path=f"{base}.{label}{ext or '.csv'}"))
+                month = next_month(month)
+            return shards
+        # contiguous user id ranges holding roughly the same number of employees
+        ids = list(self.employee_ids(department_id, user_id).values_list("id", flat=True))
+        parts = max(1, min(options["workers"], len(ids)))
+        size = -(-len(ids) // parts) if ids else 1
+        bounds = ids[::size] or [0]
+        for i, lo in enumerate(bounds):
+            hi = bounds[i + 1] if i + 1 < len(bounds) else None
+            label = f"users-{i + 1:03d}"
+            shards.append(dict(common, label=label, start=start, end=end, user_range=(lo, hi), path=f"{base}.{label}{ext or '.csv'}"))
+        return shards
+
+    def run_shards(self, shards, workers):
+        if workers <= 1:
+            return {shard["label"]: export_shard(shard) for shard in shards}
+        # children must open their own DB connections rather than share the parent's
+        connections.close_all()
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(export_shard, shard) for shard in shards]
+            for future in as_completed(futures):
+                label, count, secs = future.result()
+                results[label] = (label, count, secs)
+        return results
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from personnel.models import Employee
+from personnel.synthetic import GENERATE_BATCH_SIZE, generate
+import time
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create a synthetic organisation with its sessions, time entries, leave requests and notifications. "
+        "Usage: [--employees N] [--departments N] [--teams N] [--years N] [--notifications N] [--prefix gen] [--seed N]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employees", type=int, default=1000)
+        parser.add_argument("--departments", type=int, default=10)
+        parser.add_argument("--teams", type=int, default=4, help="teams per department")
+        parser.add_argument("--years", type=int, default=1, help="years of session, time entry and leave history")
+        parser.add_argument("--notifications", type=int, default=50, help="notifications per employee")
+        parser.add_argument("--prefix", default="gen", help="username and department name prefix")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--password", default="password", help="password of every generated employee")
+        parser.add_argument("--batch-size", type=int, default=GENERATE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if Employee.objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Employees prefixed {prefix!r} already exist; pick another --prefix")
+        started = time.monotonic()
+        counts = generate(
+            options["employees"], departments=options["departments"], teams=options["teams"], years=options["years"],
+            notifications=options["notifications"], prefix=prefix, seed=options["seed"], password=options["password"],
+            batch_size=options["batch_size"],
+        )
+        for model, count in counts.items():
+            self.stdout.write(f"{model:<24}{count:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Generated {sum(counts.values())} rows in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from personnel.org_import import IMPORT_BATCH_SIZE, OrgImport, read_rows
+
+class Command(BaseCommand):
+    help = "Sync departments, teams, employees and memberships from HR exports (.csv or JSON lines) with bulk writes. Usage: [--departments F] [--teams F] [--employees F] [--memberships F] [--dry-run]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--departments", help="columns: name, code, description, manager")
+        parser.add_argument("--teams", help="columns: department, name, code, description, min_staffing, team_leader")
+        parser.add_argument("--employees", help="columns: username, national_id, first_name, last_name, email, department, job_title, ...")
+        parser.add_argument("--memberships", help="columns: employee, department, team, is_leader, role, joined_at")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--prune-memberships", action="store_true", help="drop memberships of listed employees that are not in the file")
+        parser.add_argument("--deactivate-missing", action="store_true", help="deactivate employees not in the employees file")
+        parser.add_argument("--dry-run", action="store_true", help="diff and report, then roll back")
+        parser.add_argument("--show-errors", type=int, default=20)
+
+    def handle(self, *args, **options):
+        sources = {name: options[name] for name in ("departments", "teams", "employees", "memberships") if options[name]}
+        if not sources:
+            raise CommandError("Give at least one of --departments, --teams, --employees or --memberships")
+        if options["deactivate_missing"] and "employees" not in sources:
+            raise CommandError("--deactivate-missing needs --employees")
+        try:
+            result = OrgImport(
+                batch_size=options["batch_size"], prune_memberships=options["prune_memberships"], deactivate_missing=options["deactivate_missing"],
+            ).run(dry_run=options["dry_run"], **{name: read_rows(path) for name, path in sources.items()})
+        except OSError as exc:
+            raise CommandError(exc)
+        for label, stats in result.stats.items():
+            self.stdout.write(f"{label}: {stats}")
+        self.stdout.write(f"managers and team leaders changed: {result.references_changed}")
+        for line, message in result.errors[:options["show_errors"]]:
+            self.stderr.write(f"skipped {line}: {message}")
+        rate = result.rows / result.seconds if result.seconds else 0
+        prefix = "Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {result.rows} rows in {result.seconds:.2f}s ({rate:.0f} rows/s), {len(result.errors)} skipped"))
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from guardian.conf import settings as guardian_settings
+from personnel.loadtest import (
+    JOURNEYS, MODES, SCENARIOS, TARGETS, AsgiTarget, Browser, HttpTarget, WsgiTarget, compare, counting_lock_errors,
+    load_report, report, run_journey, run_scenario,
+)
+from personnel.models import Employee
+
+class Command(BaseCommand):
+    help = (
+        "Drive the application with concurrent simulated employees and report latency percentiles, throughput, "
+        "error and DB-lock rates. Usage: [--journey morning | --scenario dashboard,clock] [--target asgi|wsgi|http --url URL] "
+        "[--mode sync|async] [--requests N] [--concurrency N] [--users N] [--password P] [--report out.json] [--compare old.json]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", default=None, help=f"comma separated, from: {', '.join(SCENARIOS)} (default all, unless --journey)")
+        parser.add_argument("--journey", choices=sorted(JOURNEYS), help="walk a scripted journey once per employee instead of looping scenarios")
+        parser.add_argument("--target", choices=TARGETS, default="asgi", help="in-process ASGI or WSGI application, or a running server at --url")
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="server address for --target http")
+        parser.add_argument("--mode", choices=MODES, action="append", help="only run these modes (default both)")
+        parser.add_argument("--requests", type=int, default=500, help="requests per scenario and mode")
+        parser.add_argument("--concurrency", type=int, default=50, help="requests (scenarios) or employees (journeys) in flight")
+        parser.add_argument("--users", type=int, default=20, help="distinct employees to log in as")
+        parser.add_argument("--iterations", type=int, default=1, help="times each employee walks the journey")
+        parser.add_argument("--password", default="password", help="password of every employee, for the journey login step")
+        parser.add_argument("--report", help="write the results as JSON to this path")
+        parser.add_argument("--compare", help="earlier JSON report to compare against")
+
+    def handle(self, *args, **options):
+        scenarios = [] if options["journey"] and not options["scenario"] else [
+            s.strip() for s in (options["scenario"] or ",".join(SCENARIOS)).split(",") if s.strip()
+        ]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        users = list(Employee.objects.filter(is_active=True).exclude(username=guardian_settings.ANONYMOUS_USER_NAME).order_by("id")[:options["users"]])
+        if not users:
+            raise CommandError("No active employees to log in as; create some first (see generate_org)")
+        target = self.target(options)
+        modes = options["mode"] or MODES
+
+        results = []
+        self.stdout.write(f"{'run':<18}{'mode':<7}{'requests':>9}{'errors':>8}{'locks':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for mode in modes:
+            if options["journey"]:
+                results.append(self.run(target, options, run_journey(
+                    target, options["journey"], mode, [u.username for u in users], options["password"], options["concurrency"], options["iterations"],
+                )))
+            if scenarios:
+                browsers = [Browser.logged_in(user) for user in users]
+                for scenario in scenarios:
+                    results.append(self.run(target, options, run_scenario(target, scenario, mode, browsers, options["requests"], options["concurrency"])))
+        for result in results:
+            self.write_result(result)
+            for part in result.steps.values():
+                self.write_result(part, indent="  ")
+
+        data = report(results, target, {
+            key: options[key] for key in ("journey", "scenario", "target", "requests", "concurrency", "users", "iterations")
+        })
+        if options["compare"]:
+            previous = load_report(options["compare"])
+            if (previous.get("config"), previous.get("target"), previous.get("database")) != (data["config"], data["target"], data["database"]):
+                self.stdout.write(self.style.WARNING(f"{options['compare']} was recorded with different settings; numbers may not be comparable"))
+            self.stdout.write(f"{'run':<18}{'mode':<7}{'metric':<12}{'before':>10}{'after':>10}")
+            for name, mode, key, old, new in compare(data, previous):
+                self.stdout.write(f"{name:<18}{mode:<7}{key:<12}{str(old):>10}{str(new):>10}")
+        if options["report"]:
+            with open(options["report"], "w") as fh:
+                json.dump(data, fh, indent=2)
+                fh.write("\n")
+            self.stdout.write(f"Report written to {options['report']}")
+        self.stdout.write(self.style.SUCCESS(f"Load test done: {len(users)} user(s), concurrency {options['concurrency']}, target {target.name}"))
+
+    def target(self, options):
+        if options["target"] == "http":
+            return HttpTarget(options["url"])
+        if options["target"] == "wsgi":
+            return WsgiTarget(get_wsgi_application())
+        return AsgiTarget(get_asgi_application())
+
+    def run(self, target, options, coroutine):
+        async def main():
+            # to_thread() would otherwise cap the requests in flight at the default pool size
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=options["concurrency"]))
+            return await coroutine
+
+        with counting_lock_errors() as locks:
+            result = asyncio.run(main())
+        # a separate server's exceptions never reach this process
+        result.lock_errors = None if target.name == "http" else locks["count"]
+        return result
+
+    def write_result(self, result, indent=""):
+        # journey steps share the run's clock, so only the run has a rate and lock count
+        locks = "-" if indent or result.lock_errors is None else result.lock_errors
+        rate = "-" if indent else f"{result.rate:.1f}"
+        self.stdout.write(
+            f"{indent + result.scenario:<18}{result.mode:<7}{result.requests:>9}{result.errors:>8}{locks!s:>7}{rate:>9}"
+            f"{result.percentile_ms(50):>9.1f}{result.percentile_ms(95):>9.1f}{result.percentile_ms(99):>9.1f}"
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from personnel.outbox import OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, run_worker
+
+class Command(BaseCommand):
+    help = "Expand queued notification events into notifications. Usage: [--loop] [--batch-size N] [--max-attempts N] [--sleep SECONDS]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="keep polling for new events instead of exiting when idle")
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE, help="events claimed per transaction")
+        parser.add_argument("--max-attempts", type=int, default=OUTBOX_MAX_ATTEMPTS, help="attempts before an event is marked failed")
+        parser.add_argument("--sleep", type=float, default=1.0, help="idle poll interval in seconds")
+
+    def handle(self, *args, **options):
+        def report(stats):
+            self.stdout.write(
+                f"{stats['events']} events, {stats['notifications']} notifications, {stats['failed']} failed "
+                f"({stats['events_per_sec']:.1f} events/s)"
+            )
+
+        try:
+            totals = run_worker(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+                idle_sleep=options["sleep"],
+                once=not options["loop"],
+                report=report,
+            )
+        except KeyboardInterrupt:
+            return
+        secs = totals["seconds"]
+        rate = totals["events"] / secs if secs else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {totals['events']} events into {totals['notifications']} notifications "
+            f"({totals['failed']} failed) in {secs:.2f}s ({rate:.1f} events/s)"
+        ))
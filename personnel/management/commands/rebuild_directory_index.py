@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from personnel.search import get_backend
+import time
+
+class Command(BaseCommand):
+    help = "Rebuild the employee directory search index for all employees."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        started = time.monotonic()
+        count = backend.index()
+        secs = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} employees with {type(backend).__name__} in {secs:.2f}s"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from personnel.models import TimeSession
+from personnel.timesheets import rebuild_rollup
+from .export_timesheet import next_month, parse_month
+import time
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Recompute the daily timesheet rollup from raw sessions. Usage: [--from YYYY-MM --to YYYY-MM] [--user username]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from_month", required=False, help="first month YYYY-MM (default: first session)")
+        parser.add_argument("--to", dest="to_month", required=False, help="last month YYYY-MM (default: current month)")
+        parser.add_argument("--user", required=False, help="username")
+
+    def handle(self, *args, **options):
+        user_id = None
+        if options.get("user"):
+            try:
+                user_id = User.objects.values_list("id", flat=True).get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']}")
+        if options.get("from_month"):
+            start = parse_month(options["from_month"])
+        else:
+            first = TimeSession.objects.order_by("start_time").values_list("start_time", flat=True).first()
+            if first is None:
+                self.stdout.write("No sessions to roll up")
+                return
+            start = timezone.localdate(first).replace(day=1)
+        end = next_month(parse_month(options["to_month"]) if options.get("to_month") else timezone.localdate().replace(day=1))
+        month = start
+        total = 0
+        started = time.monotonic()
+        # one transaction per month keeps each rebuild step bounded
+        while month < end:
+            written = rebuild_rollup(month, next_month(month), user_id=user_id)
+            total += written
+            self.stdout.write(f"{month:%Y-%m}: {written} rollup rows")
+            month = next_month(month)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} rollup rows in {time.monotonic() - started:.2f}s"))
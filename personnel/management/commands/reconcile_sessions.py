@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from personnel.reconciliation import DEFAULT_TOLERANCE, reconcile
+from decimal import Decimal
+
+class Command(BaseCommand):
+    help = "Generate TimeEntry rows (source=session) from closed sessions and report overlaps/gaps with manual entries. Usage: [--full] [--dry-run] [--show N]"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="ignore the high-water mark and reconcile every session and generated entry")
+        parser.add_argument("--dry-run", action="store_true", help="compute and report without writing")
+        parser.add_argument("--tolerance", type=Decimal, default=DEFAULT_TOLERANCE, help="manual hours ignored when reporting gaps")
+        parser.add_argument("--show", type=int, default=20, help="discrepancies to print per kind")
+
+    def handle(self, *args, **options):
+        result = reconcile(full=options["full"], dry_run=options["dry_run"], tolerance=options["tolerance"])
+        for label, rows in (("overlap", result.overlaps), ("gap", result.gaps)):
+            for user_id, day, manual, session in rows[:options["show"]]:
+                self.stdout.write(f"{label}: user {user_id} {day} manual {manual}h session {session}h")
+        prefix = "Would reconcile" if options["dry_run"] else "Reconciled"
+        self.stdout.write(self.style.SUCCESS(f"{prefix}: {result} in {result.seconds:.2f}s (high-water mark {result.high_water_mark:%Y-%m-%d %H:%M:%S})"))
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:00
+
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# frozen copies of personnel.search.FTS_TABLE and normalize as of this migration
+FTS_TABLE = "personnel_employee_fts"
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, title, department, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS personnel_employee_search_trgm "
+            "ON personnel_employeesearchdocument USING gin (document gin_trgm_ops)"
+        )
+
+    # backfill existing employees
+    Employee = apps.get_model("personnel", "Employee")
+    EmployeeSearchDocument = apps.get_model("personnel", "EmployeeSearchDocument")
+    rows = [
+        (pk, normalize(f"{first} {last}"), normalize(title), normalize(department))
+        for pk, first, last, title, department in Employee.objects.values_list(
+            "id", "first_name", "last_name", "job_title", "department__name"
+        ).iterator()
+    ]
+    EmployeeSearchDocument.objects.bulk_create(
+        [EmployeeSearchDocument(employee_id=r[0], document=" ".join(filter(None, r[1:]))) for r in rows],
+        batch_size=2000,
+    )
+    if vendor == "sqlite" and rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, name, title, department) VALUES (%s, %s, %s, %s)", rows)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS personnel_employee_search_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0004_notification_inbox'),
+    ]
+
+    operations = [
+        # no-op outside PostgreSQL
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='EmployeeSearchDocument',
+            fields=[
+                ('employee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('document', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
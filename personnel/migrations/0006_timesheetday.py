@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:03
+
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# frozen copy of personnel.timesheets.split_by_day as of this migration
+def split_by_day(start_time, end_time):
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start_time, tz).date()
+    cursor = start_time
+    while cursor < end_time:
+        piece_end = min(end_time, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz))
+        yield day, (piece_end - cursor).total_seconds()
+        cursor = piece_end
+        day += timedelta(days=1)
+
+
+def backfill_rollup(apps, schema_editor):
+    TimeSession = apps.get_model("personnel", "TimeSession")
+    TimesheetDay = apps.get_model("personnel", "TimesheetDay")
+    totals = {}
+    rows = TimeSession.objects.filter(end_time__isnull=False).values_list("user_id", "start_time", "end_time", "location")
+    for user_id, start_time, end_time, location in rows.iterator(chunk_size=2000):
+        for day, secs in split_by_day(start_time, end_time):
+            if secs > 0:
+                total = totals.setdefault((user_id, day, location), [0, 0])
+                total[0] += secs
+                total[1] += 1
+    TimesheetDay.objects.bulk_create(
+        [
+            TimesheetDay(user_id=user_id, date=day, location=location, seconds=round(secs), sessions=count)
+            for (user_id, day, location), (secs, count) in totals.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0005_employee_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimesheetDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('seconds', models.PositiveIntegerField(default=0)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'user'], name='personnel_t_date_ef6032_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'location'), name='personnel_timesheetday_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
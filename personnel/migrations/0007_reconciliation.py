@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0006_timesheetday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timeentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('source', 'session')), fields=('user', 'date'), name='personnel_timeentry_one_session_entry'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:06
+
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+EXCLUSION_CONSTRAINT = "personnel_leaverequest_no_overlap"
+ACTIVE = "('pending', 'leader_approved', 'manager_approved')"
+
+
+def check_no_overlaps(apps, schema_editor):
+    # the constraint below cannot be added over existing conflicts; name them instead of failing inside ALTER TABLE
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT a.id, b.id FROM personnel_leaverequest a JOIN personnel_leaverequest b "
+            "ON a.applicant_id = b.applicant_id AND a.id < b.id AND a.start_date <= b.end_date AND b.start_date <= a.end_date "
+            f"WHERE a.status IN {ACTIVE} AND b.status IN {ACTIVE} ORDER BY a.id, b.id LIMIT 50"
+        )
+        pairs = cursor.fetchall()
+    if pairs:
+        listed = ", ".join(f"{a}/{b}" for a, b in pairs)
+        raise RuntimeError(
+            f"Overlapping active leave requests (id pairs, first 50): {listed}. Reject or cancel one request of each pair, "
+            "then run migrate again."
+        )
+
+
+def add_overlap_constraint(apps, schema_editor):
+    # PostgreSQL only: the database itself refuses a second active request over the same days
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"ALTER TABLE personnel_leaverequest ADD CONSTRAINT {EXCLUSION_CONSTRAINT} "
+        "EXCLUDE USING gist (applicant_id WITH =, daterange(start_date, end_date, '[]') WITH &&) "
+        f"WHERE (status IN {ACTIVE})"
+    )
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"ALTER TABLE personnel_leaverequest DROP CONSTRAINT IF EXISTS {EXCLUSION_CONSTRAINT}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('personnel', '0007_reconciliation'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_no_overlaps, migrations.RunPython.noop),
+        # no-op outside PostgreSQL
+        BtreeGistExtension(),
+        migrations.AddField(
+            model_name='team',
+            name='min_staffing',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['start_date', 'end_date'], name='personnel_l_start_d_88e063_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['applicant', 'start_date'], name='personnel_l_applica_2683dc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['team', 'start_date'], name='personnel_l_team_id_ddb2ea_idx'),
+        ),
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
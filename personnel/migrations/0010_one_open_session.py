@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:15
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def close_duplicate_open_sessions(apps, schema_editor):
+    # Double clicks left some users with several open sessions. Keep the newest
+    # open one and close the others as zero-length, so no hours are invented.
+    TimeSession = apps.get_model("personnel", "TimeSession")
+    open_sessions = TimeSession.objects.filter(end_time__isnull=True)
+    newest = open_sessions.values("user_id").annotate(latest=Max("id")).order_by().values("latest")
+    open_sessions.exclude(id__in=newest).update(end_time=F("start_time"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0009_leave_balances'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='timesession',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_time__isnull', True)), fields=('user',), name='personnel_timesession_one_open_per_user'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0010_one_open_session'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='historicalemployee',
+            name='last_login',
+        ),
+    ]
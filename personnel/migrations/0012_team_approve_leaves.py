@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0011_history_policy'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='team',
+            options={'permissions': [('approve_leaves', "Can approve the team's leave requests")]},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('personnel', '0012_team_approve_leaves'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='personnel_n_created_9b7f87_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(fields=['date'], name='personnel_t_date_89a071_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timesession',
+            index=models.Index(fields=['start_time'], name='personnel_t_start_t_ec3ec7_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0013_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        # existing rows last changed when they were closed, so the next incremental reconcile skips them
+        migrations.RunSQL(
+            "UPDATE personnel_timesession SET updated_at = COALESCE(end_time, created_at)",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def backfill(apps, schema_editor):
+    # inbox.deliver upserts counters from now on; rows written before that may have missed deliveries
+    Notification = apps.get_model("personnel", "Notification")
+    NotificationCounter = apps.get_model("personnel", "NotificationCounter")
+    totals = Notification.objects.values_list("recipient_id").annotate(unread=Count("id", filter=Q(unread=True))).order_by()
+    NotificationCounter.objects.all().delete()
+    NotificationCounter.objects.bulk_create(
+        (NotificationCounter(user_id=user_id, unread=unread) for user_id, unread in totals.iterator()), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personnel', '0014_timesession_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
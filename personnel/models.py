@@ -1,12 +1,11 @@
-from django.db import models
-
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from phonenumber_field.modelfields import PhoneNumberField
-from simple_history.models import HistoricalRecords
+from .history import LoadedStateMixin, PolicyHistoricalRecords
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 # Department
 class Department(models.Model):
@@ -25,15 +24,19 @@ class Team(models.Model):
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name="teams")
     team_leader = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="leading_teams")
     description = models.TextField(blank=True)
+    # members that must stay present on any day; 0 disables the leave capacity check
+    min_staffing = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ("name", "department")
+        # granted per team through guardian, see permissions.approvable_leaves
+        permissions = [("approve_leaves", "Can approve the team's leave requests")]
 
     def __str__(self):
         return f"{self.department.code or self.department.name} / {self.name}"
 
 # Employee (custom user)
-class Employee(AbstractUser):
+class Employee(LoadedStateMixin, AbstractUser):
     father_name = models.CharField(max_length=150, blank=True)
     national_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
     address = models.JSONField(blank=True, default=dict)
@@ -46,7 +49,8 @@ class Employee(AbstractUser):
     profile_picture = models.ImageField(upload_to="profiles/", blank=True, null=True)
     is_admin = models.BooleanField(default=False)
 
-    history = HistoricalRecords()
+    # login bumps last_login on every sign-in; it is not worth a full row copy
+    history = PolicyHistoricalRecords(excluded_fields=["last_login"])
 
     teams = models.ManyToManyField(Team, through="TeamMembership", related_name="members")
 
@@ -56,6 +60,14 @@ class Employee(AbstractUser):
     def __str__(self):
         return self.get_full_name() or self.username
 
+# EmployeeSearchDocument: normalized directory search text, maintained by signals (see personnel.search)
+class EmployeeSearchDocument(models.Model):
+    employee = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, on_delete=models.CASCADE, related_name="search_document")
+    document = models.TextField()
+
+    def __str__(self):
+        return self.document
+
 # explicit through model for membership
 class TeamMembership(models.Model):
     employee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="team_memberships")
@@ -72,16 +84,23 @@ class TeamMembership(models.Model):
         return f"{self.employee} in {self.team} ({'leader' if self.is_leader else 'member'})"
 
 # TimeSession: start/stop presence
-class TimeSession(models.Model):
+class TimeSession(LoadedStateMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="time_sessions")
     start_time = models.DateTimeField()
     end_time = models.DateTimeField(null=True, blank=True)
     location = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # reconciliation's high-water mark; the raw SQL in personnel.clock sets it too
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["-start_time"]
-        indexes = [models.Index(fields=["user", "start_time"])]
+        # start_time alone serves the admin date hierarchy
+        indexes = [models.Index(fields=["user", "start_time"]), models.Index(fields=["start_time"])]
+        constraints = [
+            # at most one open session per user; personnel.clock relies on it for ON CONFLICT
+            models.UniqueConstraint(fields=["user"], condition=models.Q(end_time__isnull=True), name="personnel_timesession_one_open_per_user"),
+        ]
 
     def duration_seconds(self):
         if self.end_time:
@@ -97,6 +116,26 @@ class TimeSession(models.Model):
     def __str__(self):
         return f"{self.user.username} {self.start_time} → {self.end_time or 'open'}"
 
+# TimesheetDay: per user/day/location rollup of closed sessions (see personnel.timesheets)
+class TimesheetDay(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timesheet_days")
+    date = models.DateField()
+    location = models.CharField(max_length=255, blank=True)
+    seconds = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [models.UniqueConstraint(fields=["user", "date", "location"], name="personnel_timesheetday_unique")]
+        indexes = [models.Index(fields=["date", "user"])]
+
+    def hours(self):
+        return round(self.seconds / 3600, 2)
+
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.location or '-'} {self.hours()}h"
+
 # TimeEntry: aggregated / manual timesheet rows
 class TimeEntry(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="time_entries")
@@ -110,11 +149,34 @@ class TimeEntry(models.Model):
 
     class Meta:
         ordering = ["-date"]
-        indexes = [models.Index(fields=["user", "date"])]
+        indexes = [models.Index(fields=["user", "date"]), models.Index(fields=["date"])]
+        constraints = [
+            # reconciliation keeps at most one generated entry per user and day
+            models.UniqueConstraint(fields=["user", "date"], condition=models.Q(source="session"), name="personnel_timeentry_one_session_entry"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} {self.date} {self.hours}"
 
+# ReconciliationState: high-water mark of the session -> time entry reconciliation
+class ReconciliationState(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_mark}"
+
+# DeletedTimeSession: span of a deleted closed session, kept until reconciliation has seen it
+class DeletedTimeSession(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.start_time} - {self.end_time} deleted {self.deleted_at}"
+
 # LeaveRequest workflow
 class LeaveRequest(models.Model):
     STATUS_PENDING = "pending"
@@ -151,10 +213,68 @@ class LeaveRequest(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # date-range probes: start_date <= end AND end_date >= start
+            models.Index(fields=["start_date", "end_date"]),
+            models.Index(fields=["applicant", "start_date"]),
+            models.Index(fields=["team", "start_date"]),
+        ]
 
     def __str__(self):
         return f"{self.applicant} {self.start_date}→{self.end_date} ({self.status})"
 
+# Holiday: non-working days skipped when counting leave days
+class Holiday(models.Model):
+    date = models.DateField(unique=True)
+    name = models.CharField(max_length=200)
+
+    class Meta:
+        ordering = ["date"]
+
+    def __str__(self):
+        return f"{self.date} {self.name}"
+
+# LeaveLedgerEntry: append-only accruals (+) and deductions (-) in leave days (see personnel.balances)
+class LeaveLedgerEntry(models.Model):
+    KIND_ACCRUAL = "accrual"
+    KIND_DEDUCTION = "deduction"
+    KIND_ADJUSTMENT = "adjustment"
+
+    KIND_CHOICES = [
+        (KIND_ACCRUAL, "Accrual"),
+        (KIND_DEDUCTION, "Deduction"),
+        (KIND_ADJUSTMENT, "Adjustment"),
+    ]
+
+    employee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="leave_ledger")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    days = models.DecimalField(max_digits=6, decimal_places=2)
+    year = models.PositiveIntegerField()
+    leave_request = models.ForeignKey(LeaveRequest, null=True, blank=True, on_delete=models.SET_NULL, related_name="ledger_entries")
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["employee", "year"])]
+        constraints = [
+            # reruns of the yearly accrual and repeated approvals cannot post twice
+            models.UniqueConstraint(fields=["employee", "year"], condition=models.Q(kind="accrual"), name="personnel_leaveledger_one_accrual_per_year"),
+            models.UniqueConstraint(fields=["leave_request"], condition=models.Q(kind="deduction"), name="personnel_leaveledger_one_deduction_per_request"),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} {self.kind} {self.days}"
+
+# LeaveBalance: running sum of an employee's ledger, maintained by personnel.balances
+class LeaveBalance(models.Model):
+    employee = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, on_delete=models.CASCADE, related_name="leave_balance")
+    days = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.employee}: {self.days}"
+
 # Notification model (generic target)
 class Notification(models.Model):
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications")
@@ -169,10 +289,54 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # inbox keyset pages and unread-only scans
+            models.Index(fields=["recipient", "-created_at", "-id"]),
+            models.Index(fields=["recipient", "unread", "-created_at"]),
+            # admin date hierarchy across all recipients
+            models.Index(fields=["created_at"]),
+        ]
 
     def __str__(self):
         return f"Notif to {self.recipient} - {self.verb}"
 
+# NotificationCounter: denormalized unread badge, maintained by personnel.inbox
+class NotificationCounter(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, on_delete=models.CASCADE, related_name="notification_counter")
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+# NotificationEvent: outbox row expanded into notifications by process_notifications
+class NotificationEvent(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    target_content_type = models.ForeignKey(ContentType, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    target = GenericForeignKey("target_content_type", "target_object_id")
+    payload = models.JSONField(blank=True, default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
 class Notice(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
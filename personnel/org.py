@@ -0,0 +1,72 @@
+from django.core.cache import cache
+
+from .models import Department, Team, TeamMembership
+from .versioning import bump_version, get_version
+
+ORG_CACHE_TIMEOUT = 60 * 60
+
+# per-process copy of the last graph fetched, so warm lookups skip unpickling
+_local = {"version": None, "graph": None}
+
+
+class OrgGraph:
+    """Department -> manager, team -> leader and employee -> teams lookups."""
+
+    def __init__(self, department_managers, team_leaders, team_departments, employee_teams):
+        self.department_managers = department_managers
+        self.team_leaders = team_leaders
+        self.team_departments = team_departments
+        self.employee_teams = employee_teams
+
+    @classmethod
+    def build(cls):
+        department_managers = dict(Department.objects.filter(manager__isnull=False).values_list("id", "manager_id"))
+        team_leaders, team_departments = {}, {}
+        for team_id, department_id, leader_id in Team.objects.values_list("id", "department_id", "team_leader_id"):
+            team_departments[team_id] = department_id
+            if leader_id:
+                team_leaders[team_id] = leader_id
+        employee_teams = {}
+        for employee_id, team_id in TeamMembership.objects.values_list("employee_id", "team_id"):
+            employee_teams.setdefault(employee_id, []).append(team_id)
+        return cls(department_managers, team_leaders, team_departments, employee_teams)
+
+    def department_manager(self, department_id):
+        return self.department_managers.get(department_id)
+
+    def team_leader(self, team_id):
+        return self.team_leaders.get(team_id)
+
+    def team_ids(self, employee_id):
+        return self.employee_teams.get(employee_id, [])
+
+    def leader_ids(self, employee_id):
+        return {self.team_leaders[t] for t in self.team_ids(employee_id) if t in self.team_leaders}
+
+    def manager_id(self, employee):
+        return self.department_managers.get(employee.department_id)
+
+    def presence_recipient_ids(self, employee):
+        # team leaders and department manager of the employee
+        recipients = self.leader_ids(employee.id)
+        manager_id = self.manager_id(employee)
+        if manager_id:
+            recipients.add(manager_id)
+        return recipients
+
+
+def invalidate():
+    bump_version("org")
+
+
+def get_graph():
+    version = get_version("org")
+    if _local["version"] == version:
+        return _local["graph"]
+    key = f"personnel:org:graph:{version}"
+    graph = cache.get(key)
+    if graph is None:
+        graph = OrgGraph.build()
+        cache.set(key, graph, ORG_CACHE_TIMEOUT)
+    _local.update(version=version, graph=graph)
+    return graph
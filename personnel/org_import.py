@@ -0,0 +1,364 @@
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from simple_history.utils import bulk_create_with_history
+
+from . import history, org, search
+from .models import Department, Employee, Team, TeamMembership
+
+IMPORT_BATCH_SIZE = 1000
+CHANGE_REASON = "import_org"
+
+DEPARTMENT_FIELDS = ("name", "code", "description")
+TEAM_FIELDS = ("name", "code", "description", "min_staffing")
+EMPLOYEE_FIELDS = (
+    "username", "national_id", "first_name", "last_name", "father_name", "email", "job_title",
+    "office_line_number", "phone_number", "employment_date", "date_of_birth", "is_active",
+)
+MEMBERSHIP_FIELDS = ("is_leader", "role", "joined_at", "notes")
+
+
+@contextmanager
+def _open(path):
+    if path == "-":
+        yield sys.stdin
+    else:
+        with open(path, newline="", encoding="utf-8") as fh:
+            yield fh
+
+
+def read_rows(path):
+    """Stream ("line N", dict) pairs from a .csv file or JSON lines (anything else, ``-`` for stdin)."""
+    with _open(path) as fh:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield f"{path} line {reader.line_num}", row
+        else:
+            for number, line in enumerate(fh, 1):
+                if line.strip():
+                    yield f"{path} line {number}", json.loads(line)
+
+
+class ModelStats:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+
+    def __str__(self):
+        text = f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged"
+        return text + (f", {self.deleted} deleted" if self.deleted else "")
+
+
+def _clean(model, name, raw):
+    field = model._meta.get_field(name)
+    if raw is None or (isinstance(raw, str) and not raw.strip()):
+        return None if field.null else ("" if field.blank else field.get_default())
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if isinstance(field, models.BooleanField):
+            # HR exports spell booleans every which way
+            raw = raw.lower() in ("1", "true", "t", "yes", "y")
+    value = field.to_python(raw)
+    if hasattr(field, "max_length") and field.max_length and isinstance(value, str) and len(value) > field.max_length:
+        raise ValidationError(f"{name} longer than {field.max_length} characters")
+    return value
+
+
+def _values(model, row, fields):
+    # only columns present in the row are synced; absent ones keep their current value
+    return {name: _clean(model, name, row[name]) for name in fields if name in row}
+
+
+class Batch:
+    """Pending inserts and updates of one model, flushed with bulk writes."""
+
+    def __init__(self, model, stats, size, history=False, on_flush=None):
+        self.model = model
+        self.stats = stats
+        self.size = size
+        self.history = history
+        self.on_flush = on_flush
+        # keyed by id(): a list membership test would compare model instances one by one
+        self.creates, self.updates, self.fields = {}, {}, set()
+
+    def apply(self, instance, values):
+        """Insert ``instance`` if it is new, else update the fields of ``values`` that differ."""
+        if instance.pk is None:
+            for name, value in values.items():
+                setattr(instance, name, value)
+            if id(instance) not in self.creates:
+                self.creates[id(instance)] = instance
+                self.stats.inserted += 1
+        else:
+            changed = {name for name, value in values.items() if getattr(instance, name) != value}
+            for name in changed:
+                setattr(instance, name, values[name])
+            if changed:
+                self.fields |= changed
+                if id(instance) not in self.updates:
+                    self.updates[id(instance)] = instance
+                    self.stats.updated += 1
+            elif id(instance) not in self.updates:
+                self.stats.unchanged += 1
+        if len(self.creates) + len(self.updates) >= self.size:
+            self.flush()
+
+    def flush(self):
+        creates, updates = list(self.creates.values()), list(self.updates.values())
+        if creates:
+            if self.history:
+                bulk_create_with_history(creates, self.model, batch_size=self.size, default_change_reason=CHANGE_REASON)
+            else:
+                self.model.objects.bulk_create(creates, batch_size=self.size)
+        if updates:
+            fields = sorted(self.fields)
+            self.model.objects.bulk_update(updates, fields, batch_size=self.size)
+            if self.history:
+                history.bulk_record(self.model, updates, change_reason=CHANGE_REASON, batch_size=self.size)
+        if self.on_flush and (creates or updates):
+            self.on_flush(creates + updates)
+        self.creates, self.updates, self.fields = {}, {}, set()
+
+
+class OrgImport:
+    """Diff HR rows against the database in memory and apply them with bulk writes.
+
+    Departments are keyed by name, teams by (department, name), employees by
+    national_id falling back to username, memberships by (employee, team).
+    Manager and team leader columns may name employees imported in the same
+    run; they are resolved at the end.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, prune_memberships=False, deactivate_missing=False):
+        self.batch_size = batch_size
+        self.prune_memberships = prune_memberships
+        self.deactivate_missing = deactivate_missing
+        self.stats = {label: ModelStats() for label in ("departments", "teams", "employees", "memberships")}
+        self.errors = []
+        self.rows = 0
+        # managers and team leaders (re)assigned
+        self.references_changed = 0
+        self.seconds = 0.0
+        self._departments = None
+        self._department_codes = None
+        self._teams = None
+        self._employees = None
+        self._pending_managers = {}
+        self._pending_leaders = {}
+        self._seen_employees = set()
+        self._indexed = []
+
+    # lookups
+
+    def departments_by_key(self):
+        if self._departments is None:
+            self._departments = {}
+            for department in Department.objects.only("id", "manager_id", *DEPARTMENT_FIELDS):
+                self._departments[department.name] = department
+        return self._departments
+
+    def department(self, ref):
+        departments = self.departments_by_key()
+        if ref in departments:
+            return departments[ref]
+        if self._department_codes is None:
+            # codes are not unique in the schema, so ambiguous ones do not resolve
+            self._department_codes = {}
+            for department in departments.values():
+                if department.code:
+                    self._department_codes[department.code] = None if department.code in self._department_codes else department
+        department = self._department_codes.get(ref)
+        if department is None:
+            raise ValidationError(f"unknown department {ref!r}")
+        return department
+
+    def teams_by_key(self):
+        if self._teams is None:
+            self._teams = {(t.department_id, t.name): t for t in Team.objects.only("id", "department_id", "team_leader_id", *TEAM_FIELDS)}
+        return self._teams
+
+    def team(self, department_ref, name):
+        department = self.department(department_ref)
+        team = self.teams_by_key().get((department.pk, name))
+        if team is None:
+            raise ValidationError(f"unknown team {name!r} in {department_ref!r}")
+        return team
+
+    def employees_by_key(self):
+        if self._employees is None:
+            by_national_id, by_username = {}, {}
+            # full rows: history records copy every field, and deferred ones would be fetched one by one
+            for employee in Employee.objects.iterator(chunk_size=self.batch_size):
+                by_username[employee.username] = employee
+                if employee.national_id:
+                    by_national_id[employee.national_id] = employee
+            self._employees = (by_national_id, by_username)
+        return self._employees
+
+    def employee(self, ref):
+        by_national_id, by_username = self.employees_by_key()
+        employee = by_national_id.get(ref) or by_username.get(ref)
+        if employee is None:
+            raise ValidationError(f"unknown employee {ref!r}")
+        return employee
+
+    # passes
+
+    def _rows(self, rows, apply):
+        for line, row in rows:
+            self.rows += 1
+            try:
+                apply(row)
+            except (ValidationError, KeyError, ValueError) as exc:
+                message = "; ".join(exc.messages) if isinstance(exc, ValidationError) else f"{type(exc).__name__}: {exc}"
+                self.errors.append((line, message))
+
+    def import_departments(self, rows):
+        batch = Batch(Department, self.stats["departments"], self.batch_size)
+        departments = self.departments_by_key()
+
+        def apply(row):
+            values = _values(Department, row, DEPARTMENT_FIELDS)
+            department = departments.get(values["name"]) or Department()
+            batch.apply(department, values)
+            departments[values["name"]] = department
+            if row.get("manager"):
+                self._pending_managers[values["name"]] = row["manager"]
+
+        self._rows(rows, apply)
+        batch.flush()
+        self._department_codes = None
+
+    def import_teams(self, rows):
+        batch = Batch(Team, self.stats["teams"], self.batch_size)
+        teams = self.teams_by_key()
+
+        def apply(row):
+            department = self.department(row["department"])
+            values = _values(Team, row, TEAM_FIELDS)
+            key = (department.pk, values["name"])
+            team = teams.get(key) or Team(department=department)
+            batch.apply(team, values)
+            teams[key] = team
+            if row.get("team_leader"):
+                self._pending_leaders[key] = row["team_leader"]
+
+        self._rows(rows, apply)
+        batch.flush()
+
+    def import_employees(self, rows):
+        batch = Batch(Employee, self.stats["employees"], self.batch_size, history=True, on_flush=self._index)
+        by_national_id, by_username = self.employees_by_key()
+
+        def apply(row):
+            values = _values(Employee, row, EMPLOYEE_FIELDS)
+            if "department" in row:
+                values["department_id"] = self.department(row["department"]).pk if row["department"] else None
+            employee = (values.get("national_id") and by_national_id.get(values["national_id"])) or by_username.get(values["username"])
+            if employee is None:
+                # HR accounts start without a password; people sign in after a reset
+                employee = Employee(password=make_password(None))
+            elif employee.username != values["username"] and values["username"] in by_username:
+                raise ValidationError(f"username {values['username']!r} already belongs to another employee")
+            by_username.pop(employee.username, None)
+            batch.apply(employee, values)
+            by_username[employee.username] = employee
+            if employee.national_id:
+                by_national_id[employee.national_id] = employee
+            self._seen_employees.add(id(employee))
+
+        self._rows(rows, apply)
+        batch.flush()
+        if self.deactivate_missing:
+            self._deactivate_missing(by_username.values())
+
+    def _deactivate_missing(self, employees):
+        batch = Batch(Employee, ModelStats(), self.batch_size, history=True, on_flush=self._index)
+        for employee in employees:
+            if id(employee) not in self._seen_employees and employee.is_active and employee.pk:
+                batch.apply(employee, {"is_active": False})
+        batch.flush()
+        self.stats["employees"].updated += batch.stats.updated
+
+    def import_memberships(self, rows):
+        batch = Batch(TeamMembership, self.stats["memberships"], self.batch_size)
+        existing = {(m.employee_id, m.team_id): m for m in TeamMembership.objects.only("id", "employee_id", "team_id", *MEMBERSHIP_FIELDS)}
+        seen = set()
+
+        def apply(row):
+            employee = self.employee(row["employee"])
+            team = self.team(row["department"], row["team"])
+            if employee.pk is None or team.pk is None:
+                raise ValidationError("employee or team was not imported")
+            key = (employee.pk, team.pk)
+            membership = existing.get(key) or TeamMembership(employee_id=employee.pk, team_id=team.pk)
+            batch.apply(membership, _values(TeamMembership, row, MEMBERSHIP_FIELDS))
+            existing[key] = membership
+            seen.add(key)
+
+        self._rows(rows, apply)
+        batch.flush()
+        if self.prune_memberships:
+            # only employees present in the file are pruned
+            employees = {employee_id for employee_id, _ in seen}
+            stale = [m.pk for key, m in existing.items() if key[0] in employees and key not in seen and m.pk]
+            for i in range(0, len(stale), self.batch_size):
+                TeamMembership.objects.filter(pk__in=stale[i:i + self.batch_size]).delete()
+            self.stats["memberships"].deleted = len(stale)
+
+    def _resolve_references(self):
+        departments = Batch(Department, ModelStats(), self.batch_size)
+        for name, ref in self._pending_managers.items():
+            try:
+                departments.apply(self.departments_by_key()[name], {"manager_id": self.employee(ref).pk})
+            except ValidationError as exc:
+                self.errors.append((f"department {name}", "; ".join(exc.messages)))
+        departments.flush()
+        teams = Batch(Team, ModelStats(), self.batch_size)
+        for key, ref in self._pending_leaders.items():
+            try:
+                teams.apply(self.teams_by_key()[key], {"team_leader_id": self.employee(ref).pk})
+            except ValidationError as exc:
+                self.errors.append((f"team {key[1]}", "; ".join(exc.messages)))
+        teams.flush()
+        self.references_changed = departments.stats.updated + teams.stats.updated
+
+    def _index(self, employees):
+        self._indexed.extend(e.pk for e in employees)
+
+    def run(self, departments=None, teams=None, employees=None, memberships=None, dry_run=False):
+        """Import whichever row streams are given, in dependency order, in one transaction."""
+        started = time.monotonic()
+        with transaction.atomic():
+            if departments is not None:
+                self.import_departments(departments)
+            if teams is not None:
+                self.import_teams(teams)
+            if employees is not None:
+                self.import_employees(employees)
+            if memberships is not None:
+                self.import_memberships(memberships)
+            self._resolve_references()
+            if dry_run:
+                transaction.set_rollback(True)
+        if not dry_run:
+            self._after_import()
+        self.seconds = time.monotonic() - started
+        return self
+
+    def _after_import(self):
+        # bulk writes skip the signals that keep these in step
+        org.invalidate()
+        backend = search.get_backend()
+        ids = sorted(set(self._indexed))
+        for i in range(0, len(ids), self.batch_size):
+            backend.index(ids[i:i + self.batch_size])
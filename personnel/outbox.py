@@ -0,0 +1,209 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Employee, LeaveRequest, NotificationEvent, TimeSession
+from . import inbox, signals
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 200
+OUTBOX_MAX_ATTEMPTS = 5
+
+# kind -> callable(events) returning {event_id: [Notification, ...]}
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def outbox_enabled():
+    return getattr(settings, "NOTIFICATIONS_OUTBOX", True)
+
+
+def _event(kind, actor=None, target=None, payload=None):
+    return NotificationEvent(
+        kind=kind,
+        actor=actor,
+        target_content_type=ContentType.objects.get_for_model(target) if target is not None else None,
+        target_object_id=getattr(target, "id", None) if target is not None else None,
+        payload=payload or {},
+    )
+
+
+def enqueue(kind, actor=None, target=None, payload=None):
+    event = _event(kind, actor=actor, target=target, payload=payload)
+    event.save()
+    return event
+
+
+def enqueue_on_commit(kind, actor=None, target=None, payload=None):
+    """Record a single event once the surrounding transaction commits."""
+    transaction.on_commit(lambda: enqueue(kind, actor=actor, target=target, payload=payload))
+
+
+def dispatch(kind, actor=None, target=None, payload=None):
+    """Queue a notification event, or expand it inline when the outbox is disabled."""
+    if outbox_enabled():
+        enqueue_on_commit(kind, actor=actor, target=target, payload=payload)
+        return
+    event = _event(kind, actor=actor, target=target, payload=payload)
+    result = HANDLERS[kind]([event])[event.id]
+    if isinstance(result, Exception):
+        raise result
+    inbox.deliver(result)
+
+
+def _expand_each(events, build):
+    expanded = {}
+    for event in events:
+        try:
+            expanded[event.id] = build(event)
+        except Exception as exc:
+            expanded[event.id] = exc
+    return expanded
+
+
+@handler("presence")
+def expand_presence(events):
+    users = Employee.objects.in_bulk({e.actor_id for e in events})
+    sessions = TimeSession.objects.in_bulk({e.target_object_id for e in events})
+    return _expand_each(events, lambda e: signals.build_presence_notifications(
+        users[e.actor_id], e.payload["action"], sessions[e.target_object_id]
+    ))
+
+
+@handler("leave_created")
+def expand_leave_created(events):
+    leaves = LeaveRequest.objects.select_related("applicant").in_bulk({e.target_object_id for e in events})
+    return _expand_each(events, lambda e: signals.build_leave_created_notifications(leaves[e.target_object_id]))
+
+
+@handler("leave_decided")
+def expand_leave_decided(events):
+    actors = Employee.objects.in_bulk({e.actor_id for e in events})
+    leaves = LeaveRequest.objects.select_related("applicant").in_bulk({pk for e in events for pk in e.payload["ids"]})
+    return _expand_each(events, lambda e: signals.build_leave_decision_notifications(
+        actors.get(e.actor_id), [leaves[pk] for pk in e.payload["ids"] if pk in leaves], e.payload["role"], e.payload["decision"]
+    ))
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(2 ** attempts, 300))
+
+
+def _deliver(per_event):
+    """Deliver each event's notifications; returns {event_id: exception} for events that could not be delivered."""
+    try:
+        with transaction.atomic():
+            inbox.deliver([note for notes in per_event.values() for note in notes])
+        return {}
+    except Exception:
+        logger.warning("batch delivery failed, retrying event by event", exc_info=True)
+    # one poison event must not hold back the rest: each gets its own savepoint
+    errors = {}
+    for event_id, notes in per_event.items():
+        try:
+            with transaction.atomic():
+                inbox.deliver(notes)
+        except Exception as exc:
+            errors[event_id] = exc
+    return errors
+
+
+def process_batch(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """Expand one batch of due events; returns (events, notifications, failed).
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED where the backend
+    supports it, so several workers can drain the same table. Succeeded events
+    are deleted; failing ones, in expansion or delivery, are rescheduled with
+    backoff until max_attempts.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=NotificationEvent.STATUS_PENDING, available_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0, 0, 0
+        by_kind = {}
+        for event in events:
+            by_kind.setdefault(event.kind, []).append(event)
+        expanded = {}
+        for kind, group in by_kind.items():
+            func = HANDLERS.get(kind)
+            if func is None:
+                expanded.update((e.id, LookupError(f"no handler for {kind!r}")) for e in group)
+                continue
+            try:
+                expanded.update(func(group))
+            except Exception as exc:
+                expanded.update((e.id, exc) for e in group)
+
+        per_event = {event.id: expanded.get(event.id) or [] for event in events if not isinstance(expanded.get(event.id), Exception)}
+        expanded.update(_deliver(per_event))
+
+        notes, done, failed = 0, [], []
+        for event in events:
+            result = expanded.get(event.id)
+            if isinstance(result, Exception):
+                event.attempts += 1
+                event.last_error = f"{type(result).__name__}: {result}"
+                if event.attempts >= max_attempts:
+                    event.status = NotificationEvent.STATUS_FAILED
+                event.available_at = now + _retry_delay(event.attempts)
+                failed.append(event)
+                logger.warning("notification event %s failed (attempt %s): %s", event.id, event.attempts, event.last_error)
+            else:
+                notes += len(result or [])
+                done.append(event.id)
+        NotificationEvent.objects.filter(id__in=done).delete()
+        NotificationEvent.objects.bulk_update(failed, ["attempts", "last_error", "status", "available_at"])
+    return len(events), notes, len(failed)
+
+
+def run_worker(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS, idle_sleep=1.0, once=False, report=None, report_every=10):
+    """Drain the outbox, sleeping while idle; ``report`` gets periodic throughput stats."""
+    totals = {"events": 0, "notifications": 0, "failed": 0}
+    started = window = time.monotonic()
+    window_events = 0
+    while True:
+        try:
+            events, notes, failed = process_batch(batch_size, max_attempts)
+        except Exception:
+            # e.g. the database went away; events stay queued for the next attempt
+            if once:
+                raise
+            logger.exception("outbox batch failed")
+            time.sleep(idle_sleep)
+            continue
+        totals["events"] += events
+        totals["notifications"] += notes
+        totals["failed"] += failed
+        window_events += events
+        elapsed = time.monotonic() - window
+        if report and window_events and elapsed >= report_every:
+            report(dict(totals, events_per_sec=window_events / elapsed))
+            window, window_events = time.monotonic(), 0
+        if not events:
+            if once:
+                break
+            time.sleep(idle_sleep)
+    totals["seconds"] = time.monotonic() - started
+    return totals
+
+
+def drain(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """Expand every due event in this process, as one worker pass would; returns its totals."""
+    return run_worker(batch_size, max_attempts, once=True)
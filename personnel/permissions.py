@@ -0,0 +1,135 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from guardian.models import GroupObjectPermission, UserObjectPermission
+from guardian.shortcuts import assign_perm, remove_perm
+
+from . import org
+from .models import LeaveRequest, Team
+from .versioning import bump_version, get_version
+
+PERMISSIONS_TIMEOUT = 10 * 60
+
+
+def _codename(perm):
+    return perm.split(".", 1)[-1]
+
+
+class PermissionResolver:
+    """Object permissions of one user, loaded per model in a single query.
+
+    Each model's map of object pk -> codenames comes from one UNION over the
+    user's direct and group grants, is kept on the resolver for the request and
+    in the cache across requests. Any grant or group membership change bumps
+    the "permissions" version, which orphans every cached map.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._maps = {}
+
+    def _map(self, model):
+        ct = ContentType.objects.get_for_model(model)
+        perms = self._maps.get(ct.id)
+        if perms is None:
+            key = f"personnel:permissions:{self.user.pk}:{ct.id}:{get_version('permissions')}"
+            perms = cache.get(key)
+            if perms is None:
+                perms = {}
+                direct = UserObjectPermission.objects.filter(user_id=self.user.pk, content_type=ct).values_list("object_pk", "permission__codename")
+                grouped = GroupObjectPermission.objects.filter(group__user=self.user.pk, content_type=ct).values_list("object_pk", "permission__codename")
+                to_python = model._meta.pk.to_python
+                for object_pk, codename in direct.union(grouped, all=True):
+                    perms.setdefault(to_python(object_pk), set()).add(codename)
+                cache.set(key, perms, PERMISSIONS_TIMEOUT)
+            self._maps[ct.id] = perms
+        return perms
+
+    def _unrestricted(self):
+        return self.user.is_active and self.user.is_superuser
+
+    def get_perms(self, obj):
+        """Codenames ``user`` holds on ``obj`` through object-level grants."""
+        if not self.user.is_active:
+            return set()
+        return set(self._map(type(obj)).get(obj.pk, ()))
+
+    def has_perm(self, perm, obj):
+        if self._unrestricted():
+            return True
+        return _codename(perm) in self.get_perms(obj)
+
+    def object_ids(self, model, perm):
+        if not self.user.is_active:
+            return set()
+        codename = _codename(perm)
+        return {pk for pk, codenames in self._map(model).items() if codename in codenames}
+
+    def filter(self, queryset, perm):
+        """``queryset`` narrowed to the objects ``user`` holds ``perm`` on, without per-object checks."""
+        if self._unrestricted():
+            return queryset
+        return queryset.filter(pk__in=self.object_ids(queryset.model, perm))
+
+
+def for_request(request):
+    # one resolver per request, so repeated checks in views and templates share its maps
+    resolver = getattr(request, "_permission_resolver", None)
+    if resolver is None or resolver.user != request.user:
+        resolver = request._permission_resolver = PermissionResolver(request.user)
+    return resolver
+
+
+def invalidate():
+    bump_version("permissions")
+
+
+def assign(perm, user_or_group, obj):
+    # guardian's queryset assignment uses bulk_create, which sends no signals
+    result = assign_perm(perm, user_or_group, obj)
+    invalidate()
+    return result
+
+
+def remove(perm, user_or_group, obj):
+    result = remove_perm(perm, user_or_group, obj)
+    invalidate()
+    return result
+
+
+def delegated_leaves(user, resolver=None):
+    """Requests of the teams ``user`` was granted ``approve_leaves`` on, in one filtered query.
+
+    Only explicit grants count: a superuser's review queue holds the teams they
+    lead or were delegated, and company-wide access goes through the admin.
+    """
+    resolver = resolver or PermissionResolver(user)
+    return LeaveRequest.objects.filter(team_id__in=resolver.object_ids(Team, "personnel.approve_leaves"))
+
+
+def approvable_leaves(user, resolver=None):
+    """Pending requests in the teams ``user`` was granted ``approve_leaves`` on."""
+    return delegated_leaves(user, resolver).filter(status=LeaveRequest.STATUS_PENDING)
+
+
+def can_view_calendar(user, team_id=None, department_id=None, resolver=None):
+    """Whether ``user`` may see the leave calendar of a team, a department, or with neither, the whole company.
+
+    Staff see everything. A team is visible to its members, its leader, its
+    department's manager and its delegated approvers; a department to its
+    manager and its employees. Passing both narrows to their intersection, so
+    either one being visible is enough.
+    """
+    if not user.is_active:
+        return False
+    if user.is_staff or user.is_superuser:
+        return True
+    graph = org.get_graph()
+    if team_id is not None:
+        leads = {graph.team_leader(team_id), graph.department_manager(graph.team_departments.get(team_id))}
+        if user.id in leads or team_id in graph.team_ids(user.id):
+            return True
+        if team_id in (resolver or PermissionResolver(user)).object_ids(Team, "personnel.approve_leaves"):
+            return True
+    if department_id is not None:
+        return department_id == user.department_id or graph.department_manager(department_id) == user.id
+    return False
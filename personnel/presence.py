@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+from .models import TimeSession
+
+# events buffered per watcher; a watcher that falls further behind gets a fresh snapshot instead
+WATCHER_QUEUE_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+
+
+def _entry(session, graph):
+    user = session.user
+    return {
+        "user_id": user.id,
+        "name": user.get_full_name() or user.username,
+        "department_id": user.department_id,
+        "team_ids": sorted(graph.team_ids(user.id)),
+        "location": session.location,
+        "since": session.start_time.isoformat(),
+    }
+
+
+class Watcher:
+    """One SSE client: the event loop serving it, its queue and what it may see."""
+
+    def __init__(self, loop, team_ids=None, department_ids=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=WATCHER_QUEUE_SIZE)
+        # None means everything (staff)
+        self.team_ids = team_ids
+        self.department_ids = department_ids
+
+    def sees(self, entry):
+        if self.team_ids is None:
+            return True
+        return entry["department_id"] in self.department_ids or bool(self.team_ids.intersection(entry["team_ids"]))
+
+    def _offer(self, event):
+        # runs on the watcher's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", None))
+
+    def offer(self, event):
+        self.loop.call_soon_threadsafe(self._offer, event)
+
+
+class PresenceIndex:
+    """Open sessions of this process, keyed by user, pushed to subscribed watchers.
+
+    Loaded from the database once, then kept current by the TimeSession
+    signals, so watchers never poll. Each worker process holds its own copy;
+    the board is meant to be served by a single ASGI worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = None
+        self.watchers = set()
+
+    def ensure_loaded(self):
+        from . import org
+
+        with self.lock:
+            if self.entries is None:
+                graph = org.get_graph()
+                sessions = TimeSession.objects.filter(end_time__isnull=True).select_related("user").order_by("start_time")
+                self.entries = {s.user_id: _entry(s, graph) for s in sessions}
+        return self
+
+    def reset(self):
+        with self.lock:
+            self.entries = None
+
+    def snapshot(self, watcher=None):
+        with self.lock:
+            entries = list(self.entries.values()) if self.entries else []
+        return [e for e in entries if watcher is None or watcher.sees(e)]
+
+    def started(self, session):
+        from . import org
+
+        with self.lock:
+            if self.entries is None:
+                # not loaded yet: the first load reads this session from the database
+                return
+            entry = _entry(session, org.get_graph())
+            self.entries[session.user_id] = entry
+        self._publish("started", entry)
+
+    def stopped(self, session):
+        with self.lock:
+            if self.entries is None:
+                return
+            entry = self.entries.pop(session.user_id, None)
+        if entry is not None:
+            self._publish("stopped", entry)
+
+    def _publish(self, kind, entry):
+        for watcher in list(self.watchers):
+            if watcher.sees(entry):
+                watcher.offer((kind, entry))
+
+    def subscribe(self, watcher):
+        self.watchers.add(watcher)
+        return watcher
+
+    def unsubscribe(self, watcher):
+        self.watchers.discard(watcher)
+
+
+index = PresenceIndex()
+
+
+def watcher_for(user, loop):
+    """A watcher limited to the teams ``user`` leads and the departments they manage."""
+    from . import org
+
+    if user.is_staff:
+        return Watcher(loop)
+    graph = org.get_graph()
+    team_ids = {team_id for team_id, leader_id in graph.team_leaders.items() if leader_id == user.id}
+    department_ids = {dep_id for dep_id, manager_id in graph.department_managers.items() if manager_id == user.id}
+    return Watcher(loop, team_ids, department_ids)
@@ -0,0 +1,275 @@
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+logger = logging.getLogger("personnel.profiling")
+
+# the profile of the sampled request being served in this context, None otherwise
+_current = ContextVar("personnel_profile", default=None)
+_installed = False
+_MISS = object()
+PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+MAX_DUPLICATES = 20
+
+
+def _call_site():
+    """file:line of the innermost project frame outside this module, e.g. the loop issuing an N+1 query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and filename != __file__ and "site-packages" not in filename:
+            return f"{Path(filename).relative_to(PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class Profile:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.statements = {}
+        self.sites = {}
+
+    def query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            # statements are parameterised, so an N+1 loop repeats the same text
+            seen = self.statements[sql] = self.statements.get(sql, 0) + 1
+            if seen == 2:
+                self.sites[sql] = _call_site()
+
+    def duplicates(self, threshold):
+        return sorted(
+            ({"sql": sql, "count": count, "site": self.sites.get(sql)} for sql, count in self.statements.items() if count >= threshold),
+            key=lambda d: -d["count"],
+        )
+
+    def cache(self, hits, misses):
+        self.cache_hits += hits
+        self.cache_misses += misses
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.query(execute, sql, params, many, context)
+
+
+def _wrap_connection(connection, **kwargs):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _wrap_render(render):
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            profile.template_seconds += time.perf_counter() - started
+    wrapper.profiled = True
+    return wrapper
+
+
+def _wrap_get(get):
+    def wrapper(self, key, default=None, version=None):
+        profile = _current.get()
+        if profile is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISS, version)
+        profile.cache(value is not _MISS, value is _MISS)
+        return default if value is _MISS else value
+    wrapper.profiled = True
+    return wrapper
+
+
+def _wrap_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        profile = _current.get()
+        if profile is None:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        found = get_many(self, keys, version)
+        profile.cache(len(found), len(keys) - len(found))
+        return found
+    wrapper.profiled = True
+    return wrapper
+
+
+def install():
+    """Hook queries, template rendering and cache reads; the hooks cost one ContextVar read when not profiling."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(_wrap_connection)
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+    Template.render = _wrap_render(Template.render)
+    for alias in settings.CACHES:
+        cls = type(caches[alias])
+        if not getattr(cls.get, "profiled", False):
+            cls.get = _wrap_get(cls.get)
+        # BaseCache.get_many goes through get(), which is already counted
+        if "get_many" in cls.__dict__ and not getattr(cls.get_many, "profiled", False):
+            cls.get_many = _wrap_get_many(cls.get_many)
+
+
+class Stats:
+    """Per-view totals of the sampled requests served by this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view, seconds, profile, duplicates):
+        with self.lock:
+            entry = self.views.setdefault(view, {
+                "requests": 0, "total_ms": 0.0, "db_ms": 0.0, "template_ms": 0.0, "queries": 0,
+                "cache_hits": 0, "cache_misses": 0, "duplicates": {},
+            })
+            entry["requests"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["db_ms"] += profile.db_seconds * 1000
+            entry["template_ms"] += profile.template_seconds * 1000
+            entry["queries"] += profile.queries
+            entry["cache_hits"] += profile.cache_hits
+            entry["cache_misses"] += profile.cache_misses
+            for dup in duplicates:
+                seen = entry["duplicates"].get(dup["sql"])
+                if seen is None and len(entry["duplicates"]) >= MAX_DUPLICATES:
+                    continue
+                seen = entry["duplicates"].setdefault(dup["sql"], {"requests": 0, "max_count": 0, "site": dup["site"]})
+                seen["requests"] += 1
+                seen["max_count"] = max(seen["max_count"], dup["count"])
+
+    def snapshot(self):
+        with self.lock:
+            views = {}
+            for view, entry in self.views.items():
+                n = entry["requests"]
+                lookups = entry["cache_hits"] + entry["cache_misses"]
+                views[view] = {
+                    "requests": n,
+                    "mean_ms": round(entry["total_ms"] / n, 2), "mean_db_ms": round(entry["db_ms"] / n, 2),
+                    "mean_template_ms": round(entry["template_ms"] / n, 2), "mean_queries": round(entry["queries"] / n, 2),
+                    "cache_hit_ratio": round(entry["cache_hits"] / lookups, 3) if lookups else None,
+                    "duplicates": [{"sql": sql, **dup} for sql, dup in entry["duplicates"].items()],
+                }
+            return views
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+stats = Stats()
+
+
+def server_timing(profile, seconds):
+    lookups = profile.cache_hits + profile.cache_misses
+    parts = [
+        f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries"',
+        f"tpl;dur={profile.template_seconds * 1000:.1f}",
+        f"app;dur={seconds * 1000:.1f}",
+    ]
+    if lookups:
+        parts.append(f'cache;desc="{profile.cache_hits}/{lookups} hits"')
+    return ", ".join(parts)
+
+
+class ProfilingMiddleware:
+    """Samples PROFILING_SAMPLE_RATE of requests (and staff requests with ``?_profile=1``).
+
+    A sampled request gets a Server-Timing header, one structured log line and
+    a place in the per-view stats served by ``profiling_stats``. With sampling
+    off, a request costs one random() call here plus a ContextVar read per
+    query, template render and cache read.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+        self.threshold = getattr(settings, "PROFILING_DUPLICATE_THRESHOLD", 3)
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        if self.rate and random.random() < self.rate:
+            return "sampled"
+        if "_profile" in request.META.get("QUERY_STRING", "") and "_profile" in request.GET:
+            return "forced"
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = self.sampled(request)
+        if mode is None:
+            return self.get_response(request)
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, time.perf_counter() - started, mode)
+
+    async def __acall__(self, request):
+        mode = self.sampled(request)
+        if mode is None:
+            return await self.get_response(request)
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, time.perf_counter() - started, mode)
+
+    def finish(self, request, response, profile, seconds, mode):
+        user = getattr(request, "user", None)
+        if mode == "forced" and not (user is not None and user.is_staff):
+            # forcing a profile is a staff tool; anyone else's result is dropped
+            return response
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        duplicates = profile.duplicates(self.threshold)
+        stats.add(view, seconds, profile, duplicates)
+        response["Server-Timing"] = server_timing(profile, seconds)
+        logger.info(json.dumps({
+            "view": view, "method": request.method, "path": request.path, "status": response.status_code,
+            "ms": round(seconds * 1000, 2), "db_ms": round(profile.db_seconds * 1000, 2), "queries": profile.queries,
+            "template_ms": round(profile.template_seconds * 1000, 2),
+            "cache_hits": profile.cache_hits, "cache_misses": profile.cache_misses, "duplicates": duplicates,
+        }))
+        return response
@@ -0,0 +1,143 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DeletedTimeSession, ReconciliationState, TimeEntry, TimeSession, TimesheetDay
+from .timesheets import session_days
+
+STATE_NAME = "sessions"
+SESSION_SOURCE = "session"
+BATCH_SIZE = 1000
+# manual and session hours closer than this are not reported as a mismatch
+DEFAULT_TOLERANCE = Decimal("0.25")
+# a session written before the mark was taken but committed after it falls just below the
+# mark, so each run looks this far back again; rewriting a user-day is idempotent
+OVERLAP = timedelta(minutes=10)
+
+
+class ReconciliationResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        # (user_id, date, manual_hours, session_hours)
+        self.overlaps = []
+        self.gaps = []
+        self.high_water_mark = None
+        self.seconds = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.created} created, {self.updated} updated, {self.deleted} deleted, {self.unchanged} unchanged; "
+            f"{len(self.overlaps)} overlaps, {len(self.gaps)} gaps"
+        )
+
+
+def _hours(seconds):
+    return (Decimal(seconds or 0) / Decimal(3600)).quantize(Decimal("0.01"))
+
+
+def _affected_pairs(since, until):
+    # updated_at also moves on edits that keep end_time, e.g. a corrected start in the admin
+    sessions = TimeSession.objects.filter(end_time__isnull=False, updated_at__lte=until)
+    deleted = DeletedTimeSession.objects.filter(deleted_at__lte=until)
+    if since is not None:
+        sessions = sessions.filter(updated_at__gt=since - OVERLAP)
+        deleted = deleted.filter(deleted_at__gt=since - OVERLAP)
+    pairs = set()
+    for qs in (sessions, deleted):
+        for user_id, start_time, end_time in qs.values_list("user_id", "start_time", "end_time").iterator(chunk_size=BATCH_SIZE):
+            pairs.update((user_id, day) for day in session_days(start_time, end_time))
+    if since is None:
+        # days whose sessions are all gone, deleted before deletions were recorded
+        pairs.update(TimeEntry.objects.filter(source=SESSION_SOURCE).values_list("user_id", "date").iterator(chunk_size=BATCH_SIZE))
+    return pairs
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = sorted(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def reconcile(full=False, dry_run=False, tolerance=DEFAULT_TOLERANCE):
+    """Turn closed sessions into one ``source="session"`` TimeEntry per user and day.
+
+    Incremental: only sessions closed, edited or deleted since the stored
+    high-water mark (less OVERLAP) are looked at (``full`` ignores it and also
+    revisits every generated entry), and only the user-days they touch are
+    rewritten, so reruns are idempotent. Session time is read from the TimesheetDay rollup.
+    Days carrying both manual entries and session time are reported as overlaps
+    (likely double counting); manual hours above ``tolerance`` on days without
+    any session time are reported as gaps. Both reports cover the user-days
+    looked at, so only a ``full`` run reports on the whole history.
+    """
+    started = time.monotonic()
+    result = ReconciliationResult()
+    until = timezone.now()
+    state, _ = ReconciliationState.objects.get_or_create(name=STATE_NAME)
+    pairs = _affected_pairs(None if full else state.high_water_mark, until)
+    result.high_water_mark = until
+
+    by_user = {}
+    for user_id, day in pairs:
+        by_user.setdefault(user_id, set()).add(day)
+    creates, updates, deletes = [], [], []
+    for user_ids in _chunks(by_user):
+        user_pairs = {(user_id, day) for user_id in user_ids for day in by_user[user_id]}
+        days = [day for _, day in user_pairs]
+        window = {"user_id__in": user_ids, "date__gte": min(days), "date__lte": max(days)}
+        seconds = {
+            (user_id, day): total
+            for user_id, day, total in TimesheetDay.objects.filter(**window)
+            .values_list("user_id", "date").annotate(total=Sum("seconds")).order_by()
+        }
+        generated, manual = {}, {}
+        for entry in TimeEntry.objects.filter(**window).only("id", "user_id", "date", "hours", "source", "approved"):
+            key = (entry.user_id, entry.date)
+            if entry.source == SESSION_SOURCE:
+                generated[key] = entry
+            else:
+                manual[key] = manual.get(key, Decimal(0)) + entry.hours
+
+        for key in sorted(user_pairs):
+            hours = _hours(seconds.get(key))
+            entry = generated.get(key)
+            if entry is None:
+                if hours > 0:
+                    creates.append(TimeEntry(user_id=key[0], date=key[1], hours=hours, source=SESSION_SOURCE, notes="Generated from time sessions"))
+            elif hours <= 0:
+                deletes.append(entry.id)
+            elif entry.hours != hours:
+                entry.hours = hours
+                # changed figures need a fresh approval
+                entry.approved = False
+                updates.append(entry)
+            else:
+                result.unchanged += 1
+            if key in manual and hours > 0:
+                result.overlaps.append((key[0], key[1], manual[key], hours))
+        for key, manual_hours in manual.items():
+            if key not in seconds and manual_hours > tolerance:
+                result.gaps.append((key[0], key[1], manual_hours, Decimal(0)))
+
+    result.created, result.updated, result.deleted = len(creates), len(updates), len(deletes)
+    if not dry_run:
+        with transaction.atomic():
+            TimeEntry.objects.bulk_create(creates, batch_size=BATCH_SIZE)
+            TimeEntry.objects.bulk_update(updates, ["hours", "approved"], batch_size=BATCH_SIZE)
+            for ids in _chunks(deletes):
+                TimeEntry.objects.filter(id__in=ids).delete()
+            state.high_water_mark = until
+            state.save(update_fields=["high_water_mark", "updated_at"])
+            # the next run looks back to until - OVERLAP; older deletions are done with
+            DeletedTimeSession.objects.filter(deleted_at__lte=until - OVERLAP).delete()
+    result.overlaps.sort()
+    result.gaps.sort()
+    result.seconds = time.monotonic() - started
+    return result
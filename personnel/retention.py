@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+
+RETENTION_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = (
+    "id", "recipient_id", "actor_id", "verb", "target_content_type_id",
+    "target_object_id", "data", "created_at", "unread",
+)
+
+
+def retention_days():
+    return getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90)
+
+
+def archive_dir():
+    return str(getattr(settings, "NOTIFICATION_ARCHIVE_DIR", settings.BASE_DIR / "archive" / "notifications"))
+
+
+def expired_notifications(older_than_days):
+    # unread notifications are kept regardless of age so unread counters stay exact
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Notification.objects.filter(unread=False, created_at__lt=cutoff)
+
+
+def _append_monthly(directory, rows):
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row["created_at"].strftime("%Y-%m"), []).append(row)
+    for month, month_rows in by_month.items():
+        # appending to a gzip file adds a member; readers see one continuous stream
+        path = os.path.join(directory, f"notifications-{month}.jsonl.gz")
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            for row in month_rows:
+                fh.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+
+
+def archive_notifications(older_than_days=None, directory=None, batch_size=RETENTION_BATCH_SIZE, progress=None):
+    """Move read notifications older than the retention window into monthly gzip JSONL files.
+
+    Rows are copied and deleted one id-ordered batch at a time so no statement
+    holds locks on more than ``batch_size`` rows. Returns (rows, seconds).
+    """
+    older_than_days = retention_days() if older_than_days is None else older_than_days
+    directory = directory or archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    qs = expired_notifications(older_than_days)
+    started = time.monotonic()
+    last_id, total = 0, 0
+    while True:
+        rows = list(qs.filter(id__gt=last_id).order_by("id").values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            break
+        _append_monthly(directory, rows)
+        ids = [row["id"] for row in rows]
+        with transaction.atomic():
+            Notification.objects.filter(id__in=ids).delete()
+        last_id = ids[-1]
+        total += len(rows)
+        if progress:
+            progress(total, time.monotonic() - started)
+    return total, time.monotonic() - started
@@ -0,0 +1,183 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Employee, EmployeeSearchDocument
+
+FTS_TABLE = "personnel_employee_fts"
+INDEX_BATCH_SIZE = 2000
+
+# Query words match the start of a word in an employee's name, title or
+# department ("sar eng" finds Sarah in Engineering, "arah" does not), unlike the
+# substring icontains search the directory used before. The PostgreSQL backend
+# also matches inside words and tolerates typos through trigram similarity.
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+def terms(query):
+    return re.findall(r"\w+", normalize(query))
+
+
+def _rows(ids=None):
+    qs = Employee.objects.all()
+    if ids is not None:
+        qs = qs.filter(id__in=ids)
+    for pk, first, last, title, department in qs.order_by().values_list(
+        "id", "first_name", "last_name", "job_title", "department__name"
+    ).iterator(chunk_size=INDEX_BATCH_SIZE):
+        yield {
+            "id": pk,
+            "name": normalize(f"{first} {last}"),
+            "title": normalize(title),
+            "department": normalize(department),
+        }
+
+
+def _batches(rows, size=INDEX_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DirectorySearch:
+    """Token-prefix search over the precomputed EmployeeSearchDocument column.
+
+    Backend-neutral fallback; subclasses add an engine-specific index on top.
+    """
+
+    def index(self, ids=None):
+        count = 0
+        for batch in _batches(_rows(ids)):
+            docs = [
+                EmployeeSearchDocument(employee_id=row["id"], document=" ".join(filter(None, (row["name"], row["title"], row["department"]))))
+                for row in batch
+            ]
+            EmployeeSearchDocument.objects.bulk_create(docs, update_conflicts=True, unique_fields=["employee"], update_fields=["document"])
+            self.index_rows(batch)
+            count += len(batch)
+        return count
+
+    def index_rows(self, rows):
+        pass
+
+    def remove(self, ids):
+        EmployeeSearchDocument.objects.filter(employee_id__in=ids).delete()
+
+    def search(self, query, limit=200, active_only=True):
+        """Employee ids matching every term of ``query``, best match first.
+
+        ``active_only`` filters inside the query, so a full page is returned
+        even when inactive employees rank above the cut-off.
+        """
+        words = terms(query)
+        if not words:
+            return []
+        qs = EmployeeSearchDocument.objects.filter(employee__is_active=True) if active_only else EmployeeSearchDocument.objects.all()
+        for word in words:
+            qs = qs.filter(Q(document__startswith=word) | Q(document__contains=f" {word}"))
+        docs = list(qs.values_list("employee_id", "document")[:limit * 5])
+
+        def rank(doc):
+            tokens = doc[1].split()
+            exact = sum(1 for w in words if w in tokens)
+            # matches on the name (first tokens) rank above title/department matches
+            position = min((i for i, t in enumerate(tokens) if any(t.startswith(w) for w in words)), default=len(tokens))
+            return (-exact, position, doc[1])
+
+        return [pk for pk, _ in sorted(docs, key=rank)[:limit]]
+
+
+class SQLiteFTS5DirectorySearch(DirectorySearch):
+    """SQLite FTS5 table with prefix indexes, ranked by weighted bm25."""
+
+    def index_rows(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row["id"],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, title, department) VALUES (%s, %s, %s, %s)",
+                [(row["id"], row["name"], row["title"], row["department"]) for row in rows],
+            )
+
+    def remove(self, ids):
+        super().remove(ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in ids])
+
+    def search(self, query, limit=200, active_only=True):
+        words = terms(query)
+        if not words:
+            return []
+        match = " AND ".join(f'"{w}"*' for w in words)
+        employees = connection.ops.quote_name(Employee._meta.db_table)
+        active = f"AND {FTS_TABLE}.rowid IN (SELECT id FROM {employees} WHERE is_active) " if active_only else ""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {active}"
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 3.0, 1.0) LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresTrigramDirectorySearch(DirectorySearch):
+    """pg_trgm GIN index on the document column; tolerates typos, ranked by word similarity."""
+
+    min_similarity = 0.4
+
+    def search(self, query, limit=200, active_only=True):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        words = terms(query)
+        if not words:
+            return []
+        text = " ".join(words)
+        qs = EmployeeSearchDocument.objects.filter(employee__is_active=True) if active_only else EmployeeSearchDocument.objects.all()
+        qs = qs.annotate(similarity=TrigramWordSimilarity(text, "document"))
+        exact = Q()
+        for word in words:
+            # LIKE '%word%' is served by the trigram GIN index
+            exact &= Q(document__contains=word)
+        qs = qs.filter(exact | Q(similarity__gte=self.min_similarity))
+        return list(qs.order_by("-similarity", "document").values_list("employee_id", flat=True)[:limit])
+
+
+_backends = {}
+
+
+def get_backend():
+    path = getattr(settings, "DIRECTORY_SEARCH_BACKEND", None)
+    if path is None:
+        path = {
+            "sqlite": "personnel.search.SQLiteFTS5DirectorySearch",
+            "postgresql": "personnel.search.PostgresTrigramDirectorySearch",
+        }.get(connection.vendor, "personnel.search.DirectorySearch")
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def search_employees(query, limit=200):
+    """Active employees matching ``query`` in rank order."""
+    ids = get_backend().search(query, limit)
+    by_id = (
+        Employee.objects.filter(id__in=ids, is_active=True)
+        .select_related("department")
+        .only("first_name", "last_name", "job_title", "department__name", "office_line_number", "profile_picture")
+        .in_bulk()
+    )
+    return [by_id[pk] for pk in ids if pk in by_id]
@@ -1,36 +1,150 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from .models import TimeSession, Notification, LeaveRequest
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from .models import Department, DeletedTimeSession, Employee, Holiday, Team, TeamMembership, TimeSession, Notification, LeaveRequest, Notice
+from . import history, inbox, org, permissions, presence, search, timesheets
+from guardian.models import GroupObjectPermission, UserObjectPermission
+from .versioning import bump_version
+from django.contrib.auth.models import Group
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 
+def _build_notifications(recipient_ids, verb, actor=None, target=None, data=None):
+    # ContentType lookups are served from the manager's cache after the first call
+    content_type = ContentType.objects.get_for_model(target) if target is not None else None
+    object_id = getattr(target, "id", None) if target is not None else None
+    return [
+        Notification(
+            recipient_id=recipient_id,
+            verb=verb,
+            actor=actor,
+            target_content_type=content_type,
+            target_object_id=object_id,
+            data=dict(data or {}),
+        )
+        for recipient_id in recipient_ids
+    ]
+
+def _bulk_notify(notifications):
+    # single INSERT for the whole fan-out, plus the recipients' unread counters
+    return inbox.deliver(notifications)
+
 def _create_notification(recipient, verb, actor=None, target=None, data=None):
-    Notification.objects.create(
-        recipient=recipient,
-        verb=verb,
-        actor=actor,
-        target_content_type=ContentType.objects.get_for_model(target) if target else None,
-        target_object_id=getattr(target, "id", None) if target else None,
-        data=data or {},
-    )
+    return _bulk_notify(_build_notifications([recipient.id], verb, actor=actor, target=target, data=data))[0]
 
-def notify_presence_change(user, action, session):
+@receiver([post_save, post_delete], sender=Department)
+@receiver([post_save, post_delete], sender=Team)
+@receiver([post_save, post_delete], sender=TeamMembership)
+def invalidate_org_graph(sender, **kwargs):
+    org.invalidate()
+
+@receiver(post_save, sender=Employee)
+def index_employee(sender, instance, update_fields=None, **kwargs):
+    # login only touches last_login, which the directory does not show
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    search.get_backend().index([instance.pk])
+
+@receiver(post_delete, sender=Employee)
+def unindex_employee(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
+
+@receiver(post_save, sender=Department)
+def reindex_department(sender, instance, created=False, **kwargs):
+    if not created:
+        search.get_backend().index(list(instance.employees.values_list("id", flat=True)))
+
+@receiver([post_save, post_delete], sender=Notice)
+@receiver(m2m_changed, sender=Notice.visible_to_groups.through)
+@receiver(post_delete, sender=Group)
+def invalidate_dashboard_notices(sender, **kwargs):
+    bump_version("notices")
+
+@receiver(m2m_changed, sender=Employee.groups.through)
+@receiver(post_delete, sender=Group)
+def invalidate_notice_groups(sender, **kwargs):
+    # cached per-user group sets pick the notice audience
+    bump_version("groups")
+
+@receiver([post_save, post_delete], sender=LeaveRequest)
+def invalidate_dashboard_leaves(sender, **kwargs):
+    bump_version("leaves")
+
+@receiver([post_save, post_delete], sender=Holiday)
+def invalidate_holidays(sender, **kwargs):
+    bump_version("holidays")
+
+@receiver([post_save, post_delete], sender=UserObjectPermission)
+@receiver([post_save, post_delete], sender=GroupObjectPermission)
+@receiver(m2m_changed, sender=Employee.groups.through)
+def invalidate_permissions(sender, **kwargs):
+    permissions.invalidate()
+
+@receiver([post_save, post_delete], sender=TimeSession)
+def refresh_timesheet_rollup(sender, instance, **kwargs):
+    # an edit also clears the days the session covered when it was loaded
+    loaded = history.loaded_state(instance)
+    previous = (loaded.get("start_time"), loaded.get("end_time"))
+    if loaded.get("user_id", instance.user_id) != instance.user_id:
+        timesheets.refresh_for_session(TimeSession(user_id=loaded["user_id"], start_time=previous[0], end_time=previous[1]))
+        previous = None
+    # open sessions do not count until they are closed
+    if instance.end_time or (previous and previous[1]):
+        timesheets.refresh_for_session(instance, previous)
+    history.remember_state(instance)
+
+@receiver(post_delete, sender=TimeSession)
+def record_session_deletion(sender, instance, **kwargs):
+    # deletion leaves no updated_at behind; reconciliation reads these alongside changed sessions
+    if instance.end_time:
+        DeletedTimeSession.objects.create(user_id=instance.user_id, start_time=instance.start_time, end_time=instance.end_time)
+
+@receiver(post_save, sender=TimeSession)
+def track_presence(sender, instance, **kwargs):
+    # watchers only hear about committed sessions
+    update = presence.index.stopped if instance.end_time else presence.index.started
+    transaction.on_commit(lambda: update(instance))
+
+@receiver(post_delete, sender=TimeSession)
+def untrack_presence(sender, instance, **kwargs):
+    transaction.on_commit(lambda: presence.index.stopped(instance))
+
+def presence_recipient_ids(user):
+    # team leaders of the user's teams and the department manager, from the cached org graph
+    return org.get_graph().presence_recipient_ids(user)
+
+def build_presence_notifications(user, action, session):
     # recipients: team leaders and department manager
-    recipients = set()
-    for team in user.teams.all():
-        if team.team_leader:
-            recipients.add(team.team_leader)
-    if user.department and user.department.manager:
-        recipients.add(user.department.manager)
     # optionally notify team members (not by default)
-    for r in recipients:
-        _create_notification(recipient=r, verb=f"{user.get_full_name() or user.username} {action} working", actor=user, target=session, data={"action": action, "session_id": session.id})
+    recipients = presence_recipient_ids(user)
+    verb = f"{user.get_full_name() or user.username} {action} working"
+    return _build_notifications(sorted(recipients), verb, actor=user, target=session, data={"action": action, "session_id": session.id})
 
-def notify_leave_created(leave):
+def notify_presence_change(user, action, session):
+    return _bulk_notify(build_presence_notifications(user, action, session))
+
+def build_leave_created_notifications(leave):
     # notify leader (if exists) to review; otherwise notify manager
-    if leave.leader:
-        _create_notification(recipient=leave.leader, verb=f"Leave request from {leave.applicant.get_full_name() or leave.applicant.username}", actor=leave.applicant, target=leave, data={"stage": "leader"})
-    elif leave.manager:
-        _create_notification(recipient=leave.manager, verb=f"Leave request from {leave.applicant.get_full_name() or leave.applicant.username}", actor=leave.applicant, target=leave, data={"stage": "manager"})
+    applicant = leave.applicant
+    verb = f"Leave request from {applicant.get_full_name() or applicant.username}"
+    notes = []
+    if leave.leader_id:
+        notes += _build_notifications([leave.leader_id], verb, actor=applicant, target=leave, data={"stage": "leader"})
+    elif leave.manager_id:
+        notes += _build_notifications([leave.manager_id], verb, actor=applicant, target=leave, data={"stage": "manager"})
     # notify applicant as confirmation
-    _create_notification(recipient=leave.applicant, verb="Your leave request was submitted", actor=None, target=leave, data={})
+    notes += _build_notifications([applicant.id], "Your leave request was submitted", actor=None, target=leave, data={})
+    return notes
+
+def notify_leave_created(leave):
+    return _bulk_notify(build_leave_created_notifications(leave))
+
+def build_leave_decision_notifications(actor, leaves, role, decision):
+    # applicants learn the outcome; leader approvals are forwarded to the manager
+    notes = []
+    for leave in leaves:
+        notes += _build_notifications([leave.applicant_id], f"Your leave request {leave.start_date}→{leave.end_date} was {decision} by your {role}", actor=actor, target=leave, data={"stage": role, "decision": decision})
+        if leave.status == LeaveRequest.STATUS_LEADER_APPROVED and leave.manager_id:
+            applicant = leave.applicant
+            notes += _build_notifications([leave.manager_id], f"Leave request from {applicant.get_full_name() or applicant.username}", actor=applicant, target=leave, data={"stage": "manager"})
+    return notes
@@ -0,0 +1,255 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from . import org
+from .models import (
+    Department, Employee, LeaveRequest, Notification, NotificationCounter, Team, TeamMembership, TimeEntry, TimeSession,
+    TimesheetDay,
+)
+from .search import get_backend
+from .versioning import bump_version
+
+FIRST_NAMES = ["Ali", "Sara", "Reza", "Maryam", "John", "Anna", "Omid", "Leila", "David", "Nina", "Hassan", "Elena"]
+LAST_NAMES = ["Ahmadi", "Karimi", "Smith", "Jones", "Moradi", "Rahimi", "Novak", "Garcia", "Hosseini", "Engel"]
+TITLES = ["Backend Engineer", "Accountant", "Designer", "HR Specialist", "Sales Manager", "Support Agent", "Data Analyst"]
+LOCATIONS = ["office", "office", "office", "remote", "client site"]
+PROJECTS = ["Payroll", "Onboarding", "Website", "Audit", "Migration", "Support"]
+VERBS = ["started a session", "submitted a leave request", "approved your leave request", "posted a notice"]
+LEAVE_STATUSES = [
+    LeaveRequest.STATUS_MANAGER_APPROVED, LeaveRequest.STATUS_MANAGER_APPROVED, LeaveRequest.STATUS_REJECTED,
+    LeaveRequest.STATUS_CANCELLED, LeaveRequest.STATUS_PENDING,
+]
+GENERATE_BATCH_SIZE = 5000
+
+
+def _adapter(field):
+    ops = connection.ops
+    kind = field.get_internal_type()
+    if kind == "DateTimeField":
+        return ops.adapt_datetimefield_value
+    if kind == "DateField":
+        return ops.adapt_datefield_value
+    if kind == "DecimalField":
+        return lambda value: ops.adapt_decimalfield_value(value, field.max_digits, field.decimal_places)
+    return None
+
+
+class Generator:
+    """Bulk-creates a self-consistent synthetic organisation.
+
+    Everything is written in batches, the large tables with raw INSERTs; the
+    derived tables (timesheet rollup, unread counters, search documents) are
+    written alongside in bulk instead of row by row through signals. Passing the same seed
+    reproduces the same organisation.
+    """
+
+    def __init__(self, employees, departments=10, teams=4, years=1, notifications=50, prefix="gen", seed=0,
+                 password="password", batch_size=GENERATE_BATCH_SIZE, today=None):
+        self.employees = employees
+        self.departments = departments
+        self.teams = teams
+        self.years = years
+        self.notifications = notifications
+        self.prefix = prefix
+        self.rnd = random.Random(seed)
+        self.password = password
+        self.batch_size = batch_size
+        self.today = today or timezone.localdate()
+        self.first_day = self.today - timedelta(days=365 * years)
+        self.tz = timezone.get_current_timezone()
+        self.counts = {}
+
+    def _create(self, model, rows):
+        """bulk_create a generator of rows in batches; returns the number created."""
+        created, batch = 0, []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        created += len(batch)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + created
+        return created
+
+    def _insert(self, model, names, rows):
+        """Raw executemany INSERT of ``rows`` (tuples ordered like ``names``) for the high-volume tables.
+
+        Skips model instances and per-value field preparation, which cost far
+        more than the INSERT itself at hundreds of thousands of rows; only
+        dates, datetimes and decimals need adapting for the backend.
+        """
+        fields = [model._meta.get_field(name) for name in names]
+        adapters = [_adapter(field) for field in fields]
+        quote = connection.ops.quote_name
+        sql = (
+            f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(f.column) for f in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))})"
+        )
+        created, batch = 0, []
+        with connection.cursor() as cursor:
+            for row in rows:
+                batch.append(tuple(adapt(value) if adapt else value for adapt, value in zip(adapters, row)))
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                created += len(batch)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + created
+        return created
+
+    def run(self):
+        with transaction.atomic():
+            people = self.org()
+            self.sessions(people)
+            self.time_entries(people)
+            self.leave_requests(people)
+            self.inbox(people)
+            self.counts["EmployeeSearchDocument"] = get_backend().index([e.pk for e in people])
+        # bulk writes skip the invalidation signals
+        org.invalidate()
+        for name in ("leaves", "notices"):
+            bump_version(name)
+        return self.counts
+
+    def org(self):
+        rnd = self.rnd
+        departments = Department.objects.bulk_create([
+            Department(name=f"{self.prefix}-dept-{i}", code=f"{self.prefix.upper()}{i}") for i in range(self.departments)
+        ])
+        # one hash for everyone: hashing per user would dominate the run
+        password = make_password(self.password)
+        people = [
+            Employee(
+                username=f"{self.prefix}-{i}", password=password,
+                first_name=rnd.choice(FIRST_NAMES), last_name=rnd.choice(LAST_NAMES), job_title=rnd.choice(TITLES),
+                email=f"{self.prefix}-{i}@example.com", national_id=f"{self.prefix}-{i}",
+                department=departments[i % len(departments)],
+                employment_date=self.first_day - timedelta(days=rnd.randrange(3650)),
+                date_of_birth=self.today - timedelta(days=rnd.randrange(22 * 365, 60 * 365)),
+            )
+            for i in range(self.employees)
+        ]
+        people = bulk_create_with_history(people, Employee, batch_size=self.batch_size, default_change_reason="generate_org")
+        if not all(e.pk for e in people):
+            people = list(Employee.objects.filter(username__startswith=f"{self.prefix}-").order_by("id"))
+        self.counts["Department"] = len(departments)
+        self.counts["Employee"] = len(people)
+
+        by_department = {}
+        for e in people:
+            by_department.setdefault(e.department_id, []).append(e)
+        teams, memberships = [], []
+        for department in departments:
+            staff = by_department.get(department.pk, [])
+            if not staff:
+                continue
+            department.manager = staff[0]
+            for j in range(self.teams):
+                members = staff[j::self.teams]
+                if members:
+                    teams.append((Team(name=f"Team {j}", code=f"{department.code}-T{j}", department=department, team_leader=members[0]), members))
+        Department.objects.bulk_update(departments, ["manager"])
+        self.manager_of = {d.pk: d.manager_id for d in departments}
+        Team.objects.bulk_create([team for team, _ in teams])
+        self.team_of = {}
+        for team, members in teams:
+            for k, e in enumerate(members):
+                self.team_of[e.pk] = team
+                memberships.append(TeamMembership(employee=e, team=team, is_leader=k == 0, joined_at=e.employment_date))
+        self.counts["Team"] = len(teams)
+        self._create(TeamMembership, memberships)
+        return people
+
+    def workdays(self):
+        day = self.first_day
+        while day < self.today:
+            if day.weekday() < 5:
+                yield day
+            day += timedelta(days=1)
+
+    def _at(self, day, minutes):
+        return timezone.make_aware(datetime.combine(day, time.min) + timedelta(minutes=minutes), self.tz)
+
+    def sessions(self, people):
+        rnd = self.rnd
+        days = list(self.workdays())
+        now = timezone.now()
+        rollup = []
+
+        def rows():
+            for e in people:
+                location = rnd.choice(LOCATIONS)
+                for day in days:
+                    if rnd.random() < 0.1:
+                        continue
+                    start, minutes = rnd.randrange(7 * 60, 10 * 60), rnd.randrange(6 * 60, 10 * 60)
+                    # sessions never cross midnight and there is at most one a day, so each is its own rollup row
+                    rollup.append((e.pk, day, location, minutes * 60, 1, now))
+                    yield e.pk, self._at(day, start), self._at(day, start + minutes), location, now, now
+        self._insert(TimeSession, ["user", "start_time", "end_time", "location", "created_at", "updated_at"], rows())
+        self._insert(TimesheetDay, ["user", "date", "location", "seconds", "sessions", "updated_at"], rollup)
+
+    def time_entries(self, people):
+        rnd = self.rnd
+        days = list(self.workdays())
+        now = timezone.now()
+        approved_until = self.today - timedelta(days=30)
+
+        def rows():
+            for e in people:
+                for day in days[::5]:
+                    yield e.pk, day, Decimal(rnd.randrange(2, 9)), rnd.choice(PROJECTS), "", "manual", day < approved_until, now
+        self._insert(TimeEntry, ["user", "date", "hours", "project", "notes", "source", "approved", "created_at"], rows())
+
+    def leave_requests(self, people):
+        rnd = self.rnd
+
+        def rows():
+            for e in people:
+                team = self.team_of.get(e.pk)
+                leader_id = team.team_leader_id if team else None
+                manager_id = self.manager_of.get(e.department_id)
+                # about four requests a year, never overlapping each other
+                day = self.first_day + timedelta(days=rnd.randrange(60))
+                while day < self.today + timedelta(days=60):
+                    length = rnd.randrange(1, 6)
+                    status = LEAVE_STATUSES[rnd.randrange(len(LEAVE_STATUSES))] if day < self.today else LeaveRequest.STATUS_PENDING
+                    yield LeaveRequest(
+                        applicant=e, team=team, start_date=day, end_date=day + timedelta(days=length - 1), status=status,
+                        leader_id=None if leader_id == e.pk else leader_id, manager_id=manager_id,
+                    )
+                    day += timedelta(days=rnd.randrange(60, 120))
+        self._create(LeaveRequest, rows())
+
+    def inbox(self, people):
+        rnd = self.rnd
+        unread = {}
+
+        now = timezone.now()
+        minutes = 365 * self.years * 24 * 60
+        data = Notification._meta.get_field("data").get_db_prep_save({}, connection)
+
+        def rows():
+            for e in people:
+                for _ in range(self.notifications):
+                    is_unread = rnd.random() < 0.2
+                    unread[e.pk] = unread.get(e.pk, 0) + is_unread
+                    created_at = now - timedelta(minutes=rnd.randrange(minutes))
+                    yield e.pk, rnd.choice(people).pk, rnd.choice(VERBS), data, created_at, is_unread
+        self._insert(Notification, ["recipient", "actor", "verb", "data", "created_at", "unread"], rows())
+        self._create(NotificationCounter, (NotificationCounter(user_id=pk, unread=count) for pk, count in unread.items()))
+
+
+def generate(employees, **options):
+    """Create a synthetic organisation of ``employees`` people; returns row counts per model."""
+    return Generator(employees, **options).run()
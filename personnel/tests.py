@@ -1,3 +1,1002 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
+
+from . import (
+    balances, benchmarks, changelists, clock, dashboard, inbox, leave_calendar, leaves, loadtest, org, org_import, outbox, permissions,
+    presence, profiling, reconciliation, retention, search, signals, timesheets,
+)
+from .admin import NotificationAdmin
+from .management.commands import export_timesheet
+from .models import (
+    DeletedTimeSession, Department, Employee, LeaveBalance, LeaveLedgerEntry, LeaveRequest, Notice, Notification, NotificationCounter,
+    NotificationEvent, Team, TeamMembership, TimeEntry, TimeSession, TimesheetDay,
+)
+
+# a fresh per-process cache, so versioned keys never meet data cached from another database
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def at(month, day, hour):
+    return datetime(2030, month, day, hour, tzinfo=dt_timezone.utc)
+
+
+def work(user, *spans):
+    """Clock ``user`` in and out once per (start, end) span."""
+    for start, end in spans:
+        clock.clock_in(user, now=start)
+        clock.clock_out(user, now=end)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaveApprovalPermissionTests(TestCase):
+    def setUp(self):
+        self.leader = Employee.objects.create_user("leader", password="pw")
+        self.delegate = Employee.objects.create_user("delegate", password="pw")
+        self.outsider = Employee.objects.create_user("outsider", password="pw")
+        self.applicant = Employee.objects.create_user("applicant", password="pw")
+        department = Department.objects.create(name="Engineering")
+        self.team = Team.objects.create(name="Platform", department=department, team_leader=self.leader)
+        self.leave = LeaveRequest.objects.create(
+            applicant=self.applicant, team=self.team, leader=self.leader, start_date=date(2030, 3, 4), end_date=date(2030, 3, 5),
+        )
+        permissions.assign("personnel.approve_leaves", self.delegate, self.team)
+
+    def test_delegated_approver_sees_and_approves(self):
+        self.client.force_login(self.delegate)
+        response = self.client.get(reverse("personnel:leave_review_list"))
+        self.assertEqual(list(response.context["as_leader"]), [self.leave])
+        self.client.post(reverse("personnel:leave_review_bulk"), {"role": "leader", "decision": "approved", "ids": [self.leave.id]})
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, LeaveRequest.STATUS_MANAGER_APPROVED)
+        self.assertEqual(self.leave.leader_decision, leaves.APPROVED)
+
+    def test_unrelated_user_cannot_approve(self):
+        self.client.force_login(self.outsider)
+        response = self.client.get(reverse("personnel:leave_review_list"))
+        self.assertEqual(list(response.context["as_leader"]), [])
+        self.assertEqual(leaves.decide(self.outsider, [self.leave.id], leaves.LEADER, leaves.APPROVED), [])
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, LeaveRequest.STATUS_PENDING)
+
+    def test_revoked_delegation_stops_approving(self):
+        permissions.remove("personnel.approve_leaves", self.delegate, self.team)
+        self.assertEqual(leaves.decide(self.delegate, [self.leave.id], leaves.LEADER, leaves.APPROVED), [])
+
+    def test_superuser_reviews_only_teams_they_lead(self):
+        boss = Employee.objects.create_superuser("boss", password="pw")
+        own_team = Team.objects.create(name="Ops", department=self.team.department, team_leader=boss)
+        own = LeaveRequest.objects.create(
+            applicant=self.applicant, team=own_team, leader=boss, start_date=date(2030, 4, 1), end_date=date(2030, 4, 2),
+        )
+        self.client.force_login(boss)
+        response = self.client.get(reverse("personnel:leave_review_list"))
+        self.assertEqual(list(response.context["as_leader"]), [own])
+        self.assertEqual(leaves.decide(boss, [self.leave.id], leaves.LEADER, leaves.APPROVED), [])
+        # the whole company's requests stay one click away in the admin
+        response = self.client.get(reverse("admin:personnel_leaverequest_changelist"))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaveRequestAdminTests(TestCase):
+    def setUp(self):
+        self.manager = Employee.objects.create_superuser("manager", password="pw")
+        self.applicant = Employee.objects.create_user("applicant", password="pw")
+        self.leave = LeaveRequest.objects.create(
+            applicant=self.applicant, manager=self.manager, start_date=date(2030, 3, 4), end_date=date(2030, 3, 5),
+        )
+        self.client.force_login(self.manager)
+
+    def test_approve_action_deducts_balance(self):
+        url = reverse("admin:personnel_leaverequest_changelist")
+        self.client.post(url, {"action": "approved_as_manager", "_selected_action": [self.leave.id]})
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, LeaveRequest.STATUS_MANAGER_APPROVED)
+        self.assertEqual(LeaveLedgerEntry.objects.get(leave_request=self.leave).days, -2)
+
+    def test_change_form_cannot_set_status(self):
+        url = reverse("admin:personnel_leaverequest_change", args=[self.leave.id])
+        self.client.post(url, {
+            "applicant": self.applicant.id, "start_date": "2030-03-04", "end_date": "2030-03-05", "status": LeaveRequest.STATUS_MANAGER_APPROVED,
+        })
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, LeaveRequest.STATUS_PENDING)
+        self.assertFalse(LeaveLedgerEntry.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = Employee.objects.create_user("recipient")
+        # a notification without a recipient fails on insert, like any event that cannot be delivered
+        outbox.HANDLERS["test"] = lambda events: {
+            e.id: [Notification(recipient_id=None if e.payload.get("poison") else self.user.id, verb=e.kind)] for e in events
+        }
+        self.addCleanup(outbox.HANDLERS.pop, "test")
+
+    def test_worker_drains_the_queue(self):
+        for _ in range(5):
+            outbox.enqueue("test")
+        totals = outbox.run_worker(batch_size=2, once=True)
+        self.assertEqual((totals["events"], totals["notifications"], totals["failed"]), (5, 5, 0))
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(inbox.unread_count(self.user), 5)
+
+    def test_poison_event_does_not_block_the_batch(self):
+        good = outbox.enqueue("test")
+        bad = outbox.enqueue("test", payload={"poison": True})
+        with self.assertLogs("personnel.outbox", "WARNING"):
+            self.assertEqual(outbox.process_batch(), (2, 1, 1))
+        self.assertFalse(NotificationEvent.objects.filter(pk=good.pk).exists())
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 1)
+        self.assertEqual(inbox.unread_count(self.user), 1)
+
+    def test_poison_event_fails_after_max_attempts(self):
+        bad = outbox.enqueue("test", payload={"poison": True})
+        for _ in range(2):
+            NotificationEvent.objects.filter(pk=bad.pk).update(available_at=bad.created_at)
+            with self.assertLogs("personnel.outbox", "WARNING"):
+                outbox.process_batch(max_attempts=2)
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, NotificationEvent.STATUS_FAILED)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class EmployeeHistoryTests(TestCase):
+    def setUp(self):
+        Employee.objects.create_user("historian", address={"city": "Oslo"})
+        self.employee = Employee.objects.get(username="historian")
+
+    def saved(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.employee.save()
+        return [q["sql"] for q in queries if Employee.history.model._meta.db_table in q["sql"]]
+
+    def test_unchanged_save_does_not_touch_history(self):
+        self.assertEqual(self.saved(), [])
+        self.assertEqual(self.employee.history.count(), 1)
+
+    def test_changed_fields_are_recorded(self):
+        self.employee.first_name = "Ada"
+        self.assertEqual(len(self.saved()), 1)
+        self.employee.address["city"] = "Bergen"
+        self.saved()
+        self.assertEqual(self.employee.history.count(), 3)
+        self.assertEqual(self.saved(), [])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class TimesheetExportTests(TestCase):
+    def setUp(self):
+        self.ada = Employee.objects.create_user("ada")
+        self.bob = Employee.objects.create_user("bob")
+        # bob's January comes after ada's February: rows are ordered by user, then date
+        work(self.ada, (at(2, 1, 9), at(2, 1, 12)), (at(2, 1, 22), at(2, 2, 2)))
+        work(self.bob, (at(1, 15, 8), at(1, 15, 16)))
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def export(self, name, **options):
+        path = os.path.join(self.dir, name)
+        call_command("export_timesheet", out=path, from_month="2030-01", to_month="2030-02", stdout=io.StringIO(), **options)
+        with open(path, newline="") as fh:
+            return fh.read()
+
+    def test_rollup_and_sessions_agree(self):
+        expected = "username,date,hours\r\nada,2030-02-01,5.0\r\nada,2030-02-02,2.0\r\nbob,2030-01-15,8.0\r\n"
+        self.assertEqual(self.export("rollup.csv", source="rollup"), expected)
+        self.assertEqual(self.export("sessions.csv", source="sessions"), expected)
+
+    def test_sharded_export_matches_a_single_process(self):
+        serial = self.export("serial.csv")
+        command = export_timesheet.Command()
+        for split in ("month", "users"):
+            with self.subTest(split):
+                path = os.path.join(self.dir, f"{split}.csv")
+                options = {"split": split, "workers": 2, "chunk_size": 100, "source": "rollup"}
+                shards = command.build_shards(date(2030, 1, 1), date(2030, 3, 1), path, options, None, None)
+                # the same shard exports the process pool runs, done inline
+                command.run_shards(shards, 1)
+                command.merge_shards(shards, path, split, None, None)
+                with open(path, newline="") as fh:
+                    self.assertEqual(fh.read(), serial)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class NotificationFanOutTests(TestCase):
+    def setUp(self):
+        self.manager = Employee.objects.create_user("manager")
+        department = Department.objects.create(name="Operations", manager=self.manager)
+        self.worker = Employee.objects.create_user("worker", department=department)
+        self.leaders = [Employee.objects.create_user(f"leader{i}") for i in range(3)]
+        for i, leader in enumerate(self.leaders):
+            team = Team.objects.create(name=f"Shift {i}", department=department, team_leader=leader)
+            TeamMembership.objects.create(employee=self.worker, team=team)
+        self.session = clock.clock_in(self.worker, now=at(1, 7, 9))
+
+    def test_presence_change_is_one_insert_for_every_recipient(self):
+        signals.presence_recipient_ids(self.worker)
+        with CaptureQueriesContext(connection) as queries:
+            notes = signals.notify_presence_change(self.worker, "started", self.session)
+        self.assertEqual(sorted(n.recipient_id for n in notes), sorted(e.id for e in [self.manager, *self.leaders]))
+        table = Notification._meta.db_table
+        self.assertEqual(len([q for q in queries if q["sql"].startswith(f'INSERT INTO "{table}"')]), 1)
+        self.assertEqual(inbox.unread_count(self.manager), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class OrgGraphTests(TestCase):
+    def setUp(self):
+        self.manager = Employee.objects.create_user("manager")
+        self.leader = Employee.objects.create_user("leader")
+        self.member = Employee.objects.create_user("member")
+        self.department = Department.objects.create(name="Finance", manager=self.manager)
+        self.team = Team.objects.create(name="Payroll", department=self.department, team_leader=self.leader)
+        TeamMembership.objects.create(employee=self.member, team=self.team)
+
+    def test_warm_lookups_skip_the_database(self):
+        org.get_graph()
+        with self.assertNumQueries(0):
+            self.assertEqual(org.get_graph().leader_ids(self.member.id), {self.leader.id})
+        # another process has no local copy and reads the graph from the shared cache
+        org._local.update(version=None, graph=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(org.get_graph().team_ids(self.member.id), [self.team.id])
+
+    def test_org_changes_invalidate_the_graph(self):
+        org.get_graph()
+        successor = Employee.objects.create_user("successor")
+        self.team.team_leader = successor
+        self.team.save()
+        self.assertEqual(org.get_graph().leader_ids(self.member.id), {successor.id})
+        TeamMembership.objects.filter(employee=self.member).delete()
+        self.assertEqual(org.get_graph().presence_recipient_ids(self.member), set())
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class InboxTests(TestCase):
+    def setUp(self):
+        self.user = Employee.objects.create_user("reader")
+
+    def notify(self, count):
+        return inbox.deliver([Notification(recipient=self.user, verb=f"note {i}") for i in range(count)])
+
+    def test_pages_do_not_overlap(self):
+        self.notify(5)
+        first, cursor = inbox.page(self.user, limit=3)
+        second, end = inbox.page(self.user, cursor=cursor, limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(end)
+        self.assertEqual(
+            [n.id for n in first + second], list(Notification.objects.order_by("-created_at", "-id").values_list("id", flat=True)),
+        )
+
+    def test_counter_follows_reads(self):
+        notes = self.notify(4)
+        self.assertEqual(inbox.unread_count(self.user), 4)
+        inbox.mark_read(self.user, [notes[0].id, notes[0].id, notes[1].id])
+        self.assertEqual(inbox.unread_count(self.user), 2)
+        inbox.mark_all_read(self.user)
+        self.assertEqual(inbox.unread_count(self.user), 0)
+
+    def test_delivery_racing_the_lazy_counter_is_kept(self):
+        recount = inbox._recount
+
+        def recount_then_deliver(user):
+            counted = recount(user)
+            # a first delivery commits between the count and the counter insert
+            self.notify(1)
+            return counted
+
+        self.assertFalse(NotificationCounter.objects.filter(user=self.user).exists())
+        with mock.patch.object(inbox, "_recount", recount_then_deliver):
+            self.assertEqual(inbox.unread_count(self.user), 1)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.user = Employee.objects.create_user("reader")
+        notes = inbox.deliver([Notification(recipient=self.user, verb=f"note {i}") for i in range(6)])
+        inbox.mark_read(self.user, [n.id for n in notes[:4]])
+        # four read and one unread notification are past retention; the last one is recent
+        Notification.objects.filter(id__in=[n.id for n in notes[:5]]).update(created_at=datetime(2025, 1, 10, 12, tzinfo=dt_timezone.utc))
+        self.recent, self.unread = notes[5], notes[4]
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_read_notifications_are_archived_in_batches(self):
+        with self.settings(NOTIFICATION_RETENTION_DAYS=30):
+            total, _ = retention.archive_notifications(directory=self.dir, batch_size=3)
+        self.assertEqual(total, 4)
+        self.assertEqual(set(Notification.objects.values_list("id", flat=True)), {self.recent.id, self.unread.id})
+        with gzip.open(os.path.join(self.dir, "notifications-2025-01.jsonl.gz"), "rt") as fh:
+            self.assertEqual([json.loads(line)["verb"] for line in fh], [f"note {i}" for i in range(4)])
+        self.assertEqual(inbox.unread_count(self.user), 2)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class DirectorySearchTests(TestCase):
+    backends = ("personnel.search.DirectorySearch", "personnel.search.SQLiteFTS5DirectorySearch")
+
+    def setUp(self):
+        self.department = Department.objects.create(name="Engineering")
+        self.sarah = Employee.objects.create_user("sarah", first_name="Sarah", last_name="Connor", department=self.department)
+        self.zoe = Employee.objects.create_user("zoe", first_name="Zoë", last_name="Sarandon", job_title="Engineer")
+        # former employees outrank everyone for "sar" and must not crowd the page
+        for i in range(3):
+            Employee.objects.create_user(f"gone{i}", first_name="Sar", last_name=f"Gone{i}", is_active=False)
+
+    def search(self, query, limit=10, **options):
+        return search.get_backend().search(query, limit, **options)
+
+    def test_word_prefixes_match(self):
+        for backend in self.backends:
+            with self.subTest(backend), self.settings(DIRECTORY_SEARCH_BACKEND=backend):
+                self.assertEqual(set(self.search("sar")), {self.sarah.id, self.zoe.id})
+                self.assertEqual(self.search("sarah eng"), [self.sarah.id])
+                self.assertEqual(self.search("zoe"), [self.zoe.id])
+                self.assertEqual(self.search("arah"), [])
+
+    def test_inactive_employees_are_filtered_before_the_limit(self):
+        for backend in self.backends:
+            with self.subTest(backend), self.settings(DIRECTORY_SEARCH_BACKEND=backend):
+                self.assertEqual(len(self.search("sar", limit=2)), 2)
+                self.assertEqual(len(self.search("sar", limit=10, active_only=False)), 5)
+
+    def test_department_rename_is_reindexed(self):
+        self.department.name = "Research"
+        self.department.save()
+        for backend in self.backends:
+            with self.subTest(backend), self.settings(DIRECTORY_SEARCH_BACKEND=backend):
+                self.assertEqual(self.search("research"), [self.sarah.id])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class DashboardTests(TestCase):
+    url = reverse_lazy("personnel:dashboard_home")
+
+    def setUp(self):
+        self.user = Employee.objects.create_user("reader")
+        self.client.force_login(self.user)
+
+    def etag(self):
+        # the first response issues the CSRF cookie the ETag depends on
+        self.client.get(self.url)
+        return self.client.get(self.url)["ETag"]
+
+    def test_unchanged_dashboard_is_not_modified(self):
+        etag = self.etag()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_new_notification_changes_the_etag(self):
+        etag = self.etag()
+        inbox.deliver([Notification(recipient=self.user, verb="pinged")])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class TimesheetRollupTests(TestCase):
+    start, end = date(2030, 1, 1), date(2030, 1, 4)
+
+    def setUp(self):
+        self.user = Employee.objects.create_user("worker")
+        work(self.user, (at(1, 1, 9), at(1, 1, 12)), (at(1, 1, 22), at(1, 2, 2)))
+
+    def totals(self):
+        return list(timesheets.iter_rollup_totals(self.start, self.end))
+
+    def test_rollup_matches_sessions(self):
+        expected = [("worker", date(2030, 1, 1), 5 * 3600), ("worker", date(2030, 1, 2), 2 * 3600)]
+        self.assertEqual(list(timesheets.iter_daily_totals(self.start, self.end)), expected)
+        self.assertEqual(self.totals(), expected)
+
+    def test_edits_and_deletes_refresh_the_days_they_touch(self):
+        session = TimeSession.objects.get(start_time=at(1, 1, 22))
+        session.start_time, session.end_time = at(1, 3, 8), at(1, 3, 9)
+        session.save()
+        self.assertEqual(self.totals(), [("worker", date(2030, 1, 1), 3 * 3600), ("worker", date(2030, 1, 3), 3600)])
+        session.delete()
+        self.assertEqual(self.totals(), [("worker", date(2030, 1, 1), 3 * 3600)])
+
+    def test_rebuild_matches_incremental_rows(self):
+        incremental = set(TimesheetDay.objects.values_list("user_id", "date", "location", "seconds", "sessions"))
+        self.assertEqual(timesheets.rebuild_rollup(self.start, self.end), 2)
+        self.assertEqual(set(TimesheetDay.objects.values_list("user_id", "date", "location", "seconds", "sessions")), incremental)
+
+    def test_admin_edit_refreshes_the_old_days(self):
+        admin_user = Employee.objects.create_superuser("admin", password="pw")
+        self.client.force_login(admin_user)
+        session = TimeSession.objects.get(start_time=at(1, 1, 22))
+        self.client.post(reverse("admin:personnel_timesession_change", args=[session.id]), {
+            "user": admin_user.id, "location": "",
+            "start_time_0": "2030-01-03", "start_time_1": "08:00:00", "end_time_0": "2030-01-03", "end_time_1": "09:00:00",
+        })
+        self.assertEqual(self.totals(), [("worker", date(2030, 1, 1), 3 * 3600), ("admin", date(2030, 1, 3), 3600)])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.user = Employee.objects.create_user("worker")
+        work(self.user, (at(1, 1, 9), at(1, 1, 12)), (at(1, 1, 22), at(1, 2, 2)))
+        reconciliation.reconcile()
+        # written well before the mark, so only later changes fall inside the next run's window
+        TimeSession.objects.update(updated_at=datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+
+    def entries(self):
+        return sorted(TimeEntry.objects.filter(source=reconciliation.SESSION_SOURCE).values_list("date", "hours"))
+
+    def test_rerun_changes_nothing(self):
+        self.assertEqual(self.entries(), [(date(2030, 1, 1), Decimal("5.00")), (date(2030, 1, 2), Decimal("2.00"))])
+        result = reconciliation.reconcile()
+        self.assertEqual((result.created, result.updated, result.deleted), (0, 0, 0))
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_edit_keeping_end_time_is_picked_up(self):
+        session = TimeSession.objects.get(start_time=at(1, 1, 9))
+        session.start_time = at(1, 1, 11)
+        session.save()
+        self.assertEqual(reconciliation.reconcile().updated, 1)
+        self.assertEqual(self.entries()[0], (date(2030, 1, 1), Decimal("3.00")))
+
+    def test_deleted_session_is_picked_up(self):
+        TimeSession.objects.filter(start_time=at(1, 1, 22)).delete()
+        result = reconciliation.reconcile()
+        self.assertEqual((result.updated, result.deleted), (1, 1))
+        self.assertEqual(self.entries(), [(date(2030, 1, 1), Decimal("3.00"))])
+
+    def test_full_run_clears_days_without_sessions(self):
+        TimeSession.objects.filter(start_time=at(1, 1, 22)).delete()
+        DeletedTimeSession.objects.all().delete()
+        self.assertEqual(reconciliation.reconcile().deleted, 0)
+        self.assertEqual(reconciliation.reconcile(full=True).deleted, 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaveDecisionTests(TestCase):
+    def setUp(self):
+        self.leader = Employee.objects.create_user("leader")
+        self.manager = Employee.objects.create_user("manager")
+        self.applicant = Employee.objects.create_user("applicant")
+        self.team = Team.objects.create(name="Support", department=Department.objects.create(name="Service"), team_leader=self.leader)
+
+    def request(self, day, manager=True):
+        return LeaveRequest.objects.create(
+            applicant=self.applicant, team=self.team, leader=self.leader, manager=self.manager if manager else None,
+            start_date=date(2030, 3, day), end_date=date(2030, 3, day),
+        )
+
+    def statuses(self, *leaves_):
+        return [LeaveRequest.objects.get(pk=lr.pk).status for lr in leaves_]
+
+    def test_bulk_leader_approval_follows_each_request(self):
+        with_manager, without_manager = self.request(4), self.request(5, manager=False)
+        decided = leaves.decide(self.leader, [with_manager.id, without_manager.id], leaves.LEADER, leaves.APPROVED)
+        self.assertEqual({lr.id for lr in decided}, {with_manager.id, without_manager.id})
+        self.assertEqual(self.statuses(with_manager, without_manager), [LeaveRequest.STATUS_LEADER_APPROVED, LeaveRequest.STATUS_MANAGER_APPROVED])
+        # only the request that reached final approval is deducted
+        self.assertEqual(list(LeaveLedgerEntry.objects.values_list("leave_request_id", flat=True)), [without_manager.id])
+
+    def test_second_decision_is_skipped(self):
+        leave = self.request(4)
+        self.assertEqual(leaves.decide(self.leader, [leave.id], leaves.LEADER, leaves.REJECTED), [leave])
+        # a concurrent approval finds the request already decided and leaves it alone
+        self.assertEqual(leaves.decide(self.leader, [leave.id], leaves.LEADER, leaves.APPROVED), [])
+        self.assertEqual(self.statuses(leave), [LeaveRequest.STATUS_REJECTED])
+
+    def test_repeated_final_approval_deducts_once(self):
+        leave = self.request(4)
+        leaves.decide(self.leader, [leave.id], leaves.LEADER, leaves.APPROVED)
+        self.assertEqual(len(leaves.decide(self.manager, [leave.id], leaves.MANAGER, leaves.APPROVED)), 1)
+        self.assertEqual(leaves.decide(self.manager, [leave.id], leaves.MANAGER, leaves.APPROVED), [])
+        self.assertEqual(LeaveLedgerEntry.objects.filter(leave_request=leave).count(), 1)
+
+    def test_manager_waits_for_the_leader(self):
+        leave = self.request(4)
+        self.assertEqual(leaves.decide(self.manager, [leave.id], leaves.MANAGER, leaves.APPROVED), [])
+        self.assertEqual(self.statuses(leave), [LeaveRequest.STATUS_PENDING])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaveRequestFormTests(TestCase):
+    def setUp(self):
+        self.applicant = Employee.objects.create_user("applicant")
+        self.client.force_login(self.applicant)
+        self.data = {"start_date": "2030-03-04", "end_date": "2030-03-06", "reason": "Trip"}
+
+    def test_overlapping_request_is_refused(self):
+        LeaveRequest.objects.create(applicant=self.applicant, start_date=date(2030, 3, 6), end_date=date(2030, 3, 8))
+        response = self.client.post(reverse("personnel:leave_create"), self.data)
+        self.assertEqual(response.context["form"].non_field_errors(), [leave_calendar.OVERLAP_MESSAGE])
+
+    def test_request_losing_the_race_to_the_constraint_is_refused(self):
+        # PostgreSQL's exclusion constraint rejects an overlapping request saved after the form checked
+        error = IntegrityError(f'conflicting key value violates exclusion constraint "{leave_calendar.OVERLAP_CONSTRAINT}"')
+        with mock.patch.object(LeaveRequest, "save", side_effect=error):
+            response = self.client.post(reverse("personnel:leave_create"), self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["form"].non_field_errors(), [leave_calendar.OVERLAP_MESSAGE])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaveCalendarApiTests(TestCase):
+    def setUp(self):
+        self.manager = Employee.objects.create_user("manager")
+        self.department = Department.objects.create(name="Sales", manager=self.manager)
+        self.other = Team.objects.create(name="Field", department=Department.objects.create(name="Field sales"))
+        self.team = Team.objects.create(name="Inside", department=self.department)
+        self.member = Employee.objects.create_user("member", department=self.department)
+        TeamMembership.objects.create(employee=self.member, team=self.team)
+        LeaveRequest.objects.create(applicant=self.member, start_date=date(2030, 3, 4), end_date=date(2030, 3, 5))
+        self.outsider = Employee.objects.create_user("outsider")
+        self.delegate = Employee.objects.create_user("delegate")
+        permissions.assign("personnel.approve_leaves", self.delegate, self.team)
+
+    def get(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse("personnel:leave_calendar_api"), {"month": "2030-03", **params})
+
+    def test_team_calendar(self):
+        for user in (self.member, self.manager, self.delegate):
+            with self.subTest(user.username):
+                response = self.get(user, team=self.team.id)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["absences"]), 1)
+        self.assertEqual(self.get(self.outsider, team=self.team.id).status_code, 403)
+        self.assertEqual(self.get(self.member, team=self.other.id).status_code, 403)
+
+    def test_department_and_company_calendars(self):
+        self.assertEqual(self.get(self.member, department=self.department.id).status_code, 200)
+        self.assertEqual(self.get(self.outsider, department=self.department.id).status_code, 403)
+        self.assertEqual(self.get(self.manager).status_code, 403)
+        staff = Employee.objects.create_user("hr", is_staff=True)
+        self.assertEqual(len(self.get(staff).json()["absences"]), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaveBalanceTests(TestCase):
+    def setUp(self):
+        self.employee = Employee.objects.create_user("employee", employment_date=date(2020, 1, 6))
+
+    def entry(self, days, kind=LeaveLedgerEntry.KIND_ADJUSTMENT):
+        return LeaveLedgerEntry(employee=self.employee, kind=kind, days=Decimal(days), year=2030)
+
+    def test_snapshot_follows_the_ledger(self):
+        LeaveLedgerEntry.objects.bulk_create([self.entry(3)])
+        balances.post([self.entry(2)])
+        self.assertEqual(balances.balance(self.employee), Decimal(5))
+        balances.post([self.entry(-1), self.entry("0.5")])
+        self.assertEqual(balances.balance(self.employee), Decimal("4.5"))
+
+    def test_first_postings_racing_for_the_snapshot(self):
+        totals = balances._ledger_totals
+
+        def totals_then_concurrent_post(employee_ids):
+            counted = totals(employee_ids)
+            # another first posting commits its snapshot and entry after this one summed the ledger
+            LeaveLedgerEntry.objects.bulk_create([self.entry(4)])
+            LeaveBalance.objects.create(employee=self.employee, days=Decimal(4))
+            return counted
+
+        with mock.patch.object(balances, "_ledger_totals", totals_then_concurrent_post):
+            balances.post([self.entry(2)])
+        self.assertEqual(balances.balance(self.employee), Decimal(6))
+
+    def test_accrual_command(self):
+        call_command("accrue_leave", "--year", "2030", "--days", "12.5", stdout=io.StringIO())
+        call_command("accrue_leave", "--year", "2030", "--days", "12.5", stdout=io.StringIO())
+        self.assertEqual(balances.balance(self.employee), Decimal("12.5"))
+        for days in ("abc", "-3", "NaN"):
+            with self.subTest(days), self.assertRaisesMessage(CommandError, "expected a positive number of days"):
+                call_command("accrue_leave", "--days", days)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class PresenceTests(TestCase):
+    def setUp(self):
+        self.leader = Employee.objects.create_user("leader")
+        self.member = Employee.objects.create_user("member")
+        self.stranger = Employee.objects.create_user("stranger")
+        team = Team.objects.create(name="Night shift", department=Department.objects.create(name="Care"), team_leader=self.leader)
+        TeamMembership.objects.create(employee=self.member, team=team)
+        presence.index.reset()
+        self.addCleanup(presence.index.reset)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def watch(self, user):
+        watcher = presence.index.subscribe(presence.watcher_for(user, self.loop))
+        self.addCleanup(presence.index.unsubscribe, watcher)
+        return watcher
+
+    def events(self, watcher):
+        # let the loop run the offers queued from this thread
+        self.loop.run_until_complete(asyncio.sleep(0))
+        events = []
+        while not watcher.queue.empty():
+            kind, entry = watcher.queue.get_nowait()
+            events.append((kind, entry["user_id"]))
+        return events
+
+    def test_leader_follows_their_team_only(self):
+        presence.index.ensure_loaded()
+        watcher = self.watch(self.leader)
+        with self.captureOnCommitCallbacks(execute=True):
+            clock.clock_in(self.member, "Ward 3")
+            clock.clock_in(self.stranger)
+        self.assertEqual(self.events(watcher), [("started", self.member.id)])
+        self.assertEqual([e["user_id"] for e in presence.index.snapshot(watcher)], [self.member.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            clock.clock_out(self.member)
+        self.assertEqual(self.events(watcher), [("stopped", self.member.id)])
+        self.assertEqual(presence.index.snapshot(watcher), [])
+
+    def test_index_loads_open_sessions(self):
+        clock.clock_in(self.member, "Ward 3")
+        presence.index.ensure_loaded()
+        self.assertEqual([e["location"] for e in presence.index.snapshot(self.watch(self.leader))], ["Ward 3"])
+
+    def test_members_cannot_watch(self):
+        self.client.force_login(self.member)
+        self.assertFalse(self.client.get(reverse("personnel:presence_board")).context["can_watch"])
+        self.assertEqual(self.client.get(reverse("personnel:presence_stream")).status_code, 403)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AsyncDashboardTests(TestCase):
+    url = reverse_lazy("personnel:async_dashboard_home")
+
+    def setUp(self):
+        self.user = Employee.objects.create_user("reader")
+        self.client.force_login(self.user)
+        Notice.objects.create(title="Fire drill", content="Thursday 10:00")
+        # a fresh deploy: no notice boundaries, groups, counters or fragments cached yet
+        cache.clear()
+
+    def test_cold_cache_is_served(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Fire drill")
+
+    def test_etag_follows_notices_and_notifications(self):
+        self.client.get(self.url)
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Notice.objects.create(title="Canteen closed", content="Friday")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Canteen closed")
+        etag = response["ETag"]
+        inbox.deliver([Notification(recipient=self.user, verb="pinged")])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ClockTests(TestCase):
+    def setUp(self):
+        self.user = Employee.objects.create_user("worker")
+
+    def test_second_clock_in_is_refused(self):
+        self.assertIsNotNone(clock.clock_in(self.user, now=at(1, 3, 9)))
+        self.assertIsNone(clock.clock_in(self.user, now=at(1, 3, 10)))
+        self.assertEqual(TimeSession.objects.filter(user=self.user, end_time__isnull=True).count(), 1)
+        self.assertEqual(clock.clock_out(self.user, now=at(1, 3, 11)).end_time, at(1, 3, 11))
+        self.assertIsNone(clock.clock_out(self.user, now=at(1, 3, 12)))
+
+    def test_double_click_opens_one_session(self):
+        self.client.force_login(self.user)
+        for name in ("personnel:session_start", "personnel:async_session_start"):
+            self.client.post(reverse(name), {"location": "Desk"})
+            self.client.post(reverse(name), {"location": "Desk"})
+            self.assertEqual(TimeSession.objects.filter(user=self.user, end_time__isnull=True).count(), 1)
+            clock.clock_out(self.user)
+
+    def test_close_sessions_closes_only_open_ones(self):
+        other = Employee.objects.create_user("other")
+        work(self.user, (at(1, 3, 8), at(1, 3, 9)))
+        clock.clock_in(self.user, now=at(1, 3, 10))
+        clock.clock_in(other, now=at(1, 3, 10))
+        closed = clock.close_sessions(TimeSession.objects.all(), now=at(1, 3, 12))
+        self.assertEqual({s.user_id for s in closed}, {self.user.id, other.id})
+        self.assertFalse(TimeSession.objects.filter(end_time__isnull=True).exists())
+        self.assertEqual(TimeSession.objects.get(start_time=at(1, 3, 8)).end_time, at(1, 3, 9))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class OrgImportTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.write("deps.csv", "name,code,description,manager\r\nEngineering,ENG,Builds things,1001\r\nSales,SAL,,\r\n")
+        self.write("emps.jsonl", "\n".join(json.dumps(row) for row in [
+            {"username": "ada", "national_id": "1001", "first_name": "Ada", "department": "Engineering", "employment_date": "2030-01-02"},
+            {"username": "bob", "national_id": "1002", "first_name": "Bob", "department": "Sales", "is_active": "yes"},
+        ]) + "\n")
+
+    def write(self, name, text):
+        with open(os.path.join(self.dir, name), "w", newline="", encoding="utf-8") as fh:
+            fh.write(text)
+
+    def run_import(self, **options):
+        paths = {"departments": os.path.join(self.dir, "deps.csv"), "employees": os.path.join(self.dir, "emps.jsonl")}
+        return org_import.OrgImport().run(**{name: org_import.read_rows(path) for name, path in paths.items()}, **options)
+
+    def counts(self, result, label):
+        stats = result.stats[label]
+        return stats.inserted, stats.updated, stats.unchanged
+
+    def test_first_import_inserts_and_resolves_managers(self):
+        result = self.run_import()
+        self.assertEqual(self.counts(result, "departments"), (2, 0, 0))
+        self.assertEqual(self.counts(result, "employees"), (2, 0, 0))
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.references_changed, 1)
+        ada = Employee.objects.get(username="ada")
+        self.assertEqual(ada.department.name, "Engineering")
+        self.assertEqual(ada.employment_date, date(2030, 1, 2))
+        self.assertEqual(Department.objects.get(code="ENG").manager, ada)
+        self.assertFalse(ada.has_usable_password())
+        self.assertEqual(ada.history.get().history_change_reason, org_import.CHANGE_REASON)
+
+    def test_rerun_is_unchanged_and_edits_are_updates(self):
+        self.run_import()
+        result = self.run_import()
+        self.assertEqual(self.counts(result, "departments"), (0, 0, 2))
+        self.assertEqual(self.counts(result, "employees"), (0, 0, 2))
+        self.assertEqual(result.references_changed, 0)
+        self.write("emps.jsonl", json.dumps({"username": "ada", "national_id": "1001", "job_title": "Lead"}) + "\n")
+        result = self.run_import()
+        self.assertEqual(self.counts(result, "employees"), (0, 1, 0))
+        self.assertEqual(Employee.objects.get(username="ada").job_title, "Lead")
+        self.assertEqual(Employee.objects.get(username="ada").history.count(), 2)
+
+    def test_bad_rows_are_skipped_and_reported(self):
+        self.write("emps.jsonl", "\n".join(json.dumps(row) for row in [
+            {"username": "ada", "national_id": "1001", "department": "Nowhere"},
+            {"username": "bob", "national_id": "1002", "employment_date": "someday"},
+            {"username": "cy", "national_id": "1003"},
+        ]) + "\n")
+        result = self.run_import()
+        emps = os.path.join(self.dir, "emps.jsonl")
+        # ada was skipped, so Engineering's manager no longer resolves either
+        self.assertEqual([line for line, _ in result.errors], [f"{emps} line 1", f"{emps} line 2", "department Engineering"])
+        self.assertIn("unknown department 'Nowhere'", result.errors[0][1])
+        self.assertEqual(list(Employee.objects.filter(national_id__startswith="100").values_list("username", flat=True)), ["cy"])
+
+    def test_dry_run_rolls_back(self):
+        out = io.StringIO()
+        call_command(
+            "import_org", departments=os.path.join(self.dir, "deps.csv"), employees=os.path.join(self.dir, "emps.jsonl"),
+            dry_run=True, stdout=out, stderr=io.StringIO(),
+        )
+        self.assertIn("employees: 2 inserted, 0 updated, 0 unchanged", out.getvalue())
+        self.assertIn("Would import 4 rows", out.getvalue())
+        self.assertFalse(Employee.objects.filter(username__in=["ada", "bob"]).exists())
+        self.assertFalse(Department.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.user = Employee.objects.create_user("recipient")
+        outbox.HANDLERS["test"] = lambda events: {e.id: [Notification(recipient_id=self.user.id, verb=e.kind)] for e in events}
+        self.addCleanup(outbox.HANDLERS.pop, "test")
+
+    def test_committed_work_runs_inside_the_rolled_back_transaction(self):
+        benchmarks._committed(lambda: outbox.dispatch("test"))
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(inbox.unread_count(self.user), 1)
+
+    def test_missing_baseline_is_reported_not_failed(self):
+        path = os.path.join(self.dir, "baselines.json")
+        options = {"sizes": [20], "repeat": 1, "only": ["dashboard_home"], "baseline": path}
+        out = io.StringIO()
+        call_command("benchmark", stdout=out, **options)
+        self.assertIn("no baseline", out.getvalue())
+        self.assertIn("No regressions", out.getvalue())
+        call_command("benchmark", save_baseline=True, stdout=io.StringIO(), **options)
+        saved = benchmarks.load_baselines(path)
+        self.assertEqual(set(saved["20"]), {"dashboard_home"})
+        # one more query than recorded is a regression on any machine
+        result = dict(saved["20"]["dashboard_home"], queries=saved["20"]["dashboard_home"]["queries"] + 1)
+        self.assertEqual(len(benchmarks.regressions({"dashboard_home": result}, saved["20"])), 1)
+
+
+class ScriptedTarget:
+    """Answers each path with a fixed status, recording what was asked."""
+
+    name = "scripted"
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    async def request(self, method, path, headers, body=b""):
+        self.calls.append((method, path))
+        return self.statuses.get(path, 200), []
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LoadTestTests(TestCase):
+    def test_percentiles_and_rates(self):
+        result = loadtest.Result("dashboard", "sync")
+        for ms in range(1, 101):
+            result.record(ms / 1000, ok=ms % 10 != 0)
+        result.seconds = 2.0
+        data = result.as_dict()
+        self.assertEqual((data["p50_ms"], data["p95_ms"], data["p99_ms"]), (50.5, 95.05, 99.01))
+        self.assertEqual((data["requests"], data["errors"], data["error_rate"], data["throughput"]), (100, 10, 0.1, 50.0))
+
+    def test_journey_ends_at_the_first_unexpected_status(self):
+        stop = reverse("personnel:session_stop")
+        target = ScriptedTarget({reverse("login"): 302, reverse("personnel:session_start"): 500, stop: 302})
+        result = asyncio.run(loadtest.run_journey(target, "morning", "sync", ["ada", "bob"], "pw", concurrency=1))
+        self.assertEqual(list(result.steps), ["login", "dashboard", "start_session"])
+        self.assertEqual((result.requests, result.errors, result.steps["start_session"].errors), (6, 2, 2))
+        self.assertNotIn(("POST", stop), target.calls)
+
+    def test_compare_pairs_runs_by_name_and_mode(self):
+        before = {"runs": [{"name": "morning", "mode": "sync", "p95_ms": 40.0, "throughput": 90.0}]}
+        after = {"runs": [
+            {"name": "morning", "mode": "sync", "p95_ms": 30.0, "throughput": 120.0},
+            {"name": "morning", "mode": "async", "p95_ms": 20.0},
+        ]}
+        self.assertEqual(loadtest.compare(after, before, keys=("throughput", "p95_ms")), [
+            ("morning", "sync", "throughput", 90.0, 120.0), ("morning", "sync", "p95_ms", 40.0, 30.0),
+        ])
+
+    def test_lock_errors_are_recognised(self):
+        self.assertTrue(loadtest.is_lock_error(OperationalError("database is locked")))
+        self.assertFalse(loadtest.is_lock_error(OperationalError("no such table: x")))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = Employee.objects.create_user("staff", is_staff=True)
+        self.user = Employee.objects.create_user("user")
+        profiling.install()
+        profiling.stats.reset()
+        self.addCleanup(profiling.stats.reset)
+
+    def test_staff_can_profile_one_request(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs("personnel.profiling", "INFO"):
+            response = self.client.get(reverse("personnel:directory_list"), {"_profile": 1})
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, app;dur=[\d.]+')
+        view = profiling.stats.snapshot()["personnel:directory_list"]
+        self.assertEqual(view["requests"], 1)
+        self.assertGreater(view["mean_queries"], 0)
+        self.assertNotIn("Server-Timing", self.client.get(reverse("personnel:directory_list")))
+
+    def test_others_cannot_force_a_profile(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("personnel:directory_list"), {"_profile": 1})
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(profiling.stats.snapshot(), {})
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_logged(self):
+        self.client.force_login(self.user)
+        with self.assertLogs("personnel.profiling", "INFO") as logs:
+            response = self.client.get(reverse("personnel:directory_list"))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["view"], line["status"]), ("personnel:directory_list", 200))
+        self.assertIn("Server-Timing", response)
+
+    def test_repeated_statements_point_at_their_loop(self):
+        profile = profiling.Profile()
+        token = profiling._current.set(profile)
+        try:
+            for user in (self.staff, self.user, self.staff):
+                Employee.objects.get(pk=user.pk)
+        finally:
+            profiling._current.reset(token)
+        [duplicate] = profile.duplicates(3)
+        self.assertEqual(duplicate["count"], 3)
+        self.assertIn("personnel/tests.py", duplicate["site"])
+        self.assertIn("test_repeated_statements_point_at_their_loop", duplicate["site"])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GroupNoticeTests(TestCase):
+    url = reverse_lazy("personnel:dashboard_home")
+
+    def setUp(self):
+        self.hr = Group.objects.create(name="HR")
+        self.member = Employee.objects.create_user("member")
+        self.member.groups.add(self.hr)
+        self.other = Employee.objects.create_user("other")
+        Notice.objects.create(title="Canteen closed", content="-")
+        Notice.objects.create(title="Payroll run", content="-").visible_to_groups.add(self.hr)
+
+    def titles(self, user):
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        return [title for title in ("Canteen closed", "Payroll run") if title in response.content.decode()]
+
+    def test_group_notices_reach_only_members(self):
+        self.assertEqual(self.titles(self.member), ["Canteen closed", "Payroll run"])
+        self.assertEqual(self.titles(self.other), ["Canteen closed"])
+
+    def test_membership_and_targeting_changes_show_at_once(self):
+        self.assertEqual(self.titles(self.other), ["Canteen closed"])
+        self.other.groups.add(self.hr)
+        self.assertEqual(self.titles(self.other), ["Canteen closed", "Payroll run"])
+        Notice.objects.get(title="Canteen closed").visible_to_groups.add(Group.objects.create(name="Facilities"))
+        self.assertEqual(self.titles(self.other), ["Payroll run"])
+
+    def test_newest_notices_are_merged_across_audiences(self):
+        for i in range(dashboard.NOTICES_LIMIT):
+            Notice.objects.create(title=f"Public {i}", content="-")
+        newest = Notice.objects.create(title="Bonus", content="-")
+        newest.visible_to_groups.add(self.hr)
+        epoch, _ = dashboard.notices_state()
+        ids = dashboard.visible_notice_ids(dashboard.notice_groups(self.member), epoch)
+        self.assertEqual(len(ids), dashboard.NOTICES_LIMIT)
+        self.assertEqual(ids[0], newest.id)
+        self.assertNotIn(newest.id, dashboard.visible_notice_ids(dashboard.notice_groups(self.other), epoch))
+        # the index and the user's groups come from the cache once built
+        with self.assertNumQueries(0):
+            dashboard.visible_notice_ids(dashboard.notice_groups(self.member), epoch)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+@mock.patch.object(NotificationAdmin, "list_per_page", 2)
+class ScalableChangeListTests(TestCase):
+    url = reverse_lazy("admin:personnel_notification_changelist")
+
+    def setUp(self):
+        self.client.force_login(Employee.objects.create_superuser("admin", password="pw"))
+        self.sarah = Employee.objects.create_user("sarah", first_name="Sarah", last_name="Connor", is_active=False)
+        inbox.deliver([Notification(recipient=self.sarah, verb=f"note {i}") for i in range(5)])
+        self.ids = list(Notification.objects.order_by("-id").values_list("id", flat=True))
+
+    def page(self, **params):
+        cl = self.client.get(self.url, params).context["cl"]
+        return [n.id for n in cl.result_list], cl.next_cursor
+
+    def test_older_links_walk_the_keyset(self):
+        self.assertEqual(self.page(), (self.ids[:2], self.ids[1]))
+        self.assertEqual(self.page(before=self.ids[1]), (self.ids[2:4], self.ids[3]))
+        self.assertEqual(self.page(before=self.ids[3]), (self.ids[4:], None))
+
+    def test_cursor_is_ignored_for_other_orderings(self):
+        # newest first by created_at rather than pk: the cursor does not apply and the page starts over
+        self.assertEqual(self.page(o="-4", before=self.ids[1]), (self.ids[:2], None))
+
+    def test_counts_are_capped(self):
+        with mock.patch.object(changelists, "COUNT_CAP", 3):
+            paginator = changelists.EstimatedCountPaginator(Notification.objects.all(), 2)
+            self.assertEqual(paginator.count, 3)
+
+    def test_search_matches_people_who_left_and_verb_prefixes(self):
+        self.assertEqual(len(self.page(q="conn")[0]), 2)
+        self.assertEqual(self.page(q="note 3")[0], [self.ids[1]])
+        self.assertEqual(self.page(q="nobody")[0], [])
 
-# Create your tests here.
@@ -0,0 +1,215 @@
+import csv
+from datetime import datetime, time, timedelta
+from heapq import merge
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import DurationField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import TimeSession, TimesheetDay
+
+# rows fetched per round trip when streaming aggregates out of the DB
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _midnight(day, tz):
+    return timezone.make_aware(datetime.combine(day, time.min), tz)
+
+
+def split_by_day(start_time, end_time, tz=None):
+    """Yield (date, seconds) for every local day covered by [start_time, end_time)."""
+    tz = tz or timezone.get_current_timezone()
+    day = timezone.localtime(start_time, tz).date()
+    cursor = start_time
+    while cursor < end_time:
+        piece_end = min(end_time, _midnight(day + timedelta(days=1), tz))
+        yield day, (piece_end - cursor).total_seconds()
+        cursor = piece_end
+        day += timedelta(days=1)
+
+
+def closed_sessions(start, end, sessions=None):
+    """Closed sessions overlapping the local days [start, end)."""
+    tz = timezone.get_current_timezone()
+    qs = TimeSession.objects.all() if sessions is None else sessions
+    return qs.filter(
+        end_time__isnull=False,
+        start_time__lt=_midnight(end, tz),
+        end_time__gt=_midnight(start, tz),
+    ).annotate(
+        day=TruncDate("start_time", tzinfo=tz),
+        end_day=TruncDate("end_time", tzinfo=tz),
+    )
+
+
+def _same_day_totals(qs, chunk_size):
+    # the common case: summed per user/day inside the database
+    rows = (
+        qs.filter(day=F("end_day"))
+        .values_list("user_id", "user__username", "day")
+        .annotate(total=Sum(F("end_time") - F("start_time"), output_field=DurationField()))
+        .order_by("user_id", "day")
+    )
+    for user_id, username, day, total in rows.iterator(chunk_size=chunk_size):
+        yield user_id, username, day, total.total_seconds()
+
+
+def _cross_midnight_totals(qs, start, end, chunk_size):
+    # sessions spanning midnight are rare; split them in Python and keep them sorted
+    tz = timezone.get_current_timezone()
+    totals = {}
+    rows = qs.exclude(day=F("end_day")).values_list("user_id", "user__username", "start_time", "end_time")
+    for user_id, username, start_time, end_time in rows.iterator(chunk_size=chunk_size):
+        for day, secs in split_by_day(start_time, end_time, tz):
+            if start <= day < end and secs > 0:
+                key = (user_id, username, day)
+                totals[key] = totals.get(key, 0) + secs
+    for (user_id, username, day), secs in sorted(totals.items()):
+        yield user_id, username, day, secs
+
+
+def iter_daily_totals(start, end, sessions=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream (username, date, seconds) per user and local day in [start, end).
+
+    Rows come out ordered by user id then date. ``sessions`` optionally narrows
+    the TimeSession queryset (user, department, id range...).
+    """
+    qs = closed_sessions(start, end, sessions)
+    streams = merge(
+        _same_day_totals(qs, chunk_size),
+        _cross_midnight_totals(qs, start, end, chunk_size),
+        key=lambda row: (row[0], row[2]),
+    )
+    for (user_id, day), group in groupby(streams, key=lambda row: (row[0], row[2])):
+        group = list(group)
+        yield group[0][1], day, sum(row[3] for row in group)
+
+
+def write_timesheet_csv(fh, rows, header=True):
+    """Write (username, date, seconds) rows as CSV hours; returns the row count."""
+    writer = csv.writer(fh)
+    if header:
+        writer.writerow(["username", "date", "hours"])
+    count = 0
+    for username, day, secs in rows:
+        writer.writerow([username, day.isoformat(), round(secs / 3600, 2)])
+        count += 1
+    return count
+
+
+def filter_users(qs, department_id=None, user_range=None, user_id=None):
+    """Narrow any queryset with a ``user`` FK to one user, a department or a user id range."""
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    if department_id is not None:
+        qs = qs.filter(user__department_id=department_id)
+    if user_range is not None:
+        lo, hi = user_range
+        qs = qs.filter(user_id__gte=lo)
+        if hi is not None:
+            qs = qs.filter(user_id__lt=hi)
+    return qs
+
+
+def shard_sessions(department_id=None, user_range=None, user_id=None):
+    return filter_users(TimeSession.objects.all(), department_id, user_range, user_id)
+
+
+# Rollup: TimesheetDay holds one row per user, local day and location. Rows are
+# recomputed from raw sessions for the (user, day) pairs a change touches.
+
+def iter_rollup_totals(start, end, days=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Same rows as iter_daily_totals, read from the TimesheetDay rollup."""
+    qs = TimesheetDay.objects.all() if days is None else days
+    rows = (
+        qs.filter(date__gte=start, date__lt=end)
+        .values_list("user_id", "user__username", "date")
+        .annotate(total=Sum("seconds"))
+        .order_by("user_id", "date")
+    )
+    for user_id, username, day, total in rows.iterator(chunk_size=chunk_size):
+        yield username, day, total
+
+
+def _rollup_rows(user_id, sessions, days):
+    tz = timezone.get_current_timezone()
+    totals = {}
+    for start_time, end_time, location in sessions:
+        for day, secs in split_by_day(start_time, end_time, tz):
+            if day in days and secs > 0:
+                total = totals.setdefault((day, location), [0, 0])
+                total[0] += secs
+                total[1] += 1
+    return [
+        TimesheetDay(user_id=user_id, date=day, location=location, seconds=round(secs), sessions=count)
+        for (day, location), (secs, count) in totals.items()
+    ]
+
+
+def refresh_rollup(user_id, days):
+    """Recompute the rollup rows of one user for the given local days."""
+    days = set(days)
+    if not days:
+        return 0
+    sessions = closed_sessions(min(days), max(days) + timedelta(days=1), TimeSession.objects.filter(user_id=user_id))
+    rows = _rollup_rows(user_id, sessions.values_list("start_time", "end_time", "location"), days)
+    with transaction.atomic():
+        TimesheetDay.objects.filter(user_id=user_id, date__in=days).delete()
+        TimesheetDay.objects.bulk_create(rows)
+    return len(rows)
+
+
+def session_days(start_time, end_time, tz=None):
+    if not start_time or not end_time:
+        return set()
+    return {day for day, _ in split_by_day(start_time, end_time, tz)}
+
+
+def refresh_for_session(session, previous=None):
+    """Update the rollup after ``session`` was closed, edited or deleted.
+
+    ``previous`` is the (start_time, end_time) the session had before an edit.
+    """
+    days = session_days(session.start_time, session.end_time)
+    if previous:
+        days |= session_days(*previous)
+    return refresh_rollup(session.user_id, days)
+
+
+def rebuild_rollup(start, end, department_id=None, user_id=None, batch_size=EXPORT_CHUNK_SIZE):
+    """Recompute the rollup for local days [start, end); returns the rows written."""
+    sessions = closed_sessions(start, end, shard_sessions(department_id, user_id=user_id))
+    rows = sessions.order_by("user_id").values_list("user_id", "start_time", "end_time", "location")
+    days = {start + timedelta(days=i) for i in range((end - start).days)}
+    written = 0
+    with transaction.atomic():
+        filter_users(TimesheetDay.objects.filter(date__gte=start, date__lt=end), department_id, user_id=user_id).delete()
+        batch = []
+        for user_id_, group in groupby(rows.iterator(chunk_size=batch_size), key=lambda row: row[0]):
+            batch.extend(_rollup_rows(user_id_, (row[1:] for row in group), days))
+            if len(batch) >= batch_size:
+                TimesheetDay.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        TimesheetDay.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def export_shard(shard):
+    """Write one shard CSV (headerless) and return (label, rows, seconds).
+
+    ``shard`` is a plain dict so it can be shipped to a process pool worker.
+    """
+    started = timezone.now()
+    filters = (shard.get("department_id"), shard.get("user_range"), shard.get("user_id"))
+    chunk_size = shard.get("chunk_size", EXPORT_CHUNK_SIZE)
+    if shard.get("source", "rollup") == "rollup":
+        rows = iter_rollup_totals(shard["start"], shard["end"], days=filter_users(TimesheetDay.objects.all(), *filters), chunk_size=chunk_size)
+    else:
+        rows = iter_daily_totals(shard["start"], shard["end"], sessions=shard_sessions(*filters), chunk_size=chunk_size)
+    with open(shard["path"], "w", newline="") as fh:
+        count = write_timesheet_csv(fh, rows, header=False)
+    return shard["label"], count, (timezone.now() - started).total_seconds()
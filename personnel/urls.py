@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = "personnel"
 
@@ -11,8 +11,21 @@ urlpatterns = [
     path("timesheets/sessions/", views.sessions_list, name="sessions_list"),
     path("timesheets/start/", views.start_session, name="session_start"),
     path("timesheets/stop/", views.stop_session, name="session_stop"),
+    path("presence/", views.presence_board, name="presence_board"),
+    path("presence/stream/", views.presence_stream, name="presence_stream"),
     path("leaves/", views.leave_list, name="leave_list"),
     path("leaves/create/", views.leave_create, name="leave_create"),
     path("leaves/review/", views.leave_review_list, name="leave_review_list"),
+    path("leaves/review/bulk/", views.leave_review_bulk, name="leave_review_bulk"),
+    path("leaves/calendar/", views.leave_calendar_api, name="leave_calendar_api"),
     path("notifications/", views.notifications_list, name="notifications"),
+    path("notifications/api/", views.notifications_api, name="notifications_api"),
+    path("notifications/read/", views.notifications_mark_read, name="notifications_mark_read"),
+    path("profiling/stats/", views.profiling_stats, name="profiling_stats"),
+    # async ORM variants of the hot pages (see personnel.async_views)
+    path("async/dashboard/", async_views.dashboard_home, name="async_dashboard_home"),
+    path("async/notifications/", async_views.notifications_list, name="async_notifications"),
+    path("async/timesheets/sessions/", async_views.sessions_list, name="async_sessions_list"),
+    path("async/timesheets/start/", async_views.start_session, name="async_session_start"),
+    path("async/timesheets/stop/", async_views.stop_session, name="async_session_stop"),
 ]
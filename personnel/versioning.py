@@ -0,0 +1,30 @@
+import time
+
+from django.core.cache import cache
+
+# Cache keys derived from a version are never deleted; bumping the version
+# orphans them. Versions are millisecond timestamps, so they also tell when the
+# underlying data last changed and never collide after a cache eviction.
+
+
+def _key(name):
+    return f"personnel:version:{name}"
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _now_ms(), None)
+        version = cache.get(_key(name))
+    return version
+
+
+def bump_version(name):
+    previous = cache.get(_key(name)) or 0
+    version = max(_now_ms(), previous + 1)
+    cache.set(_key(name), version, None)
+    return version
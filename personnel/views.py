@@ -1,9 +1,24 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+import json
+import os
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.vary import vary_on_cookie
 from django.utils import timezone
-from django.db.models import Q, Sum, F
-from .models import Notice, Employee, TimeEntry, TimeSession, LeaveRequest, Department, Team, Notification
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from .models import Employee
 from .forms import TimeEntryForm, StartSessionForm, LeaveRequestForm
+from . import balances, clock, dashboard, inbox, leave_calendar, leaves, org, outbox, permissions, presence, profiling, search
 from django.contrib import messages
 
 # root redirect to dashboard
@@ -11,31 +26,31 @@ def home_redirect(request):
     return redirect("personnel:dashboard_home")
 
 @login_required
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard.dashboard_etag, last_modified_func=dashboard.dashboard_last_modified)
 def dashboard_home(request):
-    now = timezone.now()
-    # latest notices: reuse Notice model stored in DB (we keep Notice in admin with model in models.py below)
-    notices = Notice.objects.filter(
-        Q(visible_from__lte=now) | Q(visible_from__isnull=True),
-        Q(visible_until__gte=now) | Q(visible_until__isnull=True),
-    ).order_by("-published_at")[:5]
+    # querysets (and the notices callable) stay lazy: they only run when their cached fragment has expired
+    notices = partial(dashboard.visible_notices, request)
     time_form = TimeEntryForm()
     start_form = StartSessionForm()
     # upcoming approved leaves as calendar snippet
-    upcoming_leaves = LeaveRequest.objects.filter(status=LeaveRequest.STATUS_MANAGER_APPROVED, end_date__gte=timezone.localdate()).order_by("start_date")[:10]
-    return render(request, "dashboard/home.html", {"notices": notices, "time_form": time_form, "start_form": start_form, "upcoming_leaves": upcoming_leaves})
+    upcoming_leaves = dashboard.upcoming_leaves()
+    state = dashboard._dashboard_state(request)
+    return render(request, "dashboard/home.html", {
+        "notices": notices, "time_form": time_form, "start_form": start_form, "upcoming_leaves": upcoming_leaves,
+        "fragment_timeout": dashboard.FRAGMENT_TIMEOUT, "notices_epoch": state["notices_epoch"],
+        "notice_audience": state["notice_audience"], "leaves_version": state["leaves_version"], "today": state["today"],
+    })
 
 @login_required
 def directory_list(request):
     q = request.GET.get("q", "")
-    employees = Employee.objects.filter(is_active=True)
     if q:
-        employees = employees.filter(
-            Q(first_name__icontains=q) |
-            Q(last_name__icontains=q) |
-            Q(job_title__icontains=q) |
-            Q(department__name__icontains=q)
-        )
-    employees = employees.select_related("department").only("first_name","last_name","job_title","department__name","office_line_number","profile_picture")[:200]
+        # ranked prefix/trigram search through the configured backend (see personnel.search)
+        employees = search.search_employees(q, limit=200)
+    else:
+        employees = Employee.objects.filter(is_active=True).select_related("department").only("first_name","last_name","job_title","department__name","office_line_number","profile_picture")[:200]
     return render(request, "directory/list.html", {"employees": employees, "q": q})
 
 @login_required
@@ -53,19 +68,21 @@ def submit_time(request):
 @login_required
 def sessions_list(request):
     sessions = request.user.time_sessions.all().order_by("-start_time")[:200]
-    return render(request, "timesheets/sessions_list.html", {"sessions": sessions})
+    # per-day totals come from the rollup rather than summing raw sessions
+    since = timezone.localdate() - timedelta(days=13)
+    daily = request.user.timesheet_days.filter(date__gte=since).values("date").annotate(seconds=Sum("seconds")).order_by("-date")
+    for day in daily:
+        day["hours"] = round(day["seconds"] / 3600, 2)
+    return render(request, "timesheets/sessions_list.html", {"sessions": sessions, "daily": daily})
 
 @login_required
 def start_session(request):
     if request.method == "POST":
-        # idempotent: only one open session per user
-        open_exists = request.user.time_sessions.filter(end_time__isnull=True).exists()
-        if not open_exists:
-            loc = request.POST.get("location","")
-            session = TimeSession.objects.create(user=request.user, start_time=timezone.now(), location=loc)
-            # notifications
-            from .signals import notify_presence_change
-            notify_presence_change(request.user, "started", session)
+        # one INSERT ... ON CONFLICT: a second click while a session is open is a no-op
+        session = clock.clock_in(request.user, request.POST.get("location",""))
+        if session:
+            # notifications are expanded out of the request by process_notifications
+            outbox.dispatch("presence", actor=request.user, target=session, payload={"action": "started"})
             messages.success(request, "Session started")
         else:
             messages.info(request, "Open session already exists")
@@ -74,51 +91,164 @@ def start_session(request):
 @login_required
 def stop_session(request):
     if request.method == "POST":
-        session = request.user.time_sessions.filter(end_time__isnull=True).order_by("-start_time").first()
+        session = clock.clock_out(request.user)
         if session:
-            session.end_time = timezone.now()
-            session.save()
-            from .signals import notify_presence_change
-            notify_presence_change(request.user, "stopped", session)
+            outbox.dispatch("presence", actor=request.user, target=session, payload={"action": "stopped"})
             messages.success(request, "Session stopped")
         else:
             messages.info(request, "No open session found")
     return redirect("personnel:dashboard_home")
 
+def _can_watch(watcher):
+    return watcher.team_ids is None or bool(watcher.team_ids or watcher.department_ids)
+
+@login_required
+def presence_board(request):
+    watcher = presence.watcher_for(request.user, None)
+    return render(request, "presence/board.html", {"can_watch": _can_watch(watcher)})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _presence_events(watcher):
+    # subscribe before the snapshot so nothing falls in between; the client keys rows by user id
+    presence.index.subscribe(watcher)
+    try:
+        yield _sse("snapshot", presence.index.snapshot(watcher))
+        while True:
+            try:
+                kind, entry = await asyncio.wait_for(watcher.queue.get(), presence.KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if kind == "resync":
+                yield _sse("snapshot", presence.index.snapshot(watcher))
+            else:
+                yield _sse(kind, entry)
+    finally:
+        presence.index.unsubscribe(watcher)
+
+@login_required
+async def presence_stream(request):
+    # server-sent events from the in-memory index: no per-client polling, but needs an ASGI server
+    user = await request.auser()
+    await sync_to_async(presence.index.ensure_loaded)()
+    watcher = await sync_to_async(presence.watcher_for)(user, asyncio.get_running_loop())
+    if not _can_watch(watcher):
+        return HttpResponseForbidden("Only team leaders, managers and staff can watch presence")
+    response = StreamingHttpResponse(_presence_events(watcher), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 @login_required
 def leave_list(request):
-    leaves = request.user.leave_requests.all().order_by("-created_at")
-    return render(request, "leaves/list.html", {"leaves": leaves})
+    my_leaves = request.user.leave_requests.all().order_by("-created_at")
+    return render(request, "leaves/list.html", {"leaves": my_leaves})
 
 @login_required
 def leave_create(request):
     if request.method == "POST":
-        form = LeaveRequestForm(request.POST)
+        form = LeaveRequestForm(request.POST, applicant=request.user)
         if form.is_valid():
             lr = form.save(commit=False)
             lr.applicant = request.user
-            # resolve leader and manager
-            if lr.team and lr.team.team_leader:
-                lr.leader = lr.team.team_leader
-            if request.user.department and request.user.department.manager:
-                lr.manager = request.user.department.manager
-            lr.save()
-            from .signals import notify_leave_created
-            notify_leave_created(lr)
-            messages.success(request, "Leave request submitted")
-            return redirect("personnel:leave_list")
+            # resolve leader and manager from the cached org graph
+            graph = org.get_graph()
+            lr.leader_id = graph.team_leader(lr.team_id)
+            lr.manager_id = graph.manager_id(request.user)
+            try:
+                with transaction.atomic():
+                    lr.save()
+            except IntegrityError as exc:
+                # a concurrent request for the same days was saved after the form checked
+                if not leave_calendar.violates_overlap(exc):
+                    raise
+                form.add_error(None, leave_calendar.OVERLAP_MESSAGE)
+            else:
+                outbox.dispatch("leave_created", actor=request.user, target=lr)
+                messages.success(request, "Leave request submitted")
+                return redirect("personnel:leave_list")
     else:
-        form = LeaveRequestForm(initial={"team": request.user.teams.first()})
-    return render(request, "leaves/create.html", {"form": form})
+        team_ids = org.get_graph().team_ids(request.user.id)
+        form = LeaveRequestForm(applicant=request.user, initial={"team": min(team_ids) if team_ids else None})
+    # snapshot read, never a sum over the ledger
+    return render(request, "leaves/create.html", {"form": form, "balance": balances.balance(request.user)})
 
 @login_required
 def leave_review_list(request):
-    # show leave requests awaiting this user's decision
-    as_leader = LeaveRequest.objects.filter(leader=request.user, status=LeaveRequest.STATUS_PENDING).order_by("-created_at")
-    as_manager = LeaveRequest.objects.filter(manager=request.user, status=LeaveRequest.STATUS_LEADER_APPROVED).order_by("-created_at")
+    # show leave requests awaiting this user's decision, including teams delegated to them
+    resolver = permissions.for_request(request)
+    as_leader = leaves.reviewable(request.user, leaves.LEADER, resolver).select_related("applicant").order_by("-created_at")
+    as_manager = leaves.reviewable(request.user, leaves.MANAGER).select_related("applicant").order_by("-created_at")
     return render(request, "leaves/review_list.html", {"as_leader": as_leader, "as_manager": as_manager})
 
+@login_required
+@require_POST
+def leave_review_bulk(request):
+    # one round trip clears any number of selected requests
+    role = request.POST.get("role")
+    decision = request.POST.get("decision")
+    ids = [int(i) for i in request.POST.getlist("ids") if i.isdigit()]
+    try:
+        decided = leaves.decide(request.user, ids, role, decision, permissions.for_request(request))
+    except ValueError:
+        return HttpResponseBadRequest("Unknown decision")
+    skipped = len(ids) - len(decided)
+    messages.success(request, f"{len(decided)} leave request(s) {decision}" + (f", {skipped} skipped" if skipped else ""))
+    return redirect("personnel:leave_review_list")
+
+@login_required
+def leave_calendar_api(request):
+    # ?month=YYYY-MM&team=<id>&department=<id>; defaults to the current month
+    today = timezone.localdate()
+    try:
+        year, month = map(int, request.GET.get("month", f"{today.year}-{today.month}").split("-"))
+        team_id = int(request.GET["team"]) if request.GET.get("team") else None
+        department_id = int(request.GET["department"]) if request.GET.get("department") else None
+        if not permissions.can_view_calendar(request.user, team_id, department_id, permissions.for_request(request)):
+            return HttpResponseForbidden("You may not view this calendar")
+        data = leave_calendar.month_view(year, month, team=team_id, department=department_id)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid month, team or department")
+    return JsonResponse(data)
+
+def _inbox_page(request):
+    try:
+        return inbox.page(request.user, cursor=request.GET.get("cursor"), unread_only=request.GET.get("unread") == "1")
+    except ValueError:
+        raise Http404("Invalid cursor")
+
 @login_required
 def notifications_list(request):
-    notes = request.user.notifications.all().order_by("-created_at")[:200]
-    return render(request, "notifications/list.html", {"notifications": notes})
+    notes, next_cursor = _inbox_page(request)
+    return render(request, "notifications/list.html", {"notifications": notes, "next_cursor": next_cursor})
+
+@login_required
+def notifications_api(request):
+    notes, next_cursor = _inbox_page(request)
+    return JsonResponse({
+        "results": [
+            {"id": n.id, "verb": n.verb, "created_at": n.created_at.isoformat(), "unread": n.unread, "data": n.data}
+            for n in notes
+        ],
+        "next": next_cursor,
+        "unread": inbox.unread_count(request.user),
+    })
+
+@login_required
+@require_POST
+def notifications_mark_read(request):
+    if request.POST.get("all"):
+        inbox.mark_all_read(request.user)
+    else:
+        ids = [int(i) for i in request.POST.getlist("ids") if i.isdigit()]
+        inbox.mark_read(request.user, ids)
+    return redirect("personnel:notifications")
+
+@staff_member_required
+def profiling_stats(request):
+    # per-view totals of this process's sampled requests; POST clears them
+    if request.method == "POST":
+        profiling.stats.reset()
+    return JsonResponse({"pid": os.getpid(), "sample_rate": settings.PROFILING_SAMPLE_RATE, "views": profiling.stats.snapshot()})
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "personnel.profiling.ProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,6 +47,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "personnel.context_processors.unread_notifications",
             ],
         },
     },
@@ -65,6 +67,19 @@ DATABASES = {
     }
 }
 
+# Every web worker and the notification worker must share one cache: the data versions in
+# personnel.versioning live there, and a process-local cache keeps serving stale org, notice and
+# permission data after an edit made elsewhere. The file cache is shared by the processes of one
+# host; with several hosts point CACHE_BACKEND/CACHE_LOCATION at e.g.
+# django.core.cache.backends.redis.RedisCache and redis://host:6379
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", str(BASE_DIR / "cache")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))},
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,6 +120,37 @@ AUTHENTICATION_BACKENDS = (
     "guardian.backends.ObjectPermissionBackend",
 )
 
+# Notifications are queued in the DB outbox and expanded by `manage.py process_notifications --loop`;
+# set NOTIFICATIONS_OUTBOX=0 to write them synchronously inside the request instead
+NOTIFICATIONS_OUTBOX = os.environ.get("NOTIFICATIONS_OUTBOX", "1") == "1"
+
+# `manage.py archive_notifications` moves read notifications older than this into gzip JSONL files
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_ARCHIVE_DIR = os.environ.get("NOTIFICATION_ARCHIVE_DIR", BASE_DIR / "archive" / "notifications")
+
+# Leave entitlement: days credited per year by `manage.py accrue_leave`, non-working weekdays
+# (Monday == 0) and whether requests above the available balance are refused
+LEAVE_ANNUAL_DAYS = int(os.environ.get("LEAVE_ANNUAL_DAYS", "20"))
+LEAVE_WEEKEND_DAYS = (5, 6)
+LEAVE_ENFORCE_BALANCE = os.environ.get("LEAVE_ENFORCE_BALANCE", "0") == "1"
+# Dashboard "upcoming leaves" only looks this many days ahead when set (an index range scan on large
+# tables); unset lists the next approved leaves however far away they are
+DASHBOARD_UPCOMING_LEAVES_DAYS = int(os.environ["DASHBOARD_UPCOMING_LEAVES_DAYS"]) if os.environ.get("DASHBOARD_UPCOMING_LEAVES_DAYS") else None
+
+# Fraction of requests profiled (query count/time, repeated statements, template time, cache hits); sampled
+# requests get a Server-Timing header and a JSON line on the "personnel.profiling" logger, and staff can read
+# the per-view totals at /profiling/stats/. Staff may also profile a single request with ?_profile=1
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+# a statement repeated this many times in one request is reported as a likely N+1
+PROFILING_DUPLICATE_THRESHOLD = int(os.environ.get("PROFILING_DUPLICATE_THRESHOLD", "3"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"personnel.profiling": {"handlers": ["console"], "level": "INFO", "propagate": False}},
+}
+
 LOGIN_REDIRECT_URL = "/dashboard/"
 LOGIN_URL = "/accounts/login/"
 LOGOUT_REDIRECT_URL = "/accounts/login/"
\ No newline at end of file